@@ -0,0 +1,141 @@
+'''
+X-Auth-Token checks shared by every function behind a login. Each function
+deploys from its own directory, so sync_shared.py copies this file next to
+their index.py. Edit it only here, then run python3 sync_shared.py.
+'''
+
+import functools
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Collection, Tuple
+
+import jwt
+
+JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 1024))
+JWT_CACHE_TTL_SECONDS = int(os.environ.get('JWT_CACHE_TTL_SECONDS', 300))
+
+# Read once per warm instance instead of on every request
+JWT_SECRET = os.environ.get('JWT_SECRET')
+
+# Fixed token the admin panel sends instead of a JWT
+ADMIN_SESSION_TOKEN = 'admin_session_token'
+ADMIN_SESSION_CLAIMS = {'id': 0, 'email': 'admin@session', 'is_admin': True}
+
+_claims_cache: 'OrderedDict[bytes, tuple]' = OrderedDict()
+
+def decode_token_cached(token: str) -> Dict[str, Any]:
+    '''
+    Decode an HS256 token, remembering the claims in a small LRU keyed by the
+    token hash. An entry lives for JWT_CACHE_TTL_SECONDS but never past the
+    token's own exp, so a cache hit is always a token jwt.decode would accept.
+    Raises jwt.InvalidTokenError (or a subclass) exactly like jwt.decode.
+    '''
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+
+    entry = _claims_cache.get(key)
+    if entry is not None:
+        valid_until, payload = entry
+        if now < valid_until:
+            _claims_cache.move_to_end(key)
+            return dict(payload)
+        del _claims_cache[key]
+
+    if not JWT_SECRET:
+        raise jwt.InvalidTokenError('JWT_SECRET not configured')
+
+    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+
+    valid_until = now + JWT_CACHE_TTL_SECONDS
+    if isinstance(payload.get('exp'), (int, float)):
+        valid_until = min(valid_until, payload['exp'])
+
+    _claims_cache[key] = (valid_until, payload)
+    if len(_claims_cache) > JWT_CACHE_SIZE:
+        _claims_cache.popitem(last=False)
+
+    return dict(payload)
+
+def get_auth_token(headers: Dict[str, str]) -> Optional[str]:
+    return headers.get('X-Auth-Token') or headers.get('x-auth-token')
+
+def authenticate(headers: Dict[str, str], admin_session: bool = True) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''
+    Claims of the request's X-Auth-Token, or None and the reason it was
+    refused. admin_session lets the admin panel's fixed token in as an admin.
+    '''
+    auth_token = get_auth_token(headers)
+    if not auth_token:
+        return None, 'Authentication required'
+
+    if admin_session and auth_token == ADMIN_SESSION_TOKEN:
+        return dict(ADMIN_SESSION_CLAIMS), ''
+
+    try:
+        return decode_token_cached(auth_token), ''
+    except jwt.ExpiredSignatureError:
+        return None, 'Token expired'
+    except jwt.InvalidTokenError:
+        return None, 'Invalid token'
+
+def auth_error_response(status_code: int, error: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': error}),
+        'isBase64Encoded': False
+    }
+
+def require_auth(
+    handler_func: Optional[Callable[..., Dict[str, Any]]] = None,
+    *,
+    admin_methods: Collection[str] = (),
+    admin_session: bool = True
+) -> Any:
+    '''
+    Wraps handler(event, context, user): preflight requests pass straight
+    through, everything else must carry a valid X-Auth-Token (401 with the
+    reason otherwise), and methods listed in admin_methods an admin one (403).
+    Works bare, @require_auth, or with options, @require_auth(admin_methods=...).
+    '''
+    if handler_func is None:
+        return functools.partial(require_auth, admin_methods=admin_methods, admin_session=admin_session)
+
+    @functools.wraps(handler_func)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        method = event.get('httpMethod', 'GET')
+        if method == 'OPTIONS':
+            return handler_func(event, context, None)
+
+        user, error = authenticate(event.get('headers') or {}, admin_session)
+        if not user:
+            return auth_error_response(401, error)
+
+        if method in admin_methods and not user.get('is_admin'):
+            return auth_error_response(403, 'Admin access required')
+
+        return handler_func(event, context, user)
+
+    return wrapper
+
+def require_admin(handler_func: Callable[..., Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''
+    Wraps handler(event, context, admin): preflight requests pass straight
+    through, everything else must carry an admin X-Auth-Token. Every refusal,
+    a missing token included, is a 403.
+    '''
+    @functools.wraps(handler_func)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if event.get('httpMethod') == 'OPTIONS':
+            return handler_func(event, context, None)
+
+        admin, _ = authenticate(event.get('headers') or {})
+        if not admin or not admin.get('is_admin'):
+            return auth_error_response(403, 'Admin access required')
+
+        return handler_func(event, context, admin)
+
+    return wrapper
@@ -0,0 +1,75 @@
+'''
+Chat access token pool shared by admin, payment and resend-chat-token. Each
+function deploys from its own directory, so sync_shared.py copies this file
+next to their index.py. Edit it only here, then run python3 sync_shared.py.
+'''
+
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import List
+
+from psycopg2.extras import execute_values
+
+CHAT_POOL_LOW_WATER_MARK = int(os.environ.get('CHAT_POOL_LOW_WATER_MARK', 200))
+CHAT_POOL_REFILL_SIZE = int(os.environ.get('CHAT_POOL_REFILL_SIZE', 1000))
+# Advisory lock key shared by every function that refills chat_tokens_pool
+CHAT_POOL_REFILL_LOCK = 720260031
+
+def generate_token_batch(count: int) -> List[str]:
+    '''One CSPRNG read for the whole batch, hex-encoded in a single call and sliced into 128-bit tokens'''
+    hex_blob = secrets.token_bytes(16 * count).hex().upper()
+    return ['CHAT_' + hex_blob[i:i + 32] for i in range(0, 32 * count, 32)]
+
+def claim_pool_tokens(cur, user_id: int, user_email: str, count: int = 1) -> List[str]:
+    '''
+    Atomically claim unused tokens from chat_tokens_pool. SKIP LOCKED makes
+    concurrent purchases take different rows instead of waiting on each other.
+    '''
+    cur.execute(
+        """
+        WITH claimed AS (
+            SELECT id FROM chat_tokens_pool
+            WHERE is_used = false AND expires_at > CURRENT_TIMESTAMP
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE chat_tokens_pool p
+        SET is_used = true, used_by_user_id = %s, used_by_email = %s, used_at = CURRENT_TIMESTAMP
+        FROM claimed
+        WHERE p.id = claimed.id
+        RETURNING p.token
+        """,
+        (count, user_id, user_email)
+    )
+    return [row['token'] for row in cur.fetchall()]
+
+def refill_chat_token_pool(cur) -> int:
+    '''Top the pool up when it drops below the low-water mark; only one caller refills at a time'''
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (CHAT_POOL_REFILL_LOCK,))
+    if not cur.fetchone()['locked']:
+        return 0
+
+    cur.execute(
+        """
+        SELECT COUNT(*) AS available FROM (
+            SELECT 1 FROM chat_tokens_pool
+            WHERE is_used = false AND expires_at > CURRENT_TIMESTAMP
+            LIMIT %s
+        ) t
+        """,
+        (CHAT_POOL_LOW_WATER_MARK,)
+    )
+    if cur.fetchone()['available'] >= CHAT_POOL_LOW_WATER_MARK:
+        return 0
+
+    expires_at = datetime.now() + timedelta(days=365)
+    execute_values(
+        cur,
+        "INSERT INTO chat_tokens_pool (token, expires_at) VALUES %s ON CONFLICT (token) DO NOTHING",
+        [(token, expires_at) for token in generate_token_batch(CHAT_POOL_REFILL_SIZE)],
+        page_size=CHAT_POOL_REFILL_SIZE
+    )
+    print(f"[CHAT_POOL] Refilled pool with {cur.rowcount} tokens")
+    return cur.rowcount
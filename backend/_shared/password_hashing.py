@@ -0,0 +1,49 @@
+'''
+bcrypt password hashing shared by auth, payment and reset-password. Each
+function deploys from its own directory, so sync_shared.py copies this file
+next to their index.py. Edit it only here, then run python3 sync_shared.py.
+'''
+
+import math
+import os
+import time
+
+import bcrypt
+
+# Bounds for the calibrated cost. The floor is only a safety net (the lowest
+# cost still considered acceptable for passwords); on normal hardware the
+# BCRYPT_TARGET_MS latency decides, so the cost follows the instance's speed.
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 15
+BCRYPT_CALIBRATION_ROUNDS = 10
+BCRYPT_TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+
+def calibrate_bcrypt_rounds() -> int:
+    '''
+    Work factor for new hashes. BCRYPT_ROUNDS pins it explicitly; otherwise one
+    cheap hash is timed and the cost is raised until a hash takes about
+    BCRYPT_TARGET_MS on this instance (every extra round doubles the work).
+    '''
+    configured = os.environ.get('BCRYPT_ROUNDS')
+    if configured:
+        rounds = int(configured)
+    else:
+        started = time.perf_counter()
+        bcrypt.hashpw(b'calibration', bcrypt.gensalt(BCRYPT_CALIBRATION_ROUNDS))
+        elapsed_ms = max((time.perf_counter() - started) * 1000, 0.01)
+        rounds = BCRYPT_CALIBRATION_ROUNDS + math.floor(math.log2(BCRYPT_TARGET_MS / elapsed_ms))
+    return min(max(rounds, BCRYPT_MIN_ROUNDS), BCRYPT_MAX_ROUNDS)
+
+# Calibrated once at import, during the cold start, so no request pays for it
+BCRYPT_COST = calibrate_bcrypt_rounds()
+print(f"[BCRYPT] Using cost {BCRYPT_COST}")
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_COST)).decode('utf-8')
+
+def needs_rehash(password_hash: str) -> bool:
+    '''True when the stored hash ($2b$<cost>$...) is cheaper than the current work factor'''
+    try:
+        return int(password_hash.split('$')[2]) < BCRYPT_COST
+    except (IndexError, ValueError):
+        return False
@@ -1,14 +1,252 @@
 '''
 Автозаполнение адресов через DaData API
-Args: event с httpMethod, queryStringParameters (query); context с request_id
-Returns: Список подсказок адресов
+Args: event с httpMethod, queryStringParameters (query) или POST body (queries); context с request_id
+Returns: Список подсказок адресов (для POST - по списку на каждый запрос)
 '''
 
 import json
 import os
-from typing import Dict, Any
-import urllib.request
+import re
+import time
+import queue
+import threading
+import http.client
 import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+DADATA_SUGGEST_URL = os.environ.get('DADATA_SUGGEST_URL', 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/')
+DADATA_TIMEOUT_SECONDS = 10
+DADATA_POOL_SIZE = 8
+# Stay under the per-key DaData quota; bursts (batch lookups) queue briefly instead of failing
+DADATA_RATE_PER_SECOND = float(os.environ.get('DADATA_RATE_PER_SECOND', 20))
+DADATA_BURST = int(os.environ.get('DADATA_BURST', 20))
+DADATA_MAX_WAIT_SECONDS = 2.0
+SUGGEST_MIN_QUERY_LENGTH = 3
+SUGGEST_CACHE_SIZE = int(os.environ.get('SUGGEST_CACHE_SIZE', 2048))
+SUGGEST_CACHE_TTL_SECONDS = int(os.environ.get('SUGGEST_CACHE_TTL_SECONDS', 600))
+SUGGEST_COUNT = 5
+BATCH_MAX_QUERIES = 50
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 5))
+
+_WORD = re.compile(r'\w+')
+
+class DaDataError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+_dadata_url = urllib.parse.urlsplit(DADATA_SUGGEST_URL)
+_dadata_connections: 'queue.LifoQueue[http.client.HTTPConnection]' = queue.LifoQueue(maxsize=DADATA_POOL_SIZE)
+
+_bucket_lock = threading.Lock()
+_bucket = {'tokens': float(DADATA_BURST), 'updated': time.monotonic()}
+
+# (kind, count, normalized query) -> (expires_at, suggestions, complete)
+_cache_lock = threading.Lock()
+_suggest_cache: 'OrderedDict[Tuple[str, int, str], Tuple[float, List[Dict[str, Any]], bool]]' = OrderedDict()
+_inflight: Dict[Tuple[str, int, str], Future] = {}
+
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='dadata')
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+def take_rate_token():
+    '''Token bucket in front of DaData: waits up to DADATA_MAX_WAIT_SECONDS for the quota to refill'''
+    deadline = time.monotonic() + DADATA_MAX_WAIT_SECONDS
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket['tokens'] = min(DADATA_BURST, _bucket['tokens'] + (now - _bucket['updated']) * DADATA_RATE_PER_SECOND)
+            _bucket['updated'] = now
+            if _bucket['tokens'] >= 1:
+                _bucket['tokens'] -= 1
+                return
+            wait = (1 - _bucket['tokens']) / DADATA_RATE_PER_SECOND
+        
+        if now + wait > deadline:
+            raise DaDataError(429, 'DaData rate limit exceeded, try again later')
+        time.sleep(wait)
+
+def open_dadata_connection() -> http.client.HTTPConnection:
+    if _dadata_url.scheme == 'http':
+        return http.client.HTTPConnection(_dadata_url.netloc, timeout=DADATA_TIMEOUT_SECONDS)
+    return http.client.HTTPSConnection(_dadata_url.netloc, timeout=DADATA_TIMEOUT_SECONDS)
+
+def dadata_post(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    POST to suggest/<kind> over a pooled keep-alive connection. A pooled
+    connection the server has already closed is retried once on a fresh one.
+    '''
+    api_key = os.environ.get('DADATA_API_KEY')
+    if not api_key:
+        raise DaDataError(500, 'DADATA_API_KEY not configured')
+    
+    take_rate_token()
+    
+    body = json.dumps(payload).encode('utf-8')
+    request_headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Token {api_key}'
+    }
+    path = _dadata_url.path.rstrip('/') + '/' + kind
+    
+    for attempt in range(2):
+        try:
+            conn = _dadata_connections.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = open_dadata_connection()
+            reused = False
+        
+        try:
+            conn.request('POST', path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if reused and attempt == 0:
+                continue
+            raise
+        
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                _dadata_connections.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        
+        if response.status >= 400:
+            raise DaDataError(response.status, f"DaData API error: {data.decode('utf-8', 'replace')}")
+        
+        return json.loads(data.decode('utf-8'))
+
+def suggestion_matches(item: Dict[str, Any], words: List[str]) -> bool:
+    '''DaData-style match: every query word is the prefix of some word of the suggestion'''
+    data = item.get('data') or {}
+    text = ' '.join(str(part) for part in (
+        item.get('unrestricted_value') or item.get('value') or '',
+        data.get('inn') or '',
+        data.get('ogrn') or ''
+    ))
+    tokens = _WORD.findall(text.lower())
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+def cached_suggestions(kind: str, query: str, count: int) -> Optional[List[Dict[str, Any]]]:
+    '''
+    Exact hit, or a narrowing of a shorter cached query whose result was
+    complete (fewer than count suggestions): "моск" answers "москв" locally.
+    '''
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _suggest_cache.get((kind, count, query))
+        if entry and entry[0] > now:
+            _suggest_cache.move_to_end((kind, count, query))
+            return entry[1]
+        
+        words = _WORD.findall(query)
+        for end in range(len(query) - 1, SUGGEST_MIN_QUERY_LENGTH - 1, -1):
+            entry = _suggest_cache.get((kind, count, query[:end]))
+            if entry and entry[0] > now and entry[2]:
+                return [item for item in entry[1] if suggestion_matches(item, words)]
+    
+    return None
+
+def store_suggestions(key: Tuple[str, int, str], suggestions: List[Dict[str, Any]]):
+    with _cache_lock:
+        _suggest_cache[key] = (time.monotonic() + SUGGEST_CACHE_TTL_SECONDS, suggestions, len(suggestions) < key[1])
+        _suggest_cache.move_to_end(key)
+        while len(_suggest_cache) > SUGGEST_CACHE_SIZE:
+            _suggest_cache.popitem(last=False)
+
+def fetch_suggestions(kind: str, query: str, count: int, extra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    '''
+    Raw DaData suggestions for kind ('address' or 'party'): served from the
+    cache when possible, and concurrent identical lookups share one request.
+    Raises DaDataError on quota, configuration or upstream HTTP errors.
+    '''
+    query = normalize_query(query)
+    cached = cached_suggestions(kind, query, count)
+    if cached is not None:
+        return cached
+    
+    key = (kind, count, query)
+    with _cache_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+    
+    if not owner:
+        return future.result(timeout=DADATA_TIMEOUT_SECONDS + DADATA_MAX_WAIT_SECONDS)
+    
+    try:
+        payload = {'query': query, 'count': count}
+        payload.update(extra or {})
+        suggestions = dadata_post(kind, payload).get('suggestions', [])
+        store_suggestions(key, suggestions)
+        future.set_result(suggestions)
+        return suggestions
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+
+def batch_suggest(queries: List[Any]) -> List[Dict[str, Any]]:
+    '''
+    Suggestions for many addresses at once. Duplicates are looked up once,
+    cache misses go to DaData at most BATCH_CONCURRENCY at a time, and the
+    results come back in input order with per-item errors.
+    '''
+    normalized = [normalize_query(query) if isinstance(query, str) else '' for query in queries]
+    futures = {
+        query: _batch_executor.submit(fetch_suggestions, 'address', query, SUGGEST_COUNT)
+        for query in dict.fromkeys(normalized)
+        if len(query) >= SUGGEST_MIN_QUERY_LENGTH
+    }
+    
+    results = []
+    for query, key in zip(queries, normalized):
+        if key not in futures:
+            results.append({'query': query, 'error': 'Query too short (min 3 chars)', 'status': 400})
+            continue
+        try:
+            results.append({'query': query, 'suggestions': futures[key].result()})
+        except DaDataError as e:
+            results.append({'query': query, 'error': str(e), 'status': e.status})
+        except Exception as e:
+            results.append({'query': query, 'error': str(e), 'status': 500})
+    
+    return results
+
+def handle_batch(event: Dict[str, Any], headers_out: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        body_data = json.loads(event.get('body') or '{}')
+    except json.JSONDecodeError:
+        body_data = None
+    
+    queries = body_data.get('queries') if isinstance(body_data, dict) else None
+    if not isinstance(queries, list) or not queries or len(queries) > BATCH_MAX_QUERIES:
+        return {
+            'statusCode': 400,
+            'headers': headers_out,
+            'body': json.dumps({'error': f'queries must be a list of 1-{BATCH_MAX_QUERIES} strings'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': headers_out,
+        'body': json.dumps({'results': batch_suggest(queries)}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -24,7 +262,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
@@ -37,6 +275,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'Access-Control-Allow-Origin': '*'
     }
     
+    if method == 'POST':
+        return handle_batch(event, headers_out)
+    
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -66,34 +307,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        url = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/address'
-        request_data = json.dumps({
-            'query': query,
-            'count': 5
-        }).encode('utf-8')
+        suggestions = fetch_suggestions('address', query, SUGGEST_COUNT)
         
-        req = urllib.request.Request(
-            url,
-            data=request_data,
-            headers={
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': f'Token {dadata_token}'
-            },
-            method='POST'
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            suggestions = result.get('suggestions', [])
-            
-            return {
-                'statusCode': 200,
-                'headers': headers_out,
-                'body': json.dumps({'suggestions': suggestions}),
-                'isBase64Encoded': False
-            }
+        return {
+            'statusCode': 200,
+            'headers': headers_out,
+            'body': json.dumps({'suggestions': suggestions}),
+            'isBase64Encoded': False
+        }
     
+    except DaDataError as e:
+        return {
+            'statusCode': e.status,
+            'headers': headers_out,
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -1,16 +1,31 @@
 import json
 import os
-from typing import Dict, Any
+import base64
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+from auth_middleware import require_admin
+
+SCHEMA = 't_p19166386_bankruptcy_course_cr'
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+BULK_DELETE_MAX = 50000
+# Ключ сортировки списка; выражение совпадает с индексом idx_users_listing_sort_key.
+# Пользователи без created_at идут в конце, а не обрывают keyset-сравнение с NULL
+LIST_SORT_KEY_SQL = "COALESCE(u.created_at, '-infinity'::timestamp)"
+
+
+@require_admin
+def handler(event: Dict[str, Any], context: Any, admin: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     '''
     Управление пользователями для администратора
     
     Args:
-        event - dict с httpMethod, body
+        event - dict с httpMethod, body, headers (X-Auth-Token администратора)
         context - object с request_id, function_name, etc
+        admin - claims администратора из require_admin
     Returns: 
         HTTP response dict с списком пользователей или результатом удаления
     '''
@@ -22,7 +37,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -59,14 +74,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        print(f'[DEBUG] Action: {action}')
+        print(f'[DEBUG] Action: {action} by admin {admin.get("email")}')
         print(f'[DEBUG] Body data: {body_data}')
         
         conn = psycopg2.connect(dsn)
         print('[DEBUG] Database connected')
         
         if action == 'list':
-            return list_users(conn)
+            return list_users(conn, body_data)
         elif action == 'delete':
             user_id = body_data.get('user_id')
             print(f'[DEBUG] Deleting user_id: {user_id}')
@@ -78,6 +93,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             return delete_user(conn, user_id)
+        elif action == 'bulk_delete':
+            return bulk_delete_users(conn, body_data)
         else:
             return {
                 'statusCode': 400,
@@ -102,11 +119,91 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             print('[DEBUG] Database connection closed')
 
 
-def list_users(conn) -> Dict[str, Any]:
-    '''Получить список всех пользователей с информацией о подписках'''
+def encode_cursor(created_at, user_id: int) -> str:
+    raw = f"{created_at.isoformat() if created_at else '-infinity'}|{user_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: Any):
+    '''Разбор cursor из ответа list; ValueError для подделанного или повреждённого значения'''
+    if not isinstance(cursor, str):
+        raise ValueError('cursor must be a string')
+    created_at, user_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+    return (created_at if created_at == '-infinity' else datetime.fromisoformat(created_at)), int(user_id)
+
+
+def list_users(conn, body_data: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Постраничный список пользователей с информацией о подписках.
+    Keyset-пагинация по (created_at, id): cursor из ответа передаётся в следующий запрос,
+    пользователи без created_at идут в конце списка.
+    Фильтры: email_prefix, product, is_admin, course_expires_from/course_expires_to.
+    Вместо точного COUNT(*) возвращается оценка планировщика total_estimate.
+    '''
+    try:
+        limit = min(max(int(body_data.get('limit') or LIST_PAGE_SIZE), 1), LIST_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid limit'}),
+            'isBase64Encoded': False
+        }
+    filters = body_data.get('filter') or {}
+    
+    conditions = []
+    params: Dict[str, Any] = {}
+    
+    if filters.get('email_prefix'):
+        conditions.append('lower(u.email) LIKE %(email_prefix)s')
+        params['email_prefix'] = filters['email_prefix'].lower().replace('%', '\\%').replace('_', '\\_') + '%'
+    if filters.get('product'):
+        conditions.append('u.purchased_product = %(product)s')
+        params['product'] = filters['product']
+    if filters.get('is_admin') is not None:
+        conditions.append('u.is_admin = %(is_admin)s')
+        params['is_admin'] = bool(filters['is_admin'])
+    if filters.get('course_expires_from'):
+        conditions.append('ce.course_expires_at >= %(course_expires_from)s')
+        params['course_expires_from'] = filters['course_expires_from']
+    if filters.get('course_expires_to'):
+        conditions.append('ce.course_expires_at < %(course_expires_to)s')
+        params['course_expires_to'] = filters['course_expires_to']
+    
+    filter_sql = ' AND '.join(conditions) if conditions else 'TRUE'
+    
+    page_conditions = [filter_sql]
+    if body_data.get('cursor'):
+        try:
+            cursor_created_at, cursor_id = decode_cursor(body_data['cursor'])
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid cursor'}),
+                'isBase64Encoded': False
+            }
+        page_conditions.append(f'({LIST_SORT_KEY_SQL}, u.id) < (%(cursor_created_at)s::timestamp, %(cursor_id)s)')
+        params['cursor_created_at'] = cursor_created_at
+        params['cursor_id'] = cursor_id
+    params['limit'] = limit
+    
+    # Срок курса считается LATERAL-подзапросом только для строк страницы,
+    # а частичный индекс idx_user_purchases_course_expiry превращает MAX в чтение одной записи индекса
+    from_sql = f'''
+        FROM {SCHEMA}.users u
+        LEFT JOIN LATERAL (
+            SELECT MAX(up.expires_at) AS course_expires_at
+            FROM {SCHEMA}.user_purchases up
+            WHERE up.user_id = u.id
+            AND up.payment_status = 'completed'
+            AND up.product_type IN ('course', 'combo')
+        ) ce ON TRUE
+    '''
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        query = '''
+        cur.execute(
+            f'''
             SELECT 
                 u.id,
                 u.email,
@@ -116,20 +213,23 @@ def list_users(conn) -> Dict[str, Any]:
                 u.chat_expires_at,
                 u.purchased_product,
                 u.password_changed_by_user,
-                (
-                    SELECT MAX(up.expires_at) 
-                    FROM t_p19166386_bankruptcy_course_cr.user_purchases up 
-                    WHERE up.user_id = u.id 
-                    AND up.payment_status = 'completed'
-                    AND up.product_type IN ('course', 'combo')
-                ) as course_expires_at
-            FROM t_p19166386_bankruptcy_course_cr.users u
-            ORDER BY u.created_at DESC
-        '''
-        
-        cur.execute(query)
+                ce.course_expires_at
+            {from_sql}
+            WHERE {' AND '.join(page_conditions)}
+            ORDER BY {LIST_SORT_KEY_SQL} DESC, u.id DESC
+            LIMIT %(limit)s
+            ''',
+            params
+        )
         users = cur.fetchall()
         
+        if conditions:
+            cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql} WHERE {filter_sql}", params)
+            total_estimate = int(cur.fetchone()['QUERY PLAN'][0]['Plan']['Plan Rows'])
+        else:
+            cur.execute(f"SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = '{SCHEMA}.users'::regclass")
+            total_estimate = max(int(cur.fetchone()['estimate']), 0)
+        
         users_list = []
         for user in users:
             users_list.append({
@@ -144,85 +244,172 @@ def list_users(conn) -> Dict[str, Any]:
                 'password_changed_by_user': user['password_changed_by_user']
             })
         
+        next_cursor = None
+        if len(users) == limit:
+            next_cursor = encode_cursor(users[-1]['created_at'], users[-1]['id'])
+        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'users': users_list}),
+            'body': json.dumps({
+                'success': True,
+                'users': users_list,
+                'next_cursor': next_cursor,
+                'total_estimate': max(total_estimate, len(users_list))
+            }),
             'isBase64Encoded': False
         }
 
 
+# Порядок важен: сначала дочерние таблицы, затем родительские
+USER_DEPENDENT_DELETES = [
+    ('password_reset_tokens', f"DELETE FROM {SCHEMA}.password_reset_tokens WHERE user_id = ANY(%(ids)s)"),
+    ('support_message_reactions', f"""
+        DELETE FROM {SCHEMA}.support_message_reactions
+        WHERE user_id = ANY(%(ids)s)
+           OR message_id IN (SELECT id FROM {SCHEMA}.support_messages WHERE user_id = ANY(%(ids)s))
+    """),
+    ('support_message_replies', f"""
+        UPDATE {SCHEMA}.support_messages SET reply_to_id = NULL
+        WHERE reply_to_id IN (SELECT id FROM {SCHEMA}.support_messages WHERE user_id = ANY(%(ids)s))
+          AND NOT (user_id = ANY(%(ids)s))
+    """),
+    ('support_messages', f"DELETE FROM {SCHEMA}.support_messages WHERE user_id = ANY(%(ids)s)"),
+    ('chat_tokens', f"DELETE FROM {SCHEMA}.chat_tokens WHERE user_id = ANY(%(ids)s)"),
+    ('user_purchases', f"DELETE FROM {SCHEMA}.user_purchases WHERE user_id = ANY(%(ids)s)"),
+    ('chat_access', f"DELETE FROM {SCHEMA}.chat_access WHERE user_id = ANY(%(ids)s)"),
+    ('user_progress', f"DELETE FROM {SCHEMA}.user_progress WHERE user_id = ANY(%(ids)s)"),
+    ('email_logs', f"DELETE FROM {SCHEMA}.email_logs WHERE user_id = ANY(%(ids)s)"),
+]
+
+
+def delete_users(conn, user_ids: List[int]) -> Dict[str, int]:
+    '''
+    Удаление набора пользователей и всех связанных данных одной транзакцией:
+    по одному set-based запросу на таблицу вместо запроса на каждого пользователя.
+    Возвращает количество затронутых строк по таблицам.
+    '''
+    counts: Dict[str, int] = {}
+    
+    with conn.cursor() as cur:
+        params = {'ids': list(user_ids)}
+        for table_name, query in USER_DEPENDENT_DELETES:
+            cur.execute(query, params)
+            counts[table_name] = cur.rowcount
+        
+        cur.execute(f"DELETE FROM {SCHEMA}.users WHERE id = ANY(%(ids)s) AND is_admin IS NOT TRUE", params)
+        counts['users'] = cur.rowcount
+    
+    conn.commit()
+    return counts
+
+
 def delete_user(conn, user_id: int) -> Dict[str, Any]:
     '''Безопасное удаление пользователя и всех связанных данных'''
     
     print(f'[DEBUG] Starting delete_user for ID: {user_id}')
     
-    # Используем autocommit для Simple Query Protocol
-    conn.autocommit = True
-    
     with conn.cursor() as cur:
         # Проверяем, не является ли пользователь админом
-        query = f"SELECT is_admin FROM t_p19166386_bankruptcy_course_cr.users WHERE id = {user_id}"
-        print(f'[DEBUG] Executing query: {query}')
-        cur.execute(query)
+        cur.execute(f"SELECT is_admin FROM {SCHEMA}.users WHERE id = %s", (int(user_id),))
         result = cur.fetchone()
-        
-        if not result:
-            print(f'[DEBUG] User not found: {user_id}')
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'User not found'}),
-                'isBase64Encoded': False
-            }
-        
-        if result[0]:  # is_admin = True
-            print(f'[DEBUG] Cannot delete admin user: {user_id}')
-            return {
-                'statusCode': 403,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Cannot delete admin user'}),
-                'isBase64Encoded': False
-            }
-        
-        print(f'[DEBUG] Starting cascade delete for user: {user_id}')
-        
-        # Удаляем связанные данные в правильном порядке (от дочерних к родительским)
-        # Используем try-except для каждой таблицы, чтобы продолжить даже при ошибках
-        
-        tables_to_delete = [
-            ('password_reset_tokens', f"DELETE FROM t_p19166386_bankruptcy_course_cr.password_reset_tokens WHERE user_id = {user_id}"),
-            ('support_message_reactions', f"""
-                DELETE FROM t_p19166386_bankruptcy_course_cr.support_message_reactions 
-                WHERE message_id IN (
-                    SELECT id FROM t_p19166386_bankruptcy_course_cr.support_messages 
-                    WHERE user_id = {user_id}
-                )
-            """),
-            ('support_messages', f"DELETE FROM t_p19166386_bankruptcy_course_cr.support_messages WHERE user_id = {user_id}"),
-            ('chat_tokens', f"DELETE FROM t_p19166386_bankruptcy_course_cr.chat_tokens WHERE user_id = {user_id}"),
-            ('chat_access', f"DELETE FROM t_p19166386_bankruptcy_course_cr.chat_access WHERE user_id = {user_id}"),
-            ('user_progress', f"DELETE FROM t_p19166386_bankruptcy_course_cr.user_progress WHERE user_id = {user_id}"),
-            ('user_purchases', f"DELETE FROM t_p19166386_bankruptcy_course_cr.user_purchases WHERE user_id = {user_id}"),
-            ('email_logs', f"DELETE FROM t_p19166386_bankruptcy_course_cr.email_logs WHERE user_id = {user_id}"),
-        ]
-        
-        for table_name, query in tables_to_delete:
-            try:
-                cur.execute(query)
-                print(f'[DEBUG] Deleted from {table_name}')
-            except Exception as table_error:
-                print(f'[WARNING] Could not delete from {table_name}: {str(table_error)}')
-        
-        # Удаляем самого пользователя (это критично, поэтому не ловим ошибку)
-        cur.execute(f"DELETE FROM t_p19166386_bankruptcy_course_cr.users WHERE id = {user_id}")
-        print(f'[DEBUG] Deleted user')
-        
-        print(f'[DEBUG] User {user_id} successfully deleted')
-        
+    
+    if not result:
+        print(f'[DEBUG] User not found: {user_id}')
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'User not found'}),
+            'isBase64Encoded': False
+        }
+    
+    if result[0]:  # is_admin = True
+        print(f'[DEBUG] Cannot delete admin user: {user_id}')
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Cannot delete admin user'}),
+            'isBase64Encoded': False
+        }
+    
+    counts = delete_users(conn, [int(user_id)])
+    print(f'[DEBUG] User {user_id} successfully deleted: {counts}')
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, 'message': 'User deleted successfully', 'deleted': counts}),
+        'isBase64Encoded': False
+    }
+
+
+def bulk_delete_users(conn, body_data: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Массовое удаление пользователей (тестовые и спам-аккаунты).
+    Принимает user_ids или filter: email_prefix, email_domain, created_before,
+    without_purchases. Администраторы никогда не удаляются. dry_run только считает.
+    '''
+    user_ids = body_data.get('user_ids')
+    filters = body_data.get('filter') or {}
+    
+    conditions = ['is_admin IS NOT TRUE']
+    params: Dict[str, Any] = {'limit': BULK_DELETE_MAX + 1}
+    
+    if user_ids:
+        conditions.append('id = ANY(%(ids)s)')
+        params['ids'] = [int(uid) for uid in user_ids]
+    if filters.get('email_prefix'):
+        conditions.append("lower(email) LIKE %(email_prefix)s")
+        params['email_prefix'] = filters['email_prefix'].lower().replace('%', '\\%').replace('_', '\\_') + '%'
+    if filters.get('email_domain'):
+        conditions.append("email LIKE %(email_domain)s")
+        params['email_domain'] = '%@' + filters['email_domain'].lstrip('@').replace('%', '\\%').replace('_', '\\_')
+    if filters.get('created_before'):
+        conditions.append('created_at < %(created_before)s')
+        params['created_before'] = filters['created_before']
+    if filters.get('without_purchases'):
+        conditions.append(f"NOT EXISTS (SELECT 1 FROM {SCHEMA}.user_purchases up WHERE up.user_id = u.id AND up.payment_status = 'completed')")
+    
+    if len(conditions) == 1:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'user_ids or filter required'}),
+            'isBase64Encoded': False
+        }
+    
+    with conn.cursor() as cur:
+        # FOR UPDATE фиксирует выбранных пользователей до конца транзакции удаления
+        cur.execute(
+            f"SELECT id FROM {SCHEMA}.users u WHERE {' AND '.join(conditions)} ORDER BY id LIMIT %(limit)s FOR UPDATE",
+            params
+        )
+        matched_ids = [row[0] for row in cur.fetchall()]
+    
+    if len(matched_ids) > BULK_DELETE_MAX:
+        conn.rollback()
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Filter matches more than {BULK_DELETE_MAX} users, narrow it down'}),
+            'isBase64Encoded': False
+        }
+    
+    if body_data.get('dry_run') or not matched_ids:
+        conn.rollback()
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'message': 'User deleted successfully'}),
+            'body': json.dumps({'success': True, 'dry_run': bool(body_data.get('dry_run')), 'matched': len(matched_ids), 'deleted': {}}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    
+    counts = delete_users(conn, matched_ids)
+    print(f'[DEBUG] Bulk deleted {len(matched_ids)} users: {counts}')
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, 'dry_run': False, 'matched': len(matched_ids), 'deleted': counts}),
+        'isBase64Encoded': False
+    }
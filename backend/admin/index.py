@@ -6,38 +6,33 @@ Returns: Course management data or error messages
 
 import json
 import os
-import jwt
-from typing import Dict, Any, Optional
+import io
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+from chat_token_pool import claim_pool_tokens, refill_chat_token_pool, generate_token_batch
+from auth_middleware import require_admin
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
-def verify_admin(headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-    if not auth_token:
-        return None
-    
-    # Allow admin_session_token for admin panel access
-    if auth_token == 'admin_session_token':
-        return {'is_admin': True, 'id': 0, 'email': 'admin@session'}
-    
-    try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return None
-        
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-        
-        if not payload.get('is_admin'):
-            return None
-        
-        return payload
-    except:
-        return None
+TOKEN_GENERATE_MAX = 1000000
+TOKEN_ASSIGN_MAX = 1000
+TOKEN_GENERATE_CHUNK = 100000
+
+EXPORT_PAGE_SIZE = 10000
+EXPORT_MAX_PAGE_SIZE = 50000
+EXPORT_FETCH_SIZE = 2000
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8'
+}
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@require_admin
+def handler(event: Dict[str, Any], context: Any, admin: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -57,14 +52,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'Access-Control-Allow-Origin': '*'
     }
     
-    admin = verify_admin(event.get('headers', {}))
-    if not admin:
-        return {
-            'statusCode': 403,
-            'headers': headers_out,
-            'body': json.dumps({'error': 'Admin access required'})
-        }
-    
     try:
         params = event.get('queryStringParameters') or {}
         resource = params.get('resource', 'modules')
@@ -79,6 +66,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return handle_generate_tokens(method, event, headers_out)
         elif resource == 'export-tokens':
             return handle_export_tokens(method, event, headers_out)
+        elif resource == 'assign-tokens':
+            return handle_assign_tokens(method, event, headers_out)
         else:
             return {
                 'statusCode': 404,
@@ -266,11 +255,33 @@ def handle_materials(method: str, event: Dict[str, Any], headers: Dict[str, str]
     finally:
         conn.close()
 
+def load_generated_tokens(cur, count: int, expires_at: datetime) -> int:
+    '''
+    Stream freshly generated tokens into a temp staging table with COPY, then
+    merge them into chat_tokens_pool with one INSERT ... SELECT. Returns the
+    exact number of inserted rows.
+    '''
+    cur.execute("CREATE TEMP TABLE chat_tokens_pool_staging (token VARCHAR(100) NOT NULL) ON COMMIT DROP")
+    
+    remaining = count
+    while remaining > 0:
+        batch_size = min(remaining, TOKEN_GENERATE_CHUNK)
+        buffer = io.StringIO('\n'.join(generate_token_batch(batch_size)) + '\n')
+        cur.copy_expert("COPY chat_tokens_pool_staging (token) FROM STDIN", buffer)
+        remaining -= batch_size
+    
+    cur.execute(
+        """
+        INSERT INTO chat_tokens_pool (token, expires_at)
+        SELECT DISTINCT token, %s FROM chat_tokens_pool_staging
+        ON CONFLICT (token) DO NOTHING
+        """,
+        (expires_at,)
+    )
+    return cur.rowcount
+
 def handle_generate_tokens(method: str, event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    '''Generate 1000 tokens for chat access pool'''
-    import hashlib
-    import time
-    from datetime import datetime, timedelta
+    '''Generate tokens for chat access pool (1000 by default)'''
     
     if method != 'POST':
         return {
@@ -279,29 +290,26 @@ def handle_generate_tokens(method: str, event: Dict[str, Any], headers: Dict[str
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
+    try:
+        body = json.loads(event.get('body') or '{}')
+        count = int(body.get('count', 1000))
+    except (ValueError, TypeError, AttributeError):
+        count = 0
+    
+    if count < 1 or count > TOKEN_GENERATE_MAX:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'count must be between 1 and {TOKEN_GENERATE_MAX}'})
+        }
+    
     conn = get_db_connection()
     try:
-        body = json.loads(event.get('body', '{}'))
-        count = body.get('count', 1000)
-        
         expires_date = datetime.now() + timedelta(days=365)
         
-        tokens_batch = []
-        base_time = time.time()
-        for i in range(count):
-            unique_string = f"{base_time}{i}{os.urandom(8).hex()}"
-            token = f"CHAT_{hashlib.sha256(unique_string.encode()).hexdigest()[:32].upper()}"
-            tokens_batch.append((token, expires_date))
-        
         with conn.cursor() as cur:
-            psycopg2.extras.execute_values(
-                cur,
-                "INSERT INTO chat_tokens_pool (token, expires_at) VALUES %s ON CONFLICT (token) DO NOTHING",
-                tokens_batch,
-                page_size=500
-            )
-            generated_count = cur.rowcount
-            conn.commit()
+            generated_count = load_generated_tokens(cur, count, expires_date)
+        conn.commit()
         
         return {
             'statusCode': 200,
@@ -323,7 +331,13 @@ def handle_generate_tokens(method: str, event: Dict[str, Any], headers: Dict[str
         conn.close()
 
 def handle_export_tokens(method: str, event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    '''Export all unused tokens from chat_tokens_pool'''
+    '''
+    Export unused tokens from chat_tokens_pool page by page.
+    Query params: format (json | ndjson | csv | txt), limit (page size), cursor
+    (next_cursor of the previous page). Pages are keyset-paginated by id and read
+    through a server-side cursor, so memory is bounded by the page size no
+    matter how big the pool is.
+    '''
     
     if method != 'GET':
         return {
@@ -332,38 +346,162 @@ def handle_export_tokens(method: str, event: Dict[str, Any], headers: Dict[str,
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
+    params = event.get('queryStringParameters') or {}
+    export_format = params.get('format', 'json')
+    if export_format != 'json' and export_format not in EXPORT_CONTENT_TYPES:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'Unknown format: {export_format}'})
+        }
+    
+    try:
+        limit = min(max(int(params.get('limit', EXPORT_PAGE_SIZE)), 1), EXPORT_MAX_PAGE_SIZE)
+        after_id = int(params['cursor']) if params.get('cursor') else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'limit and cursor must be integers'})
+        }
+    
     conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
-            # Получаем ВСЕ неиспользованные токены без ограничений
-            cur.execute("""
-                SELECT token 
-                FROM chat_tokens_pool 
-                WHERE is_used = false 
-                ORDER BY created_at DESC
-            """)
-            
-            # Получаем все строки
-            rows = cur.fetchall()
-            
-            # Извлекаем только токены из кортежей
-            tokens = [row[0] for row in rows]
-            
+        # Newest tokens first, same order as before; id follows created_at
+        query = "SELECT id, token, expires_at FROM chat_tokens_pool WHERE is_used = false"
+        query_params: List[Any] = []
+        if after_id is not None:
+            query += " AND id < %s"
+            query_params.append(after_id)
+        query += " ORDER BY id DESC LIMIT %s"
+        query_params.append(limit)
+        
+        lines: List[str] = []
+        tokens: List[str] = []
+        last_id = None
+        count = 0
+        
+        if export_format == 'csv':
+            lines.append('token,expires_at')
+        
+        with conn.cursor(name='export_tokens') as cur:
+            cur.execute(query, query_params)
+            while True:
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                for row_id, token, expires_at in rows:
+                    if export_format == 'json':
+                        tokens.append(token)
+                    elif export_format == 'ndjson':
+                        lines.append(json.dumps({'token': token, 'expires_at': expires_at.isoformat() if expires_at else None}))
+                    elif export_format == 'csv':
+                        lines.append(f"{token},{expires_at.isoformat() if expires_at else ''}")
+                    else:
+                        lines.append(token)
+                count += len(rows)
+                last_id = rows[-1][0]
+        
+        next_cursor = str(last_id) if count == limit else None
+        
+        if export_format == 'json':
             return {
                 'statusCode': 200,
                 'headers': headers,
                 'body': json.dumps({
                     'success': True,
-                    'count': len(tokens),
-                    'tokens': tokens
+                    'count': count,
+                    'tokens': tokens,
+                    'next_cursor': next_cursor
                 })
             }
         
+        text_headers = {
+            **headers,
+            'Content-Type': EXPORT_CONTENT_TYPES[export_format],
+            'X-Token-Count': str(count),
+            'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Token-Count'
+        }
+        if next_cursor:
+            text_headers['X-Next-Cursor'] = next_cursor
+        
+        return {
+            'statusCode': 200,
+            'headers': text_headers,
+            'body': '\n'.join(lines) + '\n' if lines else ''
+        }
+        
     except Exception as e:
         return {
             'statusCode': 500,
             'headers': headers,
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        conn.close()
+
+def handle_assign_tokens(method: str, event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    '''Claim N tokens from chat_tokens_pool for a user and register them in chat_tokens'''
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    try:
+        body = json.loads(event.get('body') or '{}')
+        user_id = int(body.get('user_id'))
+        email = body.get('email')
+        count = int(body.get('count', 1))
+        product_type = body.get('product_type', 'chat')
+    except (ValueError, TypeError, AttributeError):
+        user_id, email, count = None, None, 0
+    
+    if not user_id or not email or count < 1 or count > TOKEN_ASSIGN_MAX:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'user_id, email and count between 1 and {TOKEN_ASSIGN_MAX} are required'})
+        }
+    
+    days = 30 if product_type in ['chat', 'combo'] else 180
+    expires_at = datetime.now() + timedelta(days=days)
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            tokens = claim_pool_tokens(cur, user_id, email, count)
+            if len(tokens) < count:
+                conn.rollback()
+                return {
+                    'statusCode': 409,
+                    'headers': headers,
+                    'body': json.dumps({'error': f'Only {len(tokens)} free tokens available', 'available': len(tokens)})
+                }
+            
+            execute_values(
+                cur,
+                "INSERT INTO chat_tokens (user_id, email, token, product_type, expires_at) VALUES %s",
+                [(user_id, email, token, product_type, expires_at) for token in tokens],
+                page_size=len(tokens)
+            )
+        conn.commit()
+        
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            refilled = refill_chat_token_pool(cur)
+        conn.commit()
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'success': True,
+                'tokens': tokens,
+                'expires_at': expires_at.isoformat(),
+                'refilled': refilled
+            })
+        }
     finally:
         conn.close()
\ No newline at end of file
@@ -6,13 +6,33 @@ Returns: JWT tokens for authenticated users or error messages
 
 import json
 import os
+import time
+import random
 import jwt
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, Tuple
 import psycopg2
 import psycopg2.extensions
 
+from auth_middleware import decode_token_cached, require_auth
+from password_hashing import hash_password, needs_rehash
+
+# bcrypt releases the GIL while hashing, so a small pool really runs in parallel
+_hash_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('HASH_WORKERS', 2)), thread_name_prefix='bcrypt')
+
+LOGIN_WINDOW_SECONDS = int(os.environ.get('LOGIN_WINDOW_SECONDS', 900))
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL', 5))
+LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 30))
+LOGIN_THROTTLE_MAX_KEYS = 10000
+# RFC 5321 limit; also keeps 'email:' keys inside login_throttle.throttle_key VARCHAR(320)
+EMAIL_MAX_LENGTH = 254
+LOGIN_THROTTLE_CLEANUP_PROBABILITY = 0.01
+
+# throttle key -> [window index, failures in that window, failures in the window before]
+_login_failures: Dict[str, List[int]] = {}
+
 def get_db_connection():
     db_url = os.environ['DATABASE_URL']
     # Mask password for logging
@@ -53,6 +73,127 @@ def get_db_connection():
             print(f"[DB] Users table accessible: False (error={str(e)})")
     return conn
 
+def rehash_password(conn, cur, user_id: int, password: str, old_hash: str):
+    '''
+    Upgrade a stored hash after a successful login. Runs inline: it happens once
+    per user, and work left running after the response may never finish on a
+    frozen instance. The UPDATE only applies if the hash was not changed
+    concurrently, and any failure just leaves the old (still valid) hash.
+    '''
+    try:
+        new_hash = hash_password(password)
+        safe_user_id = str(int(user_id))
+        safe_new_hash = new_hash.replace("'", "''")
+        safe_old_hash = old_hash.replace("'", "''")
+        cur.execute(
+            f"UPDATE users SET password_hash = '{safe_new_hash}' WHERE id = {safe_user_id} AND password_hash = '{safe_old_hash}'"
+        )
+        conn.commit()
+        print(f"[BCRYPT] Rehashed password for user {user_id}")
+    except Exception as e:
+        conn.rollback()
+        print(f"[BCRYPT] Rehash failed for user {user_id}: {str(e)}")
+
+def get_client_ip(event: Dict[str, Any]) -> Optional[str]:
+    '''
+    The address the platform saw the connection come from. X-Forwarded-For is
+    ignored: the client writes it, so rotating it would give every attempt a
+    fresh per-IP bucket.
+    '''
+    return ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+
+def login_throttle_keys(email: str, client_ip: Optional[str]) -> List[Tuple[str, int]]:
+    keys = [(f"email:{email.strip().lower()}", LOGIN_MAX_FAILURES_PER_EMAIL)]
+    if client_ip:
+        keys.append((f"ip:{client_ip}", LOGIN_MAX_FAILURES_PER_IP))
+    return keys
+
+def recent_failures(key: str, now: float) -> float:
+    '''
+    Sliding-window estimate from two fixed windows: the previous window's count
+    is weighted by how much of it still overlaps the last LOGIN_WINDOW_SECONDS.
+    '''
+    entry = _login_failures.get(key)
+    if not entry:
+        return 0
+    
+    window = int(now // LOGIN_WINDOW_SECONDS)
+    entry_window, current, previous = entry
+    if entry_window == window - 1:
+        current, previous = 0, current
+    elif entry_window != window:
+        return 0
+    
+    overlap = 1 - (now % LOGIN_WINDOW_SECONDS) / LOGIN_WINDOW_SECONDS
+    return previous * overlap + current
+
+def set_local_failures(key: str, window: int, current: int, previous: int):
+    if key not in _login_failures and len(_login_failures) >= LOGIN_THROTTLE_MAX_KEYS:
+        # Drop everything older than the sliding window; if that is not enough, start over
+        for stale_key in [k for k, v in _login_failures.items() if v[0] < window - 1]:
+            del _login_failures[stale_key]
+        if len(_login_failures) >= LOGIN_THROTTLE_MAX_KEYS:
+            _login_failures.clear()
+    _login_failures[key] = [window, current, previous]
+
+def is_login_throttled(keys: List[Tuple[str, int]], now: float) -> bool:
+    return any(recent_failures(key, now) >= limit for key, limit in keys)
+
+def sync_shared_failures(cur, keys: List[Tuple[str, int]], now: float):
+    '''Adopt the counters other instances wrote to login_throttle for these keys'''
+    window = int(now // LOGIN_WINDOW_SECONDS)
+    key_list = ', '.join("'" + key.replace("'", "''") + "'" for key, _ in keys)
+    
+    # goauth-proxy only handles SELECT *: columns are throttle_key, window_start, attempts
+    cur.execute(
+        f"SELECT * FROM login_throttle WHERE throttle_key IN ({key_list}) AND window_start >= {(window - 1) * LOGIN_WINDOW_SECONDS}"
+    )
+    shared: Dict[str, Dict[int, int]] = {}
+    for row in cur.fetchall():
+        shared.setdefault(row[0], {})[int(row[1]) // LOGIN_WINDOW_SECONDS] = int(row[2])
+    
+    for key, _ in keys:
+        counts = shared.get(key)
+        if counts:
+            set_local_failures(key, window, counts.get(window, 0), counts.get(window - 1, 0))
+
+def record_login_failure(cur, keys: List[Tuple[str, int]], now: float):
+    window = int(now // LOGIN_WINDOW_SECONDS)
+    window_start = window * LOGIN_WINDOW_SECONDS
+    
+    for key, _ in keys:
+        entry = _login_failures.get(key)
+        if entry and entry[0] == window:
+            entry[1] += 1
+        elif entry and entry[0] == window - 1:
+            set_local_failures(key, window, 1, entry[1])
+        else:
+            set_local_failures(key, window, 1, 0)
+    
+    values = ', '.join(
+        "('" + key.replace("'", "''") + f"', {window_start}, 1)" for key, _ in keys
+    )
+    cur.execute(
+        f"INSERT INTO login_throttle (throttle_key, window_start, attempts) VALUES {values} "
+        f"ON CONFLICT (throttle_key, window_start) DO UPDATE SET attempts = login_throttle.attempts + 1"
+    )
+    if random.random() < LOGIN_THROTTLE_CLEANUP_PROBABILITY:
+        cur.execute(f"DELETE FROM login_throttle WHERE window_start < {(window - 1) * LOGIN_WINDOW_SECONDS}")
+
+def clear_login_failures(cur, key: str):
+    _login_failures.pop(key, None)
+    safe_key = key.replace("'", "''")
+    cur.execute(f"DELETE FROM login_throttle WHERE throttle_key = '{safe_key}'")
+
+def too_many_attempts_response(headers: Dict[str, str], now: float) -> Dict[str, Any]:
+    retry_after = LOGIN_WINDOW_SECONDS - int(now % LOGIN_WINDOW_SECONDS)
+    return {
+        'statusCode': 429,
+        'headers': {**headers, 'Retry-After': str(retry_after)},
+        'body': json.dumps({'error': 'Too many login attempts, try again later'}),
+        'isBase64Encoded': False
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -82,7 +223,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if action == 'register':
                 return register_user(body_data, headers)
             elif action == 'login':
-                return login_user(body_data, headers)
+                return login_user(body_data, headers, get_client_ip(event))
             elif action == 'change_password':
                 return change_password(body_data, event, headers)
             else:
@@ -100,16 +241,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if chat_token:
                 return verify_chat_token(chat_token, headers)
             
-            auth_token = event.get('headers', {}).get('X-Auth-Token') or event.get('headers', {}).get('x-auth-token')
-            if not auth_token:
-                return {
-                    'statusCode': 401,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'No token provided'}),
-                    'isBase64Encoded': False
-                }
-            
-            return validate_token(auth_token, headers)
+            return validate_token(event, context)
         
         return {
             'statusCode': 405,
@@ -143,10 +275,12 @@ def register_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
             'isBase64Encoded': False
         }
     
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # Hash on the pool while the connection is being set up
+    password_hash_future = _hash_executor.submit(hash_password, password)
     
     conn = get_db_connection()
     try:
+        password_hash = password_hash_future.result()
         with conn.cursor() as cur:
             # Use string formatting for Simple Query Protocol
             safe_email = email.replace("'", "''")
@@ -197,12 +331,10 @@ def register_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
     finally:
         conn.close()
 
-def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+def login_user(data: Dict[str, Any], headers: Dict[str, str], client_ip: Optional[str] = None) -> Dict[str, Any]:
     email = data.get('email')
     password = data.get('password')
     
-    print(f"[LOGIN] Attempting login for email: {email}")
-    
     if not email or not password:
         return {
             'statusCode': 400,
@@ -211,9 +343,32 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    if not isinstance(email, str) or not isinstance(password, str) or len(email) > EMAIL_MAX_LENGTH:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid email'}),
+            'isBase64Encoded': False
+        }
+    
+    print(f"[LOGIN] Attempting login for email: {email}")
+    
+    now = time.time()
+    throttle_keys = login_throttle_keys(email, client_ip)
+    
+    # Already over the limit on this instance: no DB round trip, no bcrypt
+    if is_login_throttled(throttle_keys, now):
+        print(f"[LOGIN] Throttled locally: email={email}, ip={client_ip}")
+        return too_many_attempts_response(headers, now)
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
+            sync_shared_failures(cur, throttle_keys, now)
+            if is_login_throttled(throttle_keys, now):
+                print(f"[LOGIN] Throttled by shared counters: email={email}, ip={client_ip}")
+                return too_many_attempts_response(headers, now)
+            
             print(f"[LOGIN] Executing SELECT query for email: {email}")
             
             # CRITICAL: goauth-proxy bug - specific column names don't work, only SELECT *
@@ -255,6 +410,8 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
             
             if not user:
                 print(f"[LOGIN] User not found for email: {email}")
+                record_login_failure(cur, throttle_keys, now)
+                conn.commit()
                 return {
                     'statusCode': 401,
                     'headers': headers,
@@ -264,6 +421,8 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
             
             print(f"[LOGIN] Checking password for user {user['id']}")
             if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+                record_login_failure(cur, throttle_keys, now)
+                conn.commit()
                 return {
                     'statusCode': 401,
                     'headers': headers,
@@ -271,6 +430,13 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            if recent_failures(throttle_keys[0][0], now):
+                clear_login_failures(cur, throttle_keys[0][0])
+                conn.commit()
+            
+            if needs_rehash(user['password_hash']):
+                rehash_password(conn, cur, user['id'], password, user['password_hash'])
+            
             token = generate_token(dict(user))
             
             return {
@@ -293,71 +459,52 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
     finally:
         conn.close()
 
-def validate_token(token: str, headers: Dict[str, str]) -> Dict[str, Any]:
+@require_auth(admin_session=False)
+def validate_token(event: Dict[str, Any], context: Any, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    '''require_auth has already answered 401 for a missing, expired or invalid token'''
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    user_id = payload['id']
+    
+    conn = get_db_connection()
     try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return {
-                'statusCode': 500,
-                'headers': headers,
-                'body': json.dumps({'error': 'JWT_SECRET not configured'}),
-                'isBase64Encoded': False
+        with conn.cursor() as cur:
+            # Use string formatting for Simple Query Protocol
+            safe_user_id = str(int(user_id))  # Ensure it's a safe integer
+            cur.execute(
+                f"SELECT COUNT(*) as has_access FROM user_purchases WHERE user_id = {safe_user_id} AND payment_status = 'completed' AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)"
+            )
+            access_count = cur.fetchone()[0]
+            has_course_access = access_count > 0 or payload.get('is_admin', False)
+            
+            # Получаем chat_expires_at и expires_at из users
+            cur.execute(
+                f"SELECT chat_expires_at, expires_at FROM users WHERE id = {safe_user_id}"
+            )
+            user_row = cur.fetchone()
+            user_data = {'chat_expires_at': user_row[0], 'expires_at': user_row[1]} if user_row else None
+    finally:
+        conn.close()
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps({
+            'valid': True,
+            'user': {
+                'id': payload['id'],
+                'email': payload['email'],
+                'full_name': payload['full_name'],
+                'is_admin': payload['is_admin'],
+                'has_course_access': has_course_access,
+                'chat_expires_at': user_data['chat_expires_at'].isoformat() if user_data and user_data.get('chat_expires_at') else None,
+                'expires_at': user_data['expires_at'].isoformat() if user_data and user_data.get('expires_at') else None
             }
-        
-        payload = jwt.decode(token, jwt_secret, algorithms=['HS256'])
-        user_id = payload['id']
-        
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                # Use string formatting for Simple Query Protocol
-                safe_user_id = str(int(user_id))  # Ensure it's a safe integer
-                cur.execute(
-                    f"SELECT COUNT(*) as has_access FROM user_purchases WHERE user_id = {safe_user_id} AND payment_status = 'completed' AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)"
-                )
-                access_count = cur.fetchone()[0]
-                has_course_access = access_count > 0 or payload.get('is_admin', False)
-                
-                # Получаем chat_expires_at и expires_at из users
-                cur.execute(
-                    f"SELECT chat_expires_at, expires_at FROM users WHERE id = {safe_user_id}"
-                )
-                user_row = cur.fetchone()
-                user_data = {'chat_expires_at': user_row[0], 'expires_at': user_row[1]} if user_row else None
-        finally:
-            conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps({
-                'valid': True,
-                'user': {
-                    'id': payload['id'],
-                    'email': payload['email'],
-                    'full_name': payload['full_name'],
-                    'is_admin': payload['is_admin'],
-                    'has_course_access': has_course_access,
-                    'chat_expires_at': user_data['chat_expires_at'].isoformat() if user_data and user_data.get('chat_expires_at') else None,
-                    'expires_at': user_data['expires_at'].isoformat() if user_data and user_data.get('expires_at') else None
-                }
-            }),
-            'isBase64Encoded': False
-        }
-    except jwt.ExpiredSignatureError:
-        return {
-            'statusCode': 401,
-            'headers': headers,
-            'body': json.dumps({'error': 'Token expired'}),
-            'isBase64Encoded': False
-        }
-    except jwt.InvalidTokenError:
-        return {
-            'statusCode': 401,
-            'headers': headers,
-            'body': json.dumps({'error': 'Invalid token'}),
-            'isBase64Encoded': False
-        }
+        }),
+        'isBase64Encoded': False
+    }
 
 def generate_token(user: Dict[str, Any]) -> str:
     jwt_secret = os.environ['JWT_SECRET']
@@ -395,8 +542,7 @@ def change_password(data: Dict[str, Any], event: Dict[str, Any], headers: Dict[s
         }
     
     try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+        payload = decode_token_cached(auth_token)
         user_id = payload['id']
     except:
         return {
@@ -433,7 +579,7 @@ def change_password(data: Dict[str, Any], event: Dict[str, Any], headers: Dict[s
                     'isBase64Encoded': False
                 }
             
-            new_password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            new_password_hash = hash_password(new_password)
             safe_new_password_hash = new_password_hash.replace("'", "''")
             
             cur.execute(
@@ -7,11 +7,49 @@ Returns: HTTP response dict с количеством деактивирован
 
 import json
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+# Строки снимаются пачками по частичному индексу активных строк (V0050): каждый UPDATE трогает не больше
+# SWEEP_BATCH_SIZE строк, а за запуск — не больше SWEEP_MAX_BATCHES пачек на таблицу,
+# чтобы транзакция оставалась короткой; остаток заберёт следующий запуск по расписанию
+SWEEP_BATCH_SIZE = int(os.environ.get('SWEEP_BATCH_SIZE', 5000))
+SWEEP_MAX_BATCHES = int(os.environ.get('SWEEP_MAX_BATCHES', 20))
+
+# Обе таблицы снимаются одним шаблоном; SKIP LOCKED не ждёт строки, которые сейчас
+# продлевает оплата или проверяет auth
+SWEEP_CHAT_ACCESS_SQL = """
+    WITH expired AS (
+        SELECT id FROM chat_access
+        WHERE is_active = true AND access_end <= NOW()
+        ORDER BY access_end
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE chat_access ca
+    SET is_active = false, updated_at = NOW()
+    FROM expired
+    WHERE ca.id = expired.id
+    RETURNING ca.id, ca.client_name, ca.telegram_username, ca.access_end
+"""
+SWEEP_CHAT_TOKENS_SQL = """
+    WITH expired AS (
+        SELECT id FROM chat_tokens
+        WHERE is_active = true AND expires_at <= NOW()
+        ORDER BY expires_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE chat_tokens ct
+    SET is_active = false
+    FROM expired
+    WHERE ct.id = expired.id
+    RETURNING ct.id
+"""
+
 def get_db_connection():
     database_url = os.environ.get('DATABASE_URL')
     return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
@@ -37,28 +75,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
     
     try:
+        started = time.monotonic()
         conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT id, client_name, telegram_username, access_end
-            FROM chat_access
-            WHERE is_active = true AND access_end <= NOW()
-        """)
-        
-        expired_clients = cur.fetchall()
-        expired_count = len(expired_clients)
-        
-        if expired_count > 0:
-            cur.execute("""
-                UPDATE chat_access
-                SET is_active = false, updated_at = NOW()
-                WHERE is_active = true AND access_end <= NOW()
-            """)
+        try:
+            cur = conn.cursor()
+            expired_clients, access_more = sweep(cur, SWEEP_CHAT_ACCESS_SQL)
+            expired_tokens, tokens_more = sweep(cur, SWEEP_CHAT_TOKENS_SQL)
             conn.commit()
-        
-        cur.close()
-        conn.close()
+            cur.close()
+        finally:
+            conn.close()
         
         expired_list = []
         for client in expired_clients:
@@ -69,14 +95,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'access_end': client['access_end'].isoformat()
             })
         
+        print(f"[SWEEP] chat_access={len(expired_clients)} chat_tokens={len(expired_tokens)} in {time.monotonic() - started:.2f}s")
+        
         return {
             'statusCode': 200,
             'headers': headers,
             'isBase64Encoded': False,
             'body': json.dumps({
                 'success': True,
-                'deactivated_count': expired_count,
+                'deactivated_count': len(expired_clients),
                 'deactivated_clients': expired_list,
+                'deactivated': {
+                    'chat_access': len(expired_clients),
+                    'chat_tokens': len(expired_tokens)
+                },
+                'has_more': access_more or tokens_more,
                 'checked_at': datetime.now().isoformat()
             })
         }
@@ -87,3 +120,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': str(e)})
         }
+
+def sweep(cur, sql: str) -> Tuple[List[Dict[str, Any]], bool]:
+    '''Пачки UPDATE ... RETURNING до первой неполной; второй элемент — остались ли строки после лимита'''
+    swept: List[Dict[str, Any]] = []
+    for _ in range(SWEEP_MAX_BATCHES):
+        cur.execute(sql, (SWEEP_BATCH_SIZE,))
+        batch = cur.fetchall()
+        swept.extend(batch)
+        if len(batch) < SWEEP_BATCH_SIZE:
+            return swept, False
+    return swept, True
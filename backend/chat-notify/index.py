@@ -7,50 +7,131 @@ Returns: HTTP response dict с количеством отправленных 
 
 import json
 import os
-from typing import Dict, Any, Optional
+import time
+import threading
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import urllib.request
 import urllib.parse
+import urllib.error
 import string
 import secrets
 
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_TIMEOUT_SECONDS = 10
+# Telegram допускает около 30 сообщений в секунду на бота; держимся ниже
+TELEGRAM_RATE_PER_SECOND = float(os.environ.get('TELEGRAM_RATE_PER_SECOND', 25))
+TELEGRAM_SEND_CONCURRENCY = 8
+TELEGRAM_SEND_ATTEMPTS = 3
+
+# Общий бакет отправок: 429 с retry_after ставит на паузу все потоки, а не только получивший его
+_bucket = {'tokens': 1.0, 'updated': time.monotonic(), 'paused_until': 0.0}
+_bucket_lock = threading.Lock()
+
 def get_db_connection():
     database_url = os.environ.get('DATABASE_URL')
     return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
 
-def get_telegram_chat_id(username: str, bot_token: str) -> Optional[str]:
-    username_clean = username.lstrip('@')
+def normalize_username(username: str) -> str:
+    return username.lstrip('@').lower()
+
+def fetch_chat_ids_from_updates(bot_token: str) -> Dict[str, str]:
+    '''
+    Запасной путь для клиентов, чей chat_id ещё не записал telegram-webhook:
+    один вызов getUpdates на весь прогон вместо вызова на каждого клиента.
+    При активном вебхуке Telegram отвечает 409, и словарь будет пустым.
+    '''
+    chat_ids: Dict[str, str] = {}
     try:
-        url = f'https://api.telegram.org/bot{bot_token}/getUpdates'
-        with urllib.request.urlopen(url) as response:
+        url = f'{TELEGRAM_API_URL}/bot{bot_token}/getUpdates'
+        with urllib.request.urlopen(url, timeout=TELEGRAM_TIMEOUT_SECONDS) as response:
             data = json.loads(response.read().decode())
             if data.get('ok'):
                 for update in data.get('result', []):
-                    message = update.get('message', {})
-                    from_user = message.get('from', {})
-                    if from_user.get('username', '').lower() == username_clean.lower():
-                        return str(from_user.get('id'))
-    except Exception:
-        pass
-    return None
+                    from_user = update.get('message', {}).get('from', {})
+                    if from_user.get('username') and from_user.get('id'):
+                        chat_ids[normalize_username(from_user['username'])] = str(from_user['id'])
+    except Exception as e:
+        print(f'[NOTIFY] getUpdates failed: {e}')
+    return chat_ids
 
-def send_telegram_message(chat_id: str, message: str, bot_token: str) -> bool:
-    try:
-        url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-        data = urllib.parse.urlencode({
-            'chat_id': chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }).encode()
-        
-        req = urllib.request.Request(url, data=data)
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode())
-            return result.get('ok', False)
-    except Exception:
-        return False
+def take_send_token():
+    '''Token bucket перед sendMessage; ждёт пополнения и паузы после 429'''
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket['tokens'] = min(TELEGRAM_RATE_PER_SECOND, _bucket['tokens'] + (now - _bucket['updated']) * TELEGRAM_RATE_PER_SECOND)
+            _bucket['updated'] = now
+            if now >= _bucket['paused_until'] and _bucket['tokens'] >= 1:
+                _bucket['tokens'] -= 1
+                return
+            wait = max(_bucket['paused_until'] - now, (1 - _bucket['tokens']) / TELEGRAM_RATE_PER_SECOND)
+        time.sleep(wait)
+
+def pause_sending(retry_after: float):
+    with _bucket_lock:
+        _bucket['paused_until'] = max(_bucket['paused_until'], time.monotonic() + retry_after)
+        _bucket['tokens'] = 0.0
+
+def send_telegram_message(chat_id: str, message: str, bot_token: str) -> Tuple[bool, str]:
+    '''Отправка с повтором: после 429 ждём retry_after, после сетевой ошибки или 5xx — секунду'''
+    url = f'{TELEGRAM_API_URL}/bot{bot_token}/sendMessage'
+    data = urllib.parse.urlencode({
+        'chat_id': chat_id,
+        'text': message,
+        'parse_mode': 'HTML'
+    }).encode()
+    
+    reason = 'Failed to send message'
+    for attempt in range(TELEGRAM_SEND_ATTEMPTS):
+        take_send_token()
+        try:
+            req = urllib.request.Request(url, data=data)
+            with urllib.request.urlopen(req, timeout=TELEGRAM_TIMEOUT_SECONDS) as response:
+                result = json.loads(response.read().decode())
+                return result.get('ok', False), '' if result.get('ok') else result.get('description', reason)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read().decode())
+            except ValueError:
+                error = {}
+            reason = error.get('description', f'HTTP {e.code}')
+            if e.code == 429:
+                pause_sending(float(error.get('parameters', {}).get('retry_after', 1)))
+            elif e.code < 500:
+                return False, reason
+            else:
+                time.sleep(1)
+        except (urllib.error.URLError, TimeoutError) as e:
+            reason = str(e)
+            time.sleep(1)
+    return False, reason
+
+def build_reminder(client: Dict[str, Any]) -> str:
+    return f"""
+🔔 <b>Напоминание о доступе к чату</b>
+
+Здравствуйте, {client['client_name']}!
+
+Ваш доступ к чату с юристами истекает завтра ({client['access_end'].strftime('%d.%m.%Y')}).
+
+Если хотите продлить доступ, свяжитесь с нами.
+
+С уважением,
+Валентина Голосова
+    """.strip()
+
+def send_reminders(clients: List[Dict[str, Any]], bot_token: str) -> List[Tuple[Dict[str, Any], bool, str]]:
+    '''Напоминания уходят параллельно; темп задаёт общий бакет, а не число потоков'''
+    def send(client: Dict[str, Any]) -> Tuple[Dict[str, Any], bool, str]:
+        success, reason = send_telegram_message(client['telegram_chat_id'], build_reminder(client), bot_token)
+        return client, success, reason
+    
+    with ThreadPoolExecutor(max_workers=TELEGRAM_SEND_CONCURRENCY) as executor:
+        return list(executor.map(send, clients))
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -95,7 +176,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         day_after = tomorrow + timedelta(days=1)
         
         cur.execute("""
-            SELECT id, client_name, telegram_username, access_end
+            SELECT id, client_name, telegram_username, telegram_chat_id, access_end
             FROM chat_access
             WHERE is_active = true 
             AND access_end >= %s 
@@ -109,47 +190,48 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         notifications_sent = []
         notifications_failed = []
         
+        unresolved = [client for client in expiring_clients if not client['telegram_chat_id']]
+        if unresolved:
+            chat_ids = fetch_chat_ids_from_updates(bot_token)
+            resolved = []
+            for client in unresolved:
+                chat_id = chat_ids.get(normalize_username(client['telegram_username']))
+                if chat_id:
+                    client['telegram_chat_id'] = chat_id
+                    resolved.append((client['id'], int(chat_id)))
+            if resolved:
+                execute_values(cur, """
+                    UPDATE chat_access SET telegram_chat_id = data.chat_id
+                    FROM (VALUES %s) AS data (id, chat_id)
+                    WHERE chat_access.id = data.id
+                """, resolved)
+                conn.commit()
+        
         for client in expiring_clients:
-            username = client['telegram_username']
-            client_name = client['client_name']
-            access_end = client['access_end']
-            
-            message = f"""
-🔔 <b>Напоминание о доступе к чату</b>
-
-Здравствуйте, {client_name}!
-
-Ваш доступ к чату с юристами истекает завтра ({access_end.strftime('%d.%m.%Y')}).
-
-Если хотите продлить доступ, свяжитесь с нами.
-
-С уважением,
-Валентина Голосова
-            """.strip()
-            
-            chat_id = get_telegram_chat_id(username, bot_token)
-            
-            if chat_id:
-                success = send_telegram_message(chat_id, message, bot_token)
-                if success:
-                    notifications_sent.append({
-                        'id': client['id'],
-                        'client_name': client_name,
-                        'telegram_username': username
-                    })
-                else:
-                    notifications_failed.append({
-                        'id': client['id'],
-                        'client_name': client_name,
-                        'reason': 'Failed to send message'
-                    })
-            else:
+            if not client['telegram_chat_id']:
                 notifications_failed.append({
                     'id': client['id'],
-                    'client_name': client_name,
+                    'client_name': client['client_name'],
                     'reason': 'Chat ID not found. User needs to start bot first'
                 })
         
+        started = time.monotonic()
+        deliverable = [client for client in expiring_clients if client['telegram_chat_id']]
+        for client, success, reason in send_reminders(deliverable, bot_token):
+            if success:
+                notifications_sent.append({
+                    'id': client['id'],
+                    'client_name': client['client_name'],
+                    'telegram_username': client['telegram_username']
+                })
+            else:
+                notifications_failed.append({
+                    'id': client['id'],
+                    'client_name': client['client_name'],
+                    'reason': reason
+                })
+        print(f'[NOTIFY] Sent {len(notifications_sent)}/{len(deliverable)} reminders in {time.monotonic() - started:.2f}s')
+        
         cur.close()
         conn.close()
         
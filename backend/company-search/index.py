@@ -1,13 +1,415 @@
 import json
 import os
-from typing import Dict, Any
-import urllib.request
+import re
+import time
+import queue
+import sqlite3
+import threading
+import http.client
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+DADATA_SUGGEST_URL = os.environ.get('DADATA_SUGGEST_URL', 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/')
+DADATA_TIMEOUT_SECONDS = 10
+DADATA_POOL_SIZE = 8
+# Stay under the per-key DaData quota; bursts (batch lookups) queue briefly instead of failing
+DADATA_RATE_PER_SECOND = float(os.environ.get('DADATA_RATE_PER_SECOND', 20))
+DADATA_BURST = int(os.environ.get('DADATA_BURST', 20))
+DADATA_MAX_WAIT_SECONDS = 2.0
+SUGGEST_MIN_QUERY_LENGTH = 3
+SUGGEST_CACHE_SIZE = int(os.environ.get('SUGGEST_CACHE_SIZE', 2048))
+SUGGEST_CACHE_TTL_SECONDS = int(os.environ.get('SUGGEST_CACHE_TTL_SECONDS', 600))
+SUGGEST_COUNT = 10
+BATCH_MAX_QUERIES = 50
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 5))
+
+# creditors_seed.json is the bundled list (official name, INN, aliases of banks, MFOs and
+# collection agencies); refresh_creditors.py adds addresses, OGRN and KPP into creditors.json
+CREDITOR_SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'creditors_seed.json')
+CREDITOR_DIRECTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'creditors.json')
+CREDITOR_DIRECTORY_LIMIT = 10
+
+_WORD = re.compile(r'\w+')
+# Organizational forms say nothing about which creditor it is, and reports often carry an
+# outdated one (ООО МФК "Займер" for what is now ПАО МФК), so they are not matched
+LEGAL_FORM_WORDS = frozenset({'ооо', 'оао', 'зао', 'пао', 'ао', 'нао', 'ано', 'кб', 'мфк', 'мкк', 'пко'})
+
+
+class DaDataError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+_dadata_url = urllib.parse.urlsplit(DADATA_SUGGEST_URL)
+_dadata_connections: 'queue.LifoQueue[http.client.HTTPConnection]' = queue.LifoQueue(maxsize=DADATA_POOL_SIZE)
+
+_bucket_lock = threading.Lock()
+_bucket = {'tokens': float(DADATA_BURST), 'updated': time.monotonic()}
+
+# (kind, count, normalized query) -> (expires_at, suggestions, complete)
+_cache_lock = threading.Lock()
+_suggest_cache: 'OrderedDict[Tuple[str, int, str], Tuple[float, List[Dict[str, Any]], bool]]' = OrderedDict()
+_inflight: Dict[Tuple[str, int, str], Future] = {}
+
+# One in-memory SQLite connection shared by all threads, so every query holds the lock
+_directory_lock = threading.Lock()
+_directory: Optional[sqlite3.Connection] = None
+_directory_loaded = False
+_directory_stats = {'hits': 0, 'misses': 0}
+
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='dadata')
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def take_rate_token():
+    """Token bucket in front of DaData: waits up to DADATA_MAX_WAIT_SECONDS for the quota to refill"""
+    deadline = time.monotonic() + DADATA_MAX_WAIT_SECONDS
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket['tokens'] = min(DADATA_BURST, _bucket['tokens'] + (now - _bucket['updated']) * DADATA_RATE_PER_SECOND)
+            _bucket['updated'] = now
+            if _bucket['tokens'] >= 1:
+                _bucket['tokens'] -= 1
+                return
+            wait = (1 - _bucket['tokens']) / DADATA_RATE_PER_SECOND
+        
+        if now + wait > deadline:
+            raise DaDataError(429, 'DaData rate limit exceeded, try again later')
+        time.sleep(wait)
+
+
+def open_dadata_connection() -> http.client.HTTPConnection:
+    if _dadata_url.scheme == 'http':
+        return http.client.HTTPConnection(_dadata_url.netloc, timeout=DADATA_TIMEOUT_SECONDS)
+    return http.client.HTTPSConnection(_dadata_url.netloc, timeout=DADATA_TIMEOUT_SECONDS)
+
+
+def dadata_post(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    POST to suggest/<kind> over a pooled keep-alive connection. A pooled
+    connection the server has already closed is retried once on a fresh one.
+    """
+    api_key = os.environ.get('DADATA_API_KEY')
+    if not api_key:
+        raise DaDataError(500, 'DADATA_API_KEY not configured')
+    
+    take_rate_token()
+    
+    body = json.dumps(payload).encode('utf-8')
+    request_headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Token {api_key}'
+    }
+    path = _dadata_url.path.rstrip('/') + '/' + kind
+    
+    for attempt in range(2):
+        try:
+            conn = _dadata_connections.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = open_dadata_connection()
+            reused = False
+        
+        try:
+            conn.request('POST', path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if reused and attempt == 0:
+                continue
+            raise
+        
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                _dadata_connections.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        
+        if response.status >= 400:
+            raise DaDataError(response.status, f"DaData API error: {data.decode('utf-8', 'replace')}")
+        
+        return json.loads(data.decode('utf-8'))
+
+
+def suggestion_matches(item: Dict[str, Any], words: List[str]) -> bool:
+    """DaData-style match: every query word is the prefix of some word of the suggestion"""
+    data = item.get('data') or {}
+    text = ' '.join(str(part) for part in (
+        item.get('unrestricted_value') or item.get('value') or '',
+        data.get('inn') or '',
+        data.get('ogrn') or ''
+    ))
+    tokens = _WORD.findall(text.lower())
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def cached_suggestions(kind: str, query: str, count: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Exact hit, or a narrowing of a shorter cached query whose result was
+    complete (fewer than count suggestions): "моск" answers "москв" locally.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _suggest_cache.get((kind, count, query))
+        if entry and entry[0] > now:
+            _suggest_cache.move_to_end((kind, count, query))
+            return entry[1]
+        
+        words = _WORD.findall(query)
+        for end in range(len(query) - 1, SUGGEST_MIN_QUERY_LENGTH - 1, -1):
+            entry = _suggest_cache.get((kind, count, query[:end]))
+            if entry and entry[0] > now and entry[2]:
+                return [item for item in entry[1] if suggestion_matches(item, words)]
+    
+    return None
+
+
+def store_suggestions(key: Tuple[str, int, str], suggestions: List[Dict[str, Any]]):
+    with _cache_lock:
+        _suggest_cache[key] = (time.monotonic() + SUGGEST_CACHE_TTL_SECONDS, suggestions, len(suggestions) < key[1])
+        _suggest_cache.move_to_end(key)
+        while len(_suggest_cache) > SUGGEST_CACHE_SIZE:
+            _suggest_cache.popitem(last=False)
+
+
+def fetch_suggestions(kind: str, query: str, count: int, extra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Raw DaData suggestions for kind ('address' or 'party'): served from the
+    cache when possible, and concurrent identical lookups share one request.
+    Raises DaDataError on quota, configuration or upstream HTTP errors.
+    """
+    query = normalize_query(query)
+    cached = cached_suggestions(kind, query, count)
+    if cached is not None:
+        return cached
+    
+    key = (kind, count, query)
+    with _cache_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+    
+    if not owner:
+        return future.result(timeout=DADATA_TIMEOUT_SECONDS + DADATA_MAX_WAIT_SECONDS)
+    
+    try:
+        payload = {'query': query, 'count': count}
+        payload.update(extra or {})
+        suggestions = dadata_post(kind, payload).get('suggestions', [])
+        store_suggestions(key, suggestions)
+        future.set_result(suggestions)
+        return suggestions
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+
+
+def load_creditor_directory() -> Optional[sqlite3.Connection]:
+    """
+    Builds an in-memory FTS5 index over the bundled creditor directory once
+    per instance: official names, aliases, INN and OGRN are searchable and
+    each row carries the ready-made party suggestion. Refreshed records from
+    creditors.json win; seed entries missing there are served with name and
+    INN only.
+    """
+    global _directory, _directory_loaded
+    if _directory_loaded:
+        return _directory
+    
+    _directory_loaded = True
+    records: List[Dict[str, Any]] = []
+    if os.path.exists(CREDITOR_DIRECTORY_PATH):
+        with open(CREDITOR_DIRECTORY_PATH, encoding='utf-8') as f:
+            records = json.load(f)
+    
+    if os.path.exists(CREDITOR_SEED_PATH):
+        with open(CREDITOR_SEED_PATH, encoding='utf-8') as f:
+            seed = json.load(f)
+        known_inns = {record.get('inn') for record in records}
+        records.extend(entry for entry in seed if entry.get('inn') not in known_inns)
+    
+    if not records:
+        return None
+    
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    conn.execute(
+        "CREATE VIRTUAL TABLE creditors USING fts5("
+        "names, inn, ogrn, suggestion UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    conn.executemany(
+        "INSERT INTO creditors (names, inn, ogrn, suggestion) VALUES (?, ?, ?, ?)",
+        [
+            (
+                ' '.join([record.get('name', ''), record.get('fullName', '')] + record.get('aliases', [])),
+                record.get('inn', ''),
+                record.get('ogrn', ''),
+                json.dumps({key: record.get(key, '') for key in ('inn', 'name', 'fullName', 'address', 'ogrn', 'kpp')})
+            )
+            for record in records
+        ]
+    )
+    print(f"[DIRECTORY] Loaded {len(records)} creditors")
+    
+    _directory = conn
+    return _directory
+
+
+def search_creditor_directory(query: str) -> List[Dict[str, Any]]:
+    """
+    Every query word except organizational forms must prefix a word of the
+    creditor's names, INN or OGRN; results come best-first by bm25. An empty
+    list means DaData has to answer: the directory only answers when every
+    match carries an address and the query is narrow enough to fit in
+    CREDITOR_DIRECTORY_LIMIT, since seed records and broad prefixes like
+    "банк" would otherwise shadow DaData's fuller data.
+    """
+    words = [word for word in _WORD.findall(query.lower()) if word not in LEGAL_FORM_WORDS]
+    if not words:
+        return []
+    
+    match = ' AND '.join(f'"{word}"*' for word in words)
+    with _directory_lock:
+        conn = load_creditor_directory()
+        if conn is None:
+            return []
+        rows = conn.execute(
+            "SELECT suggestion FROM creditors WHERE creditors MATCH ? ORDER BY rank LIMIT ?",
+            (match, CREDITOR_DIRECTORY_LIMIT)
+        ).fetchall()
+        suggestions = [json.loads(row[0]) for row in rows]
+        if len(suggestions) >= CREDITOR_DIRECTORY_LIMIT or not all(s.get('address') for s in suggestions):
+            suggestions = []
+        
+        _directory_stats['hits' if suggestions else 'misses'] += 1
+        total = _directory_stats['hits'] + _directory_stats['misses']
+        print(f"[DIRECTORY] {'hit' if suggestions else 'miss'} for '{query}', hit rate {_directory_stats['hits'] / total:.0%} of {total}")
+    
+    return suggestions
+
+
+def format_suggestions(search_type: str, raw_suggestions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Форматируем результаты в зависимости от типа
+    suggestions = []
+    
+    if search_type == 'address':
+        for item in raw_suggestions:
+            suggestions.append({
+                'value': item.get('value', ''),
+                'unrestricted_value': item.get('unrestricted_value', ''),
+            })
+    else:  # party
+        for item in raw_suggestions:
+            data_obj = item.get('data', {})
+            name_obj = data_obj.get('name', {})
+            address_obj = data_obj.get('address', {})
+            
+            suggestions.append({
+                'inn': data_obj.get('inn', ''),
+                'name': name_obj.get('short_with_opf') or name_obj.get('full') or item.get('value', ''),
+                'fullName': name_obj.get('full', ''),
+                'address': address_obj.get('unrestricted_value') or address_obj.get('value', ''),
+                'ogrn': data_obj.get('ogrn', ''),
+                'kpp': data_obj.get('kpp', ''),
+            })
+    
+    return suggestions
+
+
+def search_companies(search_type: str, query: str) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Formatted suggestions and where they came from ('directory' or 'dadata').
+    Party lookups try the bundled creditor directory before DaData; records
+    without an address never short-circuit DaData.
+    """
+    # Частые кредиторы (банки, МФО, коллекторы) с полными реквизитами отвечаем из справочника
+    if search_type != 'address':
+        directory_suggestions = search_creditor_directory(query)
+        if directory_suggestions:
+            return directory_suggestions, 'directory'
+    
+    if search_type == 'address':
+        raw_suggestions = fetch_suggestions('address', query, SUGGEST_COUNT)
+    else:  # party
+        raw_suggestions = fetch_suggestions('party', query, SUGGEST_COUNT, {'status': ['ACTIVE']})
+    
+    return format_suggestions(search_type, raw_suggestions), 'dadata'
+
+
+def batch_search(search_type: str, queries: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Lookups for a whole creditors list in one call. Duplicates are searched
+    once, cache misses go to DaData at most BATCH_CONCURRENCY at a time, and
+    the results come back in input order with per-item errors.
+    """
+    normalized = [normalize_query(query) if isinstance(query, str) else '' for query in queries]
+    futures = {
+        query: _batch_executor.submit(search_companies, search_type, query)
+        for query in dict.fromkeys(normalized)
+        if len(query) >= SUGGEST_MIN_QUERY_LENGTH
+    }
+    
+    results = []
+    for query, key in zip(queries, normalized):
+        if key not in futures:
+            results.append({'query': query, 'error': 'Query too short (min 3 chars)', 'status': 400})
+            continue
+        try:
+            suggestions, source = futures[key].result()
+            results.append({'query': query, 'suggestions': suggestions, 'source': source})
+        except DaDataError as e:
+            results.append({'query': query, 'error': str(e), 'status': e.status})
+        except Exception as e:
+            results.append({'query': query, 'error': str(e), 'status': 500})
+    
+    return results
+
+
+def handle_batch(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body_data = json.loads(event.get('body') or '{}')
+    except json.JSONDecodeError:
+        body_data = None
+    
+    queries = body_data.get('queries') if isinstance(body_data, dict) else None
+    if not isinstance(queries, list) or not queries or len(queries) > BATCH_MAX_QUERIES:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': f'queries must be a list of 1-{BATCH_MAX_QUERIES} strings'}),
+            'isBase64Encoded': False
+        }
+    
+    search_type = body_data.get('type', 'party')  # party или address
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({'results': batch_search(search_type, queries)}),
+        'isBase64Encoded': False
+    }
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Универсальный поиск через DaData API: организации и адреса
     Args: event - dict с httpMethod, queryStringParameters (query, type: party|address)
+                  или POST body {queries: [...], type} для пакетного поиска
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict с найденными результатами
     """
@@ -19,7 +421,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
@@ -27,6 +429,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    if method == 'POST':
+        return handle_batch(event)
+    
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -48,80 +453,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    # DaData API ключ из секретов
-    api_key = os.environ.get('DADATA_API_KEY')
-    if not api_key:
+    try:
+        suggestions, source = search_companies(search_type, query)
+        
         return {
-            'statusCode': 500,
+            'statusCode': 200,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'DADATA_API_KEY not configured'}),
+            'body': json.dumps({'suggestions': suggestions, 'source': source}),
             'isBase64Encoded': False
         }
     
-    # Определяем URL и тело запроса в зависимости от типа
-    if search_type == 'address':
-        url = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/address'
-        request_body = json.dumps({
-            'query': query,
-            'count': 10
-        }).encode('utf-8')
-    else:  # party
-        url = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/party'
-        request_body = json.dumps({
-            'query': query,
-            'count': 10,
-            'status': ['ACTIVE']
-        }).encode('utf-8')
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-        'Authorization': f'Token {api_key}'
-    }
-    
-    req = urllib.request.Request(url, data=request_body, headers=headers, method='POST')
-    
-    try:
-        with urllib.request.urlopen(req, timeout=10) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            
-            # Форматируем результаты в зависимости от типа
-            suggestions = []
-            
-            if search_type == 'address':
-                for item in result.get('suggestions', []):
-                    suggestions.append({
-                        'value': item.get('value', ''),
-                        'unrestricted_value': item.get('unrestricted_value', ''),
-                    })
-            else:  # party
-                for item in result.get('suggestions', []):
-                    data_obj = item.get('data', {})
-                    name_obj = data_obj.get('name', {})
-                    address_obj = data_obj.get('address', {})
-                    
-                    suggestions.append({
-                        'inn': data_obj.get('inn', ''),
-                        'name': name_obj.get('short_with_opf') or name_obj.get('full') or item.get('value', ''),
-                        'fullName': name_obj.get('full', ''),
-                        'address': address_obj.get('unrestricted_value') or address_obj.get('value', ''),
-                        'ogrn': data_obj.get('ogrn', ''),
-                        'kpp': data_obj.get('kpp', ''),
-                    })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'suggestions': suggestions}),
-                'isBase64Encoded': False
-            }
-    
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
+    except DaDataError as e:
         return {
-            'statusCode': e.code,
+            'statusCode': e.status,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': f'DaData API error: {error_body}'}),
+            'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
     except Exception as e:
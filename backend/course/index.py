@@ -6,34 +6,20 @@ Returns: Course content and user progress data
 
 import json
 import os
-import jwt
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+from auth_middleware import require_auth
+
+# Upper bound on heartbeats accepted in one batched progress request
+PROGRESS_BATCH_MAX = int(os.environ.get('PROGRESS_BATCH_MAX', 100))
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
-def verify_user(headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-    if not auth_token:
-        return None
-    
-    # Allow admin_session_token for admin viewing course
-    if auth_token == 'admin_session_token':
-        return {'id': 0, 'email': 'admin@session', 'is_admin': True}
-    
-    try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return None
-        
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-        return payload
-    except:
-        return None
-
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@require_auth
+def handler(event: Dict[str, Any], context: Any, user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -53,14 +39,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'Access-Control-Allow-Origin': '*'
     }
     
-    user = verify_user(event.get('headers', {}))
-    if not user:
-        return {
-            'statusCode': 401,
-            'headers': headers_out,
-            'body': json.dumps({'error': 'Authentication required'})
-        }
-    
     try:
         if method == 'GET':
             return get_course_content(user, event, headers_out)
@@ -120,7 +98,7 @@ def get_course_content(user: Dict[str, Any], event: Dict[str, Any], headers: Dic
                     materials = cur.fetchall()
                     lesson_dict['materials'] = [dict(m) for m in materials]
                     
-                    cur.execute("SELECT id, title, description, file_name, file_url, file_type, file_size FROM course_files WHERE lesson_id = %s ORDER BY uploaded_at DESC", (lesson['id'],))
+                    cur.execute("SELECT id, title, description, file_name, file_url, file_type, file_size, thumbnail_url, preview_url FROM course_files WHERE lesson_id = %s ORDER BY uploaded_at DESC", (lesson['id'],))
                     lesson_files = cur.fetchall()
                     lesson_dict['files'] = [dict(f) for f in lesson_files]
                     
@@ -129,7 +107,7 @@ def get_course_content(user: Dict[str, Any], event: Dict[str, Any], headers: Dic
                 cur.execute("SELECT * FROM materials WHERE module_id = %s AND lesson_id IS NULL", (module['id'],))
                 module_materials = cur.fetchall()
                 
-                cur.execute("SELECT id, title, description, file_name, file_url, file_type, file_size FROM course_files WHERE module_id = %s AND lesson_id IS NULL ORDER BY uploaded_at DESC", (module['id'],))
+                cur.execute("SELECT id, title, description, file_name, file_url, file_type, file_size, thumbnail_url, preview_url FROM course_files WHERE module_id = %s AND lesson_id IS NULL ORDER BY uploaded_at DESC", (module['id'],))
                 module_files = cur.fetchall()
                 
                 module_dict['lessons'] = lessons_with_progress
@@ -146,30 +124,100 @@ def get_course_content(user: Dict[str, Any], event: Dict[str, Any], headers: Dic
     finally:
         conn.close()
 
+def normalize_progress_updates(updates: List[Dict[str, Any]]) -> List[tuple]:
+    '''
+    Collapse heartbeats to one (lesson_id, completed, watch_time_seconds) row
+    per lesson: the furthest watch time wins and completed is sticky, so the
+    order heartbeats arrive in does not matter. Raises ValueError on bad input.
+    '''
+    merged: Dict[int, list] = {}
+    for update in updates:
+        if not isinstance(update, dict):
+            raise ValueError('Each update must be an object')
+        try:
+            lesson_id = int(update['lesson_id'])
+            watch_time_seconds = max(0, int(update.get('watch_time_seconds') or 0))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each update needs an integer lesson_id and watch_time_seconds')
+        completed = bool(update.get('completed', False))
+        
+        current = merged.get(lesson_id)
+        if current is None:
+            merged[lesson_id] = [completed, watch_time_seconds]
+        else:
+            current[0] = current[0] or completed
+            current[1] = max(current[1], watch_time_seconds)
+    
+    # Sorted so concurrent batches lock user_progress rows in the same order
+    return [(lesson_id, completed, watch_time) for lesson_id, (completed, watch_time) in sorted(merged.items())]
+
 def update_progress(user: Dict[str, Any], event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Accepts either a single {lesson_id, completed, watch_time_seconds} or
+    {updates: [...]} with many heartbeats, and writes them with one multi-row
+    upsert. Progress only moves forward: watch time keeps the maximum and a
+    completed lesson stays completed. The batch form returns only the rows
+    that actually changed, so the client can patch its state without
+    reloading the course.
+    '''
+    body_data = json.loads(event.get('body') or '{}')
+    is_batch = 'updates' in body_data
+    raw_updates = body_data['updates'] if is_batch else [body_data]
+    
+    if not isinstance(raw_updates, list) or not raw_updates:
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'updates must be a non-empty list'})}
+    if len(raw_updates) > PROGRESS_BATCH_MAX:
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': f'At most {PROGRESS_BATCH_MAX} updates per request'})}
+    
+    try:
+        rows = normalize_progress_updates(raw_updates)
+    except ValueError as e:
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': str(e)})}
+    
     conn = get_db_connection()
     user_id = user['id']
     
     try:
-        body_data = json.loads(event.get('body', '{}'))
-        lesson_id = body_data.get('lesson_id')
-        completed = body_data.get('completed', False)
-        watch_time_seconds = body_data.get('watch_time_seconds', 0)
-        
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
+            # The WHERE on DO UPDATE skips heartbeats that change nothing, so
+            # RETURNING yields only inserted or advanced rows
+            changed = execute_values(
+                cur,
                 """
                 INSERT INTO user_progress (user_id, lesson_id, completed, watch_time_seconds, last_watched_at)
-                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                VALUES %s
                 ON CONFLICT (user_id, lesson_id)
-                DO UPDATE SET completed = EXCLUDED.completed, watch_time_seconds = EXCLUDED.watch_time_seconds, last_watched_at = CURRENT_TIMESTAMP
-                RETURNING *
+                DO UPDATE SET completed = user_progress.completed OR EXCLUDED.completed,
+                              watch_time_seconds = GREATEST(user_progress.watch_time_seconds, EXCLUDED.watch_time_seconds),
+                              last_watched_at = CURRENT_TIMESTAMP
+                WHERE EXCLUDED.watch_time_seconds > COALESCE(user_progress.watch_time_seconds, 0)
+                   OR (EXCLUDED.completed AND NOT COALESCE(user_progress.completed, FALSE))
+                RETURNING lesson_id, completed, watch_time_seconds, last_watched_at
                 """,
-                (user_id, lesson_id, completed, watch_time_seconds)
+                [(user_id, lesson_id, completed, watch_time) for lesson_id, completed, watch_time in rows],
+                template='(%s, %s, %s, %s, CURRENT_TIMESTAMP)',
+                fetch=True
             )
-            progress = cur.fetchone()
             conn.commit()
             
+            if is_batch:
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'progress': [dict(row) for row in changed]}, default=str)
+                }
+            
+            # Single-update callers always got the row back; fetch it when the
+            # heartbeat was a no-op
+            if changed:
+                progress = changed[0]
+            else:
+                cur.execute(
+                    "SELECT lesson_id, completed, watch_time_seconds, last_watched_at FROM user_progress WHERE user_id = %s AND lesson_id = %s",
+                    (user_id, rows[0][0])
+                )
+                progress = cur.fetchone()
+            
             return {
                 'statusCode': 200,
                 'headers': headers,
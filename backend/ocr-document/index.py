@@ -1,8 +1,73 @@
 import json
 import base64
+import hashlib
+import io
 import os
-from typing import Dict, Any
+import time
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Tuple, Callable, Iterator, Optional
 import requests
+import psycopg2
+
+from document_parsers import parse_passport, parse_bki_layout, parse_income, parse_property
+
+VISION_URL = os.environ.get('VISION_URL', 'https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze')
+VISION_TIMEOUT_SECONDS = 30
+# Распознавание: 'vision' — Яндекс Vision, 'fixture' — ответы из OCR_FIXTURE_DIR для офлайн-проверки
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'vision')
+OCR_FIXTURE_DIR = os.environ.get('OCR_FIXTURE_DIR', os.path.join(os.path.dirname(__file__), 'fixtures'))
+# Страницы PDF уходят в OCR параллельно, но не больше OCR_CONCURRENCY одновременно
+OCR_CONCURRENCY = int(os.environ.get('OCR_CONCURRENCY', 4))
+OCR_RETRY_ATTEMPTS = 3
+OCR_RETRY_BASE_DELAY_SECONDS = 0.5
+OCR_RETRY_STATUSES = (429, 500, 502, 503, 504)
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 50))
+# 200 dpi в оттенках серого: текст читается уверенно, а JPEG страницы A4 укладывается в лимит Vision
+PDF_RENDER_DPI = 200
+PDF_JPEG_QUALITY = 85
+PROCESS_MAX_DOCUMENTS = 10
+# Повторная загрузка того же скана не оплачивается: результат кешируется по sha256 файла
+# в памяти экземпляра и в таблице ocr_cache. Версия в ключе сбрасывает кеш при смене формата
+OCR_CACHE_VERSION = 2
+OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 64))
+OCR_CACHE_TTL_SECONDS = int(os.environ.get('OCR_CACHE_TTL_SECONDS', 86400))
+OCR_CACHE_CLEANUP_PROBABILITY = 0.01
+
+# text — только текст; compact — текст и строки с координатами; full — плюс исходный ответ Vision
+OCR_RESPONSE_PROFILES = ('text', 'compact', 'full')
+# Координаты строк квантуются в тысячные доли страницы: три цифры вместо пикселей скана
+LAYOUT_GRID = 1000
+
+_vision_session = requests.Session()
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix='ocr')
+# Отдельный пул: задачи документов ждут страницы из _ocr_executor и не должны его занимать
+_document_executor = ThreadPoolExecutor(max_workers=PROCESS_MAX_DOCUMENTS, thread_name_prefix='document')
+# pdfium не потокобезопасен, а PDF разных документов растеризуются параллельно
+_pdfium_lock = threading.Lock()
+# Кеш и счётчики читают и меняют потоки _document_executor — только под _ocr_cache_lock
+_ocr_cache_lock = threading.Lock()
+_ocr_cache: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+_ocr_cache_stats = {'lookups': 0, 'memoryHits': 0, 'databaseHits': 0, 'savedMs': 0}
+
+
+class OcrBackendError(Exception):
+    def __init__(self, status: int, details: str, retryable: bool = False):
+        super().__init__(details)
+        self.status = status
+        self.details = details
+        self.retryable = retryable
+        self.attempts = 1
+
+
+class DocumentError(Exception):
+    def __init__(self, status: int, payload: Dict[str, Any]):
+        super().__init__(payload.get('error', ''))
+        self.status = status
+        self.payload = payload
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -43,8 +108,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     body_data = json.loads(body)
     image_base64 = body_data.get('image')
+    profile = body_data.get('profile', 'compact')
+    action = body_data.get('action', 'recognize')
     
-    if not image_base64:
+    if action != 'process' and not image_base64:
         return {
             'statusCode': 400,
             'headers': {
@@ -55,9 +122,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    api_key = os.environ.get('YANDEX_VISION_API_KEY')
+    if action == 'process' and not body_data.get('documents'):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Documents are required'}),
+            'isBase64Encoded': False
+        }
+    
+    if profile not in OCR_RESPONSE_PROFILES:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': f'Unknown profile: {profile}'}),
+            'isBase64Encoded': False
+        }
     
-    if not api_key:
+    if OCR_BACKEND == 'vision' and not os.environ.get('YANDEX_VISION_API_KEY'):
         return {
             'statusCode': 500,
             'headers': {
@@ -68,81 +155,513 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    vision_url = 'https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze'
-    
-    headers = {
-        'Authorization': f'Api-Key {api_key}',
-        'Content-Type': 'application/json'
-    }
-    
-    payload = {
-        'folderId': body_data.get('folderId', ''),
-        'analyze_specs': [{
-            'content': image_base64,
-            'features': [{
-                'type': 'TEXT_DETECTION',
-                'text_detection_config': {
-                    'language_codes': ['ru', 'en']
-                }
-            }]
-        }]
-    }
-    
-    response = requests.post(vision_url, headers=headers, json=payload)
+    if action == 'process':
+        return process_documents(body_data)
     
-    if response.status_code != 200:
+    try:
+        recognized, cache_source, result = recognize_document(
+            image_base64, body_data.get('folderId', ''), keep_raw=profile == 'full'
+        )
+    except DocumentError as e:
         return {
-            'statusCode': response.status_code,
+            'statusCode': e.status,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
-                'error': 'Vision API error',
-                'details': response.text
-            }),
+            'body': json.dumps(e.payload, ensure_ascii=False),
             'isBase64Encoded': False
         }
     
-    result = response.json()
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': ocr_response_body(profile, recognized, cache_source, result),
+        'isBase64Encoded': False
+    }
+
+
+def recognize_document(
+    image_base64: str,
+    folder_id: str,
+    keep_raw: bool = False,
+    timings: Optional[Dict[str, int]] = None
+) -> Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]:
+    '''
+    Распознавание одного документа: декодирование, кеш, OCR и разбор ответа.
+    Возвращает текст с разметкой, источник (memory, database или miss) и
+    исходный ответ Vision. Время этапов пишется в timings.
+    '''
+    timings = timings if timings is not None else {}
+    
+    stage_started = time.perf_counter()
+    try:
+        content = base64.b64decode(image_base64, validate=True)
+    except ValueError:
+        raise DocumentError(400, {'error': 'Invalid image encoding'})
+    timings['decodeMs'] = elapsed_ms(stage_started)
     
-    extracted_text = ''
-    if 'results' in result and len(result['results']) > 0:
-        text_annotation = result['results'][0].get('results', [{}])[0].get('textDetection', {})
-        pages = text_annotation.get('pages', [])
-        
-        for page in pages:
-            blocks = page.get('blocks', [])
-            for block in blocks:
-                lines = block.get('lines', [])
-                for line in lines:
-                    words = line.get('words', [])
-                    line_text = ' '.join([word.get('text', '') for word in words])
-                    extracted_text += line_text + '\n'
+    cache_key = ocr_cache_key(content)
+    stage_started = time.perf_counter()
+    # Исходный ответ Vision в кеше не хранится, поэтому профиль full всегда идёт в OCR
+    cached, cache_source = load_cached_ocr(cache_key) if not keep_raw else (None, 'miss')
+    timings['cacheMs'] = elapsed_ms(stage_started)
+    if cached:
+        record_cache_hit(cache_source, cached['ocrMs'], timings['cacheMs'] / 1000)
+        return cached, cache_source, None
+    
+    record_cache_miss()
+    
+    # PDF растеризуется постранично; обычное изображение — документ из одной страницы
+    stage_started = time.perf_counter()
+    pages = rasterize_pdf(content) if content[:4] == b'%PDF' else iter([content])
+    try:
+        result, page_reports = run_ocr_pipeline(pages, folder_id)
+    except ValueError as e:
+        raise DocumentError(400, {'error': str(e)})
+    
+    failed = [report for report in page_reports if report['status'] == 'error']
+    if not page_reports or len(failed) == len(page_reports):
+        raise DocumentError(failed[0]['statusCode'] if failed else 400, {
+            'error': 'Vision API error',
+            'details': failed[0]['error'] if failed else 'Document has no pages'
+        })
+    
+    extracted_text, layout = extract_text_and_layout(result)
+    timings['ocrMs'] = elapsed_ms(stage_started)
     
     if not extracted_text.strip():
+        raise DocumentError(400, {
+            'error': 'Не удалось распознать текст на изображении. Попробуйте загрузить более четкое фото или скан документа.',
+            **({'fullResponse': result} if keep_raw else {})
+        })
+    
+    recognized = {
+        'text': extracted_text.strip(),
+        'layout': layout,
+        'pages': page_reports,
+        'ocrMs': timings['ocrMs']
+    }
+    if failed:
+        recognized['incomplete'] = True
+    # Частично распознанный документ не кешируется: повторная загрузка должна дойти до OCR
+    if not failed:
+        store_cached_ocr(cache_key, recognized)
+    
+    return recognized, 'miss', result
+
+
+def process_documents(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Действие process: OCR и разбор нужным парсером за один вызов, без повторной
+    пересылки текста через браузер в parse-ocr-text. Документы загрузки
+    обрабатываются параллельно; страницы всех документов делят общий пул OCR.
+    '''
+    documents = body_data.get('documents') or []
+    if not isinstance(documents, list) or not documents or len(documents) > PROCESS_MAX_DOCUMENTS:
         return {
             'statusCode': 400,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
-                'error': 'Не удалось распознать текст на изображении. Попробуйте загрузить более четкое фото или скан документа.',
-                'fullResponse': result
-            }),
+            'body': json.dumps({'error': f'documents must contain 1 to {PROCESS_MAX_DOCUMENTS} items'}),
             'isBase64Encoded': False
         }
     
+    started = time.perf_counter()
+    folder_id = body_data.get('folderId', '')
+    futures = [_document_executor.submit(process_document, document, folder_id) for document in documents]
+    results = [future.result() for future in futures]
+    total_ms = elapsed_ms(started)
+    
+    print(f'[INFO] Processed {len(results)} documents in {total_ms}ms: ' + ', '.join(
+        f"{result['documentType']} {result.get('timings', {})}" for result in results
+    ))
+    
     return {
         'statusCode': 200,
         'headers': {
             'Access-Control-Allow-Origin': '*',
             'Content-Type': 'application/json'
         },
-        'body': json.dumps({
-            'text': extracted_text.strip(),
-            'fullResponse': result
-        }),
+        'body': json.dumps({'documents': results, 'totalMs': total_ms}, ensure_ascii=False, separators=(',', ':')),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+
+def process_document(document: Any, folder_id: str) -> Dict[str, Any]:
+    if not isinstance(document, dict):
+        return {'documentType': '', 'statusCode': 400, 'error': 'Document must be an object'}
+    document_type = document.get('documentType', '')
+    if not isinstance(document_type, str):
+        return {'documentType': '', 'statusCode': 400, 'error': 'documentType must be a string'}
+    parser = DOCUMENT_PARSERS.get(document_type)
+    if parser is None:
+        return {'documentType': document_type, 'statusCode': 400, 'error': f'Unknown documentType: {document_type}'}
+    if not document.get('image'):
+        return {'documentType': document_type, 'statusCode': 400, 'error': 'Image is required'}
+    
+    started = time.perf_counter()
+    timings: Dict[str, int] = {}
+    try:
+        recognized, cache_source, _ = recognize_document(document['image'], folder_id, timings=timings)
+    except DocumentError as e:
+        return {'documentType': document_type, 'statusCode': e.status, **e.payload, 'timings': timings}
+    
+    # Документ с нераспознанными страницами не разбирается: выписка с пропусками
+    # ушла бы в заявление как полная
+    if recognized.get('incomplete'):
+        failed = [page for page in recognized['pages'] if page['status'] == 'error']
+        return {
+            'documentType': document_type,
+            'statusCode': failed[0]['statusCode'],
+            'error': 'Не все страницы документа распознаны',
+            'incomplete': True,
+            'failedPages': [page['page'] for page in failed],
+            'timings': timings
+        }
+    
+    stage_started = time.perf_counter()
+    data = parser(recognized)
+    timings['parseMs'] = elapsed_ms(stage_started)
+    timings['totalMs'] = elapsed_ms(started)
+    
+    return {
+        'documentType': document_type,
+        'statusCode': 200,
+        'data': data,
+        'text': recognized['text'],
+        'cache': cache_source,
+        'timings': timings
+    }
+
+
+def elapsed_ms(started: float) -> int:
+    return round((time.perf_counter() - started) * 1000)
+
+
+def ocr_response_body(
+    profile: str,
+    recognized: Dict[str, Any],
+    cache_source: str,
+    result: Optional[Dict[str, Any]] = None
+) -> str:
+    '''Тело ответа по профилю; кириллица без \\u-экранирования и без пробелов-разделителей'''
+    body: Dict[str, Any] = {'text': recognized['text'], 'cache': cache_source}
+    if recognized.get('incomplete'):
+        body['incomplete'] = True
+    if profile != 'text':
+        body['layout'] = recognized['layout']
+        body['pages'] = recognized['pages']
+    if profile == 'full' and result is not None:
+        body['fullResponse'] = result
+    return json.dumps(body, ensure_ascii=False, separators=(',', ':'))
+
+
+def bounding_box(item: Dict[str, Any]) -> List[int]:
+    '''Прямоугольник [x0, y0, x1, y1]; Vision отдаёт координаты строками и опускает нулевые'''
+    vertices = item.get('boundingBox', {}).get('vertices', [])
+    xs = [int(vertex.get('x', 0)) for vertex in vertices] or [0]
+    ys = [int(vertex.get('y', 0)) for vertex in vertices] or [0]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def extract_text_and_layout(result: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    '''
+    Текст документа и компактная разметка: по каждой странице её размер и строки
+    в виде [x0, y0, x1, y1, text]. Геометрия нужна parse-ocr-text, чтобы собрать
+    таблицы кредитной истории по строкам и колонкам. Если Vision сообщил размер
+    страницы, координаты переводятся в сетку LAYOUT_GRID × LAYOUT_GRID.
+    '''
+    extracted_text = ''
+    layout: Dict[str, Any] = {'pages': []}
+    # В ответе по элементу results на каждую страницу документа
+    for page_result in result.get('results', []):
+        text_annotation = page_result.get('results', [{}])[0].get('textDetection', {})
+        pages = text_annotation.get('pages', [])
+        
+        for page in pages:
+            page_lines = []
+            width = int(page.get('width', 0))
+            height = int(page.get('height', 0))
+            scale_x = LAYOUT_GRID / width if width else 1
+            scale_y = LAYOUT_GRID / height if height else 1
+            blocks = page.get('blocks', [])
+            for block in blocks:
+                lines = block.get('lines', [])
+                for line in lines:
+                    words = line.get('words', [])
+                    line_text = ' '.join([word.get('text', '') for word in words])
+                    extracted_text += line_text + '\n'
+                    if line_text.strip():
+                        x0, y0, x1, y1 = bounding_box(line)
+                        page_lines.append([
+                            round(x0 * scale_x), round(y0 * scale_y),
+                            round(x1 * scale_x), round(y1 * scale_y),
+                            line_text
+                        ])
+            
+            layout['pages'].append({
+                'width': LAYOUT_GRID if width else 0,
+                'height': LAYOUT_GRID if height else 0,
+                'lines': page_lines
+            })
+    
+    return extracted_text, layout
+
+
+def ocr_cache_key(content: bytes) -> str:
+    return f'v{OCR_CACHE_VERSION}:{OCR_BACKEND}:{hashlib.sha256(content).hexdigest()}'
+
+
+def remember_ocr(cache_key: str, cached: Dict[str, Any], expires_at: float) -> None:
+    with _ocr_cache_lock:
+        _ocr_cache[cache_key] = (expires_at, cached)
+        _ocr_cache.move_to_end(cache_key)
+        while len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+
+def load_cached_ocr(cache_key: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''Результат из памяти экземпляра, затем из ocr_cache; ошибки БД не мешают распознаванию'''
+    with _ocr_cache_lock:
+        entry = _ocr_cache.get(cache_key)
+        if entry and entry[0] > time.time():
+            _ocr_cache.move_to_end(cache_key)
+            return entry[1], 'memory'
+        if entry:
+            del _ocr_cache[cache_key]
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return None, 'miss'
+    
+    try:
+        conn = psycopg2.connect(database_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT result, EXTRACT(EPOCH FROM expires_at - NOW()) FROM ocr_cache "
+                    "WHERE cache_key = %s AND expires_at > NOW()",
+                    (cache_key,)
+                )
+                row = cur.fetchone()
+        finally:
+            conn.close()
+    except psycopg2.Error as e:
+        print(f'[WARN] OCR cache lookup failed: {e}')
+        return None, 'miss'
+    
+    if not row:
+        return None, 'miss'
+    
+    remember_ocr(cache_key, row[0], time.time() + float(row[1]))
+    return row[0], 'database'
+
+
+def store_cached_ocr(cache_key: str, cached: Dict[str, Any]) -> None:
+    remember_ocr(cache_key, cached, time.time() + OCR_CACHE_TTL_SECONDS)
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(database_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO ocr_cache (cache_key, result, expires_at) "
+                    "VALUES (%s, %s, NOW() + make_interval(secs => %s)) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET result = EXCLUDED.result, expires_at = EXCLUDED.expires_at",
+                    (cache_key, json.dumps(cached), OCR_CACHE_TTL_SECONDS)
+                )
+                if random.random() < OCR_CACHE_CLEANUP_PROBABILITY:
+                    cur.execute("DELETE FROM ocr_cache WHERE expires_at < NOW()")
+            conn.commit()
+        finally:
+            conn.close()
+    except psycopg2.Error as e:
+        print(f'[WARN] OCR cache store failed: {e}')
+
+
+def record_cache_hit(source: str, ocr_ms: int, lookup_seconds: float) -> None:
+    with _ocr_cache_lock:
+        _ocr_cache_stats['lookups'] += 1
+        _ocr_cache_stats[f'{source}Hits'] += 1
+        _ocr_cache_stats['savedMs'] += max(ocr_ms - round(lookup_seconds * 1000), 0)
+        stats = dict(_ocr_cache_stats)
+    log_cache_stats(source, stats)
+
+
+def record_cache_miss() -> None:
+    with _ocr_cache_lock:
+        _ocr_cache_stats['lookups'] += 1
+        stats = dict(_ocr_cache_stats)
+    log_cache_stats('miss', stats)
+
+
+def log_cache_stats(source: str, stats: Dict[str, int]) -> None:
+    hits = stats['memoryHits'] + stats['databaseHits']
+    print(
+        f"[INFO] OCR cache {source}: hit ratio {hits}/{stats['lookups']} "
+        f"(memory {stats['memoryHits']}, database {stats['databaseHits']}), "
+        f"saved {stats['savedMs']}ms"
+    )
+
+
+def rasterize_pdf(content: bytes) -> Iterator[bytes]:
+    '''
+    Страницы PDF в JPEG по одной: следующая страница рендерится, пока
+    предыдущие уже распознаются. pdfium не потокобезопасен, поэтому вызовы
+    к нему идут под _pdfium_lock, а кодирование JPEG — уже без блокировки.
+    '''
+    import pypdfium2 as pdfium
+    
+    with _pdfium_lock:
+        try:
+            document = pdfium.PdfDocument(content)
+        except pdfium.PdfiumError as e:
+            raise ValueError(f'Invalid PDF: {e}')
+        page_count = len(document)
+        # Лишние страницы не отбрасываются молча: неполная выписка хуже явной ошибки
+        if page_count > PDF_MAX_PAGES:
+            document.close()
+            raise ValueError(f'PDF has {page_count} pages, the limit is {PDF_MAX_PAGES}')
+    
+    try:
+        for index in range(page_count):
+            with _pdfium_lock:
+                page = document[index]
+                image = page.render(scale=PDF_RENDER_DPI / 72, grayscale=True).to_pil()
+                page.close()
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=PDF_JPEG_QUALITY)
+            yield buffer.getvalue()
+    finally:
+        with _pdfium_lock:
+            document.close()
+
+
+def recognize_with_vision(image: bytes, folder_id: str) -> Dict[str, Any]:
+    headers = {
+        'Authorization': f'Api-Key {os.environ.get("YANDEX_VISION_API_KEY")}',
+        'Content-Type': 'application/json'
+    }
+    
+    payload = {
+        'folderId': folder_id,
+        'analyze_specs': [{
+            'content': base64.b64encode(image).decode('ascii'),
+            'features': [{
+                'type': 'TEXT_DETECTION',
+                'text_detection_config': {
+                    'language_codes': ['ru', 'en']
+                }
+            }]
+        }]
+    }
+    
+    try:
+        response = _vision_session.post(VISION_URL, headers=headers, json=payload, timeout=VISION_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        raise OcrBackendError(502, str(e), retryable=True)
+    
+    if response.status_code != 200:
+        raise OcrBackendError(response.status_code, response.text, response.status_code in OCR_RETRY_STATUSES)
+    
+    return response.json()
+
+
+def recognize_with_fixture(image: bytes, folder_id: str) -> Dict[str, Any]:
+    '''Сохранённый ответ Vision: <sha256 изображения>.json, иначе default.json'''
+    digest = hashlib.sha256(image).hexdigest()
+    for name in (f'{digest}.json', 'default.json'):
+        path = os.path.join(OCR_FIXTURE_DIR, name)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+    raise OcrBackendError(404, f'No OCR fixture for {digest}')
+
+
+OCR_BACKENDS: Dict[str, Callable[[bytes, str], Dict[str, Any]]] = {
+    'vision': recognize_with_vision,
+    'fixture': recognize_with_fixture,
+}
+
+
+def recognize_page(image: bytes, folder_id: str) -> Tuple[Dict[str, Any], int]:
+    '''Распознавание страницы с повтором при 429, 5xx и сетевых ошибках; возвращает ответ и число попыток'''
+    recognize = OCR_BACKENDS[OCR_BACKEND]
+    for attempt in range(1, OCR_RETRY_ATTEMPTS + 1):
+        try:
+            return recognize(image, folder_id), attempt
+        except OcrBackendError as e:
+            if not e.retryable or attempt == OCR_RETRY_ATTEMPTS:
+                e.attempts = attempt
+                raise
+            time.sleep(OCR_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+
+
+def run_ocr_pipeline(
+    pages: Iterator[bytes],
+    folder_id: str,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    '''
+    Постраничное распознавание документа. Страницы отправляются в пул по мере
+    растеризации, результаты склеиваются в исходном порядке в один ответ формата
+    batchAnalyze (элемент results на страницу). Для каждой страницы — отчёт со
+    статусом, числом попыток и временем; ход обработки пишется в лог.
+    '''
+    def timed(image: bytes) -> Tuple[Dict[str, Any], int, float]:
+        started = time.perf_counter()
+        page_result, attempts = recognize_page(image, folder_id)
+        return page_result, attempts, time.perf_counter() - started
+    
+    futures = [_ocr_executor.submit(timed, image) for image in pages]
+    total = len(futures)
+    done = 0
+    for _ in as_completed(futures):
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+        elif total > 1:
+            print(f'[INFO] OCR pages done: {done}/{total}')
+    
+    result: Dict[str, Any] = {'results': []}
+    page_reports: List[Dict[str, Any]] = []
+    for number, future in enumerate(futures, start=1):
+        try:
+            page_result, attempts, elapsed = future.result()
+        except OcrBackendError as e:
+            page_reports.append({
+                'page': number,
+                'status': 'error',
+                'statusCode': e.status,
+                'attempts': e.attempts,
+                'error': e.details
+            })
+            continue
+        result['results'].extend(page_result.get('results', []))
+        page_reports.append({
+            'page': number,
+            'status': 'ok',
+            'attempts': attempts,
+            'ms': round(elapsed * 1000)
+        })
+    
+    return result, page_reports
+
+
+# Парсеры документов для действия process: общий модуль backend/_shared/document_parsers.py
+DOCUMENT_PARSERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'passport': lambda recognized: parse_passport(recognized['text']),
+    'bki': lambda recognized: parse_bki_layout(recognized['layout']),
+    'income': lambda recognized: parse_income(recognized['text']),
+    'property': lambda recognized: parse_property(recognized['text']),
+}
@@ -0,0 +1,449 @@
+# Сгенерировано из backend/_shared/document_parsers.py скриптом sync_shared.py — не редактировать.
+# Правки вносятся в backend/_shared/document_parsers.py, затем: python3 sync_shared.py
+'''
+Парсеры распознанных документов: паспорт, кредитная история БКИ, справка о доходах
+и выписка ЕГРН. Общие для parse-ocr-text и ocr-document: функции деплоятся по
+отдельности, поэтому sync_shared.py копирует этот файл в каталог каждой из них.
+Правки вносятся только сюда, затем запускается python3 sync_shared.py.
+'''
+
+import re
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+
+# Все шаблоны компилируются один раз при загрузке функции, а не на каждый запрос.
+# Метки ищутся в строке, приведённой к нижнему регистру: поиск без IGNORECASE
+# по кириллице заметно быстрее
+DATE_RE = re.compile(r'(\d{2})\.(\d{2})\.(\d{4})')
+AMOUNT_RE = re.compile(r'(\d[\d\s\u00a0]*(?:[.,]\d{1,2})?)\s*(?:руб|₽)')
+
+FIO_RE = re.compile(r'([А-ЯЁ][а-яё]+)\s+([А-ЯЁ][а-яё]+)\s+([А-ЯЁ][а-яё]+)')
+NAME_WORD_RE = re.compile(r'^[А-ЯЁ][а-яё]+$')
+PASSPORT_NUMBER_RE = re.compile(r'(\d{2})\s*(\d{2})\s*(\d{6})')
+DEPARTMENT_CODE_RE = re.compile(r'(\d{3})-?(\d{3})')
+REGISTRATION_DATE_RE = re.compile(r'\b(?:с|от)\s+(\d{2})\.(\d{2})\.(\d{4})')
+PASSPORT_LABEL_RE = re.compile(
+    r'(?P<birthDate>дата\s+рождения)'
+    r'|(?P<birthPlace>место\s+рождения|родился|родилась)'
+    r'|(?P<passportIssuedBy>кем\s+выдан)'
+    r'|(?P<passportIssueDate>дата\s+выдачи|выдан)'
+    r'|(?P<passportCode>код\s+подразделения)'
+    r'|(?P<registrationAddress>зарегистрирован|прописан|адрес)'
+)
+PLACE_VALUE_RE = re.compile(r'[:\s]*([А-ЯЁа-яё\s,.-]+)')
+ISSUED_BY_VALUE_RE = re.compile(r'[:\s]*([А-ЯЁа-яё\s\d№.-]+?)\s*(?:код|$)', re.IGNORECASE)
+ADDRESS_VALUE_RE = re.compile(r'[:\s]*([А-ЯЁа-яё\s\d,.№-]+)')
+
+# Записи БКИ разбираются одним проходом finditer по всему тексту: альтернатива
+# с меткой поля или название кредитора. Значение может стоять после пояснения
+# («Задолженность перед банком: ...») или на следующей строке
+BKI_AMOUNT = r'\d[\d \u00a0]*(?:[.,]\d{1,2})?'
+BKI_ENTRY_RE = re.compile(
+    r'(?i:сумма[ \t]+(?:кредита|займа|договора))[^\d\n]{0,40}?\n?[ \t]*(?P<amount>%(amount)s)[ \t]*(?i:руб|₽)'
+    r'|(?i:долг|задолженность|остаток)[^\d\n]{0,60}?\n?[ \t]*(?P<debt>%(amount)s)[ \t]*(?i:руб|₽)'
+    r'|(?i:дата[ \t]+(?:заключения|выдачи|открытия)|открыт)[^\d\n]{0,20}?\n?[ \t]*(?P<date>\d{2}\.\d{2}\.\d{4})'
+    r'|(?i:договор|№)[ \t:]*(?:№[ \t]*)?(?P<contractNumber>[А-ЯЁа-яё\d/-]*\d[А-ЯЁа-яё\d/-]*)'
+    r'|(?P<creditor>(?:(?:ПАО|НАО|АО|ООО)[ \t]*)?(?:МФК|МКК|ПКО)[ \t]*["«]?[А-ЯЁA-Za-zа-яё\d \t.-]+?["»]?(?=[ \t]*(?:$|[,;(]))'
+    r'|(?:[А-ЯЁ][А-ЯЁа-яё \t-]*(?:Банк|банк|БАНК)|Банк|БАНК)[А-ЯЁа-яё]*(?:[ \t]+[А-ЯЁ]{2,}\b)?(?:[ \t]*\([А-ЯЁ]+\))?)'
+    % {'amount': BKI_AMOUNT},
+    re.MULTILINE
+)
+
+# Заголовки колонок таблицы БКИ в порядке приоритета: «Сумма задолженности»
+# относится к долгу, а не к сумме, «Дата договора» к дате, а не к номеру
+BKI_COLUMNS = (
+    ('debt', re.compile(r'задолженност|долг|остаток')),
+    ('date', re.compile(r'дата')),
+    ('amount', re.compile(r'сумма|лимит')),
+    ('contractNumber', re.compile(r'договор|номер|№')),
+    ('creditor', re.compile(r'кредитор|наименование|источник|организация')),
+)
+CELL_AMOUNT_RE = re.compile(BKI_AMOUNT)
+CELL_CONTRACT_RE = re.compile(r'[А-ЯЁа-яё\d/-]*\d[А-ЯЁа-яё\d/-]*')
+
+INCOME_LABEL_RE = re.compile(r'(?P<income>доход|сумма)|(?P<source>источник|работодатель|организация)')
+SOURCE_VALUE_RE = re.compile(r'[:\s]+([А-ЯЁа-яё\s"«»\d.-]+?)\s*(?:ИНН|$)', re.IGNORECASE)
+
+PROPERTY_TYPE_RE = re.compile(r'\b(квартира|дом|здание|участок|гараж)\b')
+CADASTRAL_RE = re.compile(r'(\d{2}:\d{2}:\d{6,7}:\d{1,5})')
+PROPERTY_LABEL_RE = re.compile(
+    r'(?P<value>кадастровая\s+стоимость|стоимость)'
+    r'|(?P<address>адрес|расположен)'
+)
+PROPERTY_ADDRESS_VALUE_RE = re.compile(r'[:\s]+([А-ЯЁа-яё\s\d,.№-]+?)\s*(?:кадастр|$)', re.IGNORECASE)
+
+
+def split_lines(text: str) -> List[str]:
+    '''Текст разбивается на строки один раз; все парсеры дальше идут по строкам'''
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def label_value(lines: List[str], index: int, label_end: int) -> str:
+    '''Значение после метки; если OCR вынес его на следующую строку, берём её'''
+    rest = lines[index][label_end:].strip(' :\t')
+    if not rest and index + 1 < len(lines):
+        return lines[index + 1]
+    return rest
+
+
+def line_labels(lines: List[str], index: int, label_re: 're.Pattern') -> Iterator[Tuple[str, str, str]]:
+    '''
+    Все метки строки по порядку: (поле, значение, сырой хвост). OCR часто ставит
+    несколько полей в одну строку, поэтому значение тянется только до следующей
+    метки; у последней метки оно может быть на следующей строке
+    '''
+    labels = list(label_re.finditer(lines[index].lower()))
+    for position, label in enumerate(labels):
+        if position + 1 < len(labels):
+            raw = lines[index][label.end():labels[position + 1].start()]
+            yield label.lastgroup, raw.strip(' :\t'), raw
+        else:
+            yield label.lastgroup, label_value(lines, index, label.end()), lines[index][label.end():]
+
+
+def iso_date(match: 're.Match') -> str:
+    return f"{match.group(3)}-{match.group(2)}-{match.group(1)}"
+
+
+def parse_amount(value: str) -> float:
+    return float(value.strip().replace(' ', '').replace('\u00a0', '').replace(',', '.'))
+
+
+def parse_passport(text: str) -> Dict[str, Any]:
+    '''Парсинг паспорта РФ'''
+    data = {}
+    lines = split_lines(text)
+    first_date = None
+    name_run: List[str] = []
+    
+    for index, line in enumerate(lines):
+        # ФИО бывает в одной строке или по слову на строке (фамилия, имя, отчество)
+        if 'fullName' not in data:
+            fio_match = FIO_RE.search(line)
+            if fio_match:
+                data['fullName'] = f"{fio_match.group(1)} {fio_match.group(2)} {fio_match.group(3)}"
+            elif NAME_WORD_RE.match(line):
+                name_run.append(line)
+                if len(name_run) == 3:
+                    data['fullName'] = ' '.join(name_run)
+            else:
+                name_run = []
+        
+        if 'passportSeries' not in data:
+            series_number = PASSPORT_NUMBER_RE.search(line)
+            if series_number:
+                data['passportSeries'] = f"{series_number.group(1)} {series_number.group(2)}"
+                data['passportNumber'] = series_number.group(3)
+        
+        if first_date is None:
+            first_date = DATE_RE.search(line)
+        
+        if 'registrationDate' not in data:
+            reg_date = REGISTRATION_DATE_RE.search(line)
+            if reg_date:
+                data['registrationDate'] = iso_date(reg_date)
+        
+        for field, value, _ in line_labels(lines, index, PASSPORT_LABEL_RE):
+            if field in data:
+                continue
+            
+            if field in ('birthDate', 'passportIssueDate'):
+                date_match = DATE_RE.search(value)
+                if date_match:
+                    data[field] = iso_date(date_match)
+            elif field == 'birthPlace':
+                place = PLACE_VALUE_RE.match(value)
+                if place and place.group(1).strip():
+                    data[field] = place.group(1).strip()
+            elif field == 'passportIssuedBy':
+                issued_by = ISSUED_BY_VALUE_RE.match(value)
+                if issued_by and issued_by.group(1).strip():
+                    data[field] = issued_by.group(1).strip()
+            elif field == 'passportCode':
+                code = DEPARTMENT_CODE_RE.search(value)
+                if code:
+                    data[field] = f"{code.group(1)}-{code.group(2)}"
+            elif field == 'registrationAddress':
+                address = ADDRESS_VALUE_RE.match(value)
+                if address and address.group(1).strip():
+                    data[field] = address.group(1).strip()
+    
+    # Без явной метки датой рождения считается первая дата в документе
+    if 'birthDate' not in data and first_date:
+        data['birthDate'] = iso_date(first_date)
+    
+    return data
+
+
+def parse_bki(text: str) -> Dict[str, Any]:
+    '''
+    Парсинг кредитной истории БКИ. Поля относятся к ближайшему кредитору выше
+    по тексту: повтор поля в том же блоке открывает новый договор этого же
+    кредитора, а не сдвигает пары, как при сопоставлении списков по индексу.
+    '''
+    creditors: Dict[str, Dict[str, Any]] = {}
+    current_creditor: Optional[Dict[str, Any]] = None
+    current_credit: Optional[Dict[str, Any]] = None
+    
+    for match in BKI_ENTRY_RE.finditer(text):
+        field = match.lastgroup
+        value = match.group(field)
+        
+        if field == 'creditor':
+            name = ' '.join(value.split())
+            current_creditor = creditors.setdefault(name.lower(), {'name': name, 'inn': '', 'credits': []})
+            current_credit = None
+            continue
+        
+        if current_creditor is None:
+            continue
+        
+        if field == 'date':
+            parsed = iso_date(DATE_RE.match(value))
+        elif field == 'contractNumber':
+            parsed = value
+        else:
+            parsed = parse_amount(value)
+        
+        if current_credit is None or current_credit[field]:
+            current_credit = {'contractNumber': '', 'amount': 0, 'debt': 0, 'date': ''}
+            current_creditor['credits'].append(current_credit)
+        current_credit[field] = parsed
+    
+    data = {'creditors': []}
+    for creditor in creditors.values():
+        creditor['credits'] = [c for c in creditor['credits'] if c['debt'] or c['amount']]
+        if creditor['credits']:
+            data['creditors'].append(creditor)
+    
+    data['totalDebt'] = sum(credit['debt'] for creditor in data['creditors'] for credit in creditor['credits'])
+    
+    return data
+
+
+def cluster_rows(lines: List[List[Any]]) -> List[Dict[str, Any]]:
+    '''
+    Строки OCR одной страницы собираются в строки таблицы: строка попадает в ряд,
+    если её середина по вертикали лежит внутри полосы ряда. Ячейки ряда
+    упорядочены слева направо.
+    '''
+    rows: List[Dict[str, Any]] = []
+    for x0, y0, x1, y1, text in sorted(lines, key=lambda line: line[1] + line[3]):
+        center = (y0 + y1) / 2
+        if rows and center <= rows[-1]['bottom']:
+            row = rows[-1]
+            row['bottom'] = max(row['bottom'], y1)
+        else:
+            row = {'top': y0, 'bottom': y1, 'cells': []}
+            rows.append(row)
+        row['cells'].append((x0, x1, text))
+    
+    for row in rows:
+        row['cells'].sort()
+        row['center'] = (row['top'] + row['bottom']) / 2
+    return rows
+
+
+def detect_columns(row: Dict[str, Any], width: float) -> Optional[Dict[str, Tuple[float, float]]]:
+    '''Ряд заголовка таблицы: колонки кредитора и суммы или долга плюс ещё хотя бы одна'''
+    columns: Dict[str, Tuple[float, float]] = {}
+    for x0, x1, text in row['cells']:
+        lower = text.lower()
+        for field, pattern in BKI_COLUMNS:
+            if pattern.search(lower):
+                if field not in columns:
+                    columns[field] = (x0 / width, x1 / width)
+                break
+    
+    if 'creditor' in columns and ('debt' in columns or 'amount' in columns) and len(columns) >= 3:
+        return columns
+    return None
+
+
+def assign_cells(row: Dict[str, Any], columns: Dict[str, Tuple[float, float]], width: float) -> Dict[str, str]:
+    '''Ячейка относится к колонке с наибольшим перекрытием по горизонтали, иначе к ближайшей'''
+    values: Dict[str, List[str]] = {}
+    for x0, x1, text in row['cells']:
+        left, right = x0 / width, x1 / width
+        center = (left + right) / 2
+        field = max(
+            columns,
+            key=lambda name: (
+                min(right, columns[name][1]) - max(left, columns[name][0]),
+                -abs(center - (columns[name][0] + columns[name][1]) / 2)
+            )
+        )
+        values.setdefault(field, []).append(text)
+    return {field: ' '.join(parts) for field, parts in values.items()}
+
+
+def parse_bki_layout(layout: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Парсинг кредитной истории БКИ по геометрии из ocr-document. Строки OCR
+    кластеризуются в ряды, колонки определяются по ряду заголовка и переносятся
+    на следующие страницы без заголовка. Ряд с суммой или долгом — отдельный
+    договор; перенос названия кредитора на соседний ряд приклеивается к
+    ближайшему ряду с суммами. Если таблица не найдена, текст собирается по рядам
+    и разбирается parse_bki.
+    '''
+    columns: Optional[Dict[str, Tuple[float, float]]] = None
+    entries: List[Dict[str, Any]] = []
+    row_text: List[str] = []
+    
+    for page in layout.get('pages', []):
+        lines = page.get('lines', [])
+        if not lines:
+            continue
+        width = float(page.get('width') or max(line[2] for line in lines) or 1)
+        rows = cluster_rows(lines)
+        row_text.extend(' '.join(cell[2] for cell in row['cells']) for row in rows)
+        
+        page_entries: List[Dict[str, Any]] = []
+        name_rows: List[Tuple[float, str]] = []
+        for row in rows:
+            header = detect_columns(row, width)
+            if header:
+                columns = header
+                continue
+            if columns is None:
+                continue
+            
+            cells = assign_cells(row, columns, width)
+            amount = CELL_AMOUNT_RE.search(cells.get('amount', ''))
+            debt = CELL_AMOUNT_RE.search(cells.get('debt', ''))
+            if not amount and not debt:
+                if cells.get('creditor'):
+                    name_rows.append((row['center'], cells['creditor']))
+                continue
+            
+            contract = CELL_CONTRACT_RE.search(cells.get('contractNumber', ''))
+            date_match = DATE_RE.search(cells.get('date', ''))
+            page_entries.append({
+                'center': row['center'],
+                'height': row['bottom'] - row['top'],
+                'name': [cells.get('creditor', '')],
+                'credit': {
+                    'contractNumber': contract.group(0) if contract else '',
+                    'amount': parse_amount(amount.group(0)) if amount else 0,
+                    'debt': parse_amount(debt.group(0)) if debt else 0,
+                    'date': iso_date(date_match) if date_match else ''
+                }
+            })
+        
+        # Перенос названия: к ближайшему по вертикали ряду с суммами, но не дальше двух высот строки
+        for center, fragment in name_rows:
+            nearest = min(page_entries, key=lambda entry: abs(entry['center'] - center), default=None)
+            if nearest is None or abs(nearest['center'] - center) > 2 * max(nearest['height'], 1):
+                continue
+            if center < nearest['center']:
+                nearest['name'].insert(0, fragment)
+            else:
+                nearest['name'].append(fragment)
+        entries.extend(page_entries)
+    
+    if not entries:
+        return parse_bki('\n'.join(row_text))
+    
+    creditors: Dict[str, Dict[str, Any]] = {}
+    current_creditor: Optional[Dict[str, Any]] = None
+    for entry in entries:
+        name = ' '.join(' '.join(entry['name']).split())
+        # Ряд без названия — следующий договор того же кредитора (объединённая ячейка)
+        if name:
+            current_creditor = creditors.setdefault(name.lower(), {'name': name, 'inn': '', 'credits': []})
+        if current_creditor is not None:
+            current_creditor['credits'].append(entry['credit'])
+    
+    data = {'creditors': list(creditors.values())}
+    data['totalDebt'] = sum(credit['debt'] for creditor in data['creditors'] for credit in creditor['credits'])
+    
+    return data
+
+
+def parse_income(text: str) -> Dict[str, Any]:
+    '''Парсинг справки о доходах (2-НДФЛ)'''
+    data = {}
+    
+    lines = split_lines(text)
+    for index in range(len(lines)):
+        for field, value, raw in line_labels(lines, index, INCOME_LABEL_RE):
+            if field == 'income' and 'lastYear' not in data:
+                income_match = AMOUNT_RE.search(value.lower())
+                if income_match:
+                    total_income = parse_amount(income_match.group(1))
+                    data['lastYear'] = total_income
+                    data['monthlyIncome'] = round(total_income / 12, 2)
+            elif field == 'source' and 'source' not in data:
+                source_match = SOURCE_VALUE_RE.match(raw)
+                if source_match and source_match.group(1).strip():
+                    data['source'] = source_match.group(1).strip()
+    
+    if 'source' not in data:
+        data['source'] = 'заработная плата'
+    
+    return data
+
+
+def parse_property(text: str) -> Dict[str, Any]:
+    '''Парсинг выписки из ЕГРН: поля объекта собираются по близости, как в БКИ'''
+    data = {'realEstate': []}
+    current: Optional[Dict[str, Any]] = None
+    
+    def field_slot(field: str) -> Dict[str, Any]:
+        nonlocal current
+        if current is None or current[field]:
+            current = {'type': '', 'cadastralNumber': '', 'address': '', 'value': 0}
+            data['realEstate'].append(current)
+        return current
+    
+    lines = split_lines(text)
+    for index, line in enumerate(lines):
+        lower = line.lower()
+        property_type = PROPERTY_TYPE_RE.search(lower)
+        if property_type:
+            field_slot('type')['type'] = property_type.group(1)
+        
+        cadastral = CADASTRAL_RE.search(line)
+        if cadastral:
+            field_slot('cadastralNumber')['cadastralNumber'] = cadastral.group(1)
+        
+        label = PROPERTY_LABEL_RE.search(lower)
+        if not label:
+            continue
+        
+        if label.lastgroup == 'address':
+            address = PROPERTY_ADDRESS_VALUE_RE.match(line[label.end():])
+            if address and address.group(1).strip():
+                field_slot('address')['address'] = address.group(1).strip()
+        else:
+            value = AMOUNT_RE.search(label_value(lines, index, label.end()).lower())
+            if value:
+                field_slot('value')['value'] = parse_amount(value.group(1))
+    
+    for property_item in data['realEstate']:
+        property_item['type'] = property_item['type'] or 'недвижимость'
+    
+    return data
+
+
+def valid_layout(layout: Any) -> bool:
+    '''
+    Разметка пришла от клиента: {'pages': [{'width', 'height', 'lines': [[x0, y0, x1, y1, text], ...]}]}.
+    Любая другая форма не доходит до parse_bki_layout — БКИ тогда разбирается по тексту.
+    '''
+    if not isinstance(layout, dict) or not isinstance(layout.get('pages'), list):
+        return False
+    for page in layout['pages']:
+        if not isinstance(page, dict) or not isinstance(page.get('lines', []), list):
+            return False
+        if any(not is_number(page.get(key) or 0) for key in ('width', 'height')):
+            return False
+        for line in page.get('lines', []):
+            if not isinstance(line, list) or len(line) != 5 or not isinstance(line[4], str):
+                return False
+            if not all(is_number(value) for value in line[:4]):
+                return False
+    return True
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -15,7 +15,8 @@ Without this setup, webhooks will NOT work and users will NOT receive access aft
 import json
 import os
 import base64
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import requests
@@ -24,7 +25,12 @@ import uuid
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import bcrypt
+
+from chat_token_pool import claim_pool_tokens, refill_chat_token_pool
+from password_hashing import hash_password
+
+# bcrypt releases the GIL while hashing, so the webhook can hash while it talks to the DB
+_hash_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('HASH_WORKERS', 2)), thread_name_prefix='bcrypt')
 
 def get_db_connection():
     conn = psycopg2.connect(os.environ['DATABASE_URL'])
@@ -124,7 +130,7 @@ def create_payment(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
                     user_id = existing_user['id']
                 else:
                     password = str(uuid.uuid4())[:8]
-                    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                    password_hash = hash_password(password)
                     cur.execute(
                         "INSERT INTO users (email, password_hash, full_name, is_admin) VALUES (%s, %s, %s, false) RETURNING id",
                         (email, password_hash, full_name)
@@ -304,6 +310,13 @@ def handle_webhook(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
             current_purchase = cur.fetchone()
             current_product_type = current_purchase['product_type'] if current_purchase else 'course'
             
+            # The access password is hashed on the pool while the purchase is being updated
+            temp_password = None
+            temp_password_hash_future = None
+            if current_product_type != 'consultation':
+                temp_password = str(uuid.uuid4())[:8]
+                temp_password_hash_future = _hash_executor.submit(hash_password, temp_password)
+            
             cur.execute(
                 "SELECT id, expires_at FROM user_purchases WHERE user_id = %s AND payment_status = 'completed' AND product_type = %s ORDER BY expires_at DESC LIMIT 1",
                 (int(user_id), current_product_type)
@@ -454,8 +467,7 @@ def handle_webhook(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
             conn_main = get_db_connection()
             try:
                 with conn_main.cursor(cursor_factory=RealDictCursor) as cur:
-                    temp_password = str(uuid.uuid4())[:8]
-                    temp_password_hash = bcrypt.hashpw(temp_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                    temp_password_hash = temp_password_hash_future.result()
                     
                     cur.execute(
                         "UPDATE users SET password_hash = %s WHERE id = %s",
@@ -473,6 +485,21 @@ def handle_webhook(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
                     print(f"[WEBHOOK] Email sent successfully!")
             finally:
                 conn_main.close()
+            
+            if current_product_type in ['chat', 'combo']:
+                # A failure here must not fail the webhook, otherwise YooKassa retries it and extends access twice
+                try:
+                    chat_token_data = issue_pool_chat_token(int(user_id), user['email'], current_product_type, payment_id)
+                    if chat_token_data:
+                        send_chat_token_email(
+                            user_email=user['email'],
+                            user_name=user['full_name'],
+                            chat_token=chat_token_data['token'],
+                            product_type=current_product_type
+                        )
+                        print(f"[WEBHOOK] Chat token email sent to {user['email']}")
+                except Exception as token_error:
+                    print(f"[WEBHOOK] ❌ Failed to issue chat token: {token_error}")
     
     return {
         'statusCode': 200,
@@ -600,99 +627,50 @@ def check_payment_status(event: Dict[str, Any], headers: Dict[str, str]) -> Dict
 
 
 
-def create_chat_token_via_api(user_id: int, user_email: str, product_type: str):
-    '''Create chat token via chat-tokens API endpoint'''
-    try:
-        api_key = os.environ.get('CHAT_API_KEY')
-        if not api_key:
-            print(f"[CHAT_TOKEN_API] ❌ CHAT_API_KEY not configured")
-            return None
-        
-        days = 30 if product_type in ['chat', 'combo'] else 180
-        
-        func2url_path = '/var/task/func2url.json'
-        chat_tokens_url = None
-        
-        try:
-            with open(func2url_path, 'r') as f:
-                func2url = json.load(f)
-                chat_tokens_url = func2url.get('chat-tokens')
-        except Exception as e:
-            print(f"[CHAT_TOKEN_API] ⚠️ Could not read func2url.json: {e}")
-        
-        if not chat_tokens_url:
-            chat_tokens_url = 'https://functions.poehali.dev/4be60127-67a0-45a6-8940-0e875ec618ac'
-            print(f"[CHAT_TOKEN_API] Using fallback URL")
-        
-        response = requests.post(
-            chat_tokens_url,
-            json={
-                'user_id': user_id,
-                'email': user_email,
-                'product_type': product_type,
-                'days': days
-            },
-            headers={
-                'X-Api-Key': api_key,
-                'Content-Type': 'application/json'
-            },
-            timeout=10
-        )
-        
-        print(f"[CHAT_TOKEN_API] Response status: {response.status_code}")
-        
-        if response.status_code != 201:
-            print(f"[CHAT_TOKEN_API] ❌ Failed to create token: {response.text}")
-            return None
-        
-        result = response.json()
-        token = result.get('token')
-        expires_at_str = result.get('expires_at')
-        
-        if expires_at_str:
-            expires_at = datetime.fromisoformat(expires_at_str.replace('Z', '+00:00'))
-        else:
-            expires_at = datetime.now() + timedelta(days=days)
-        
-        print(f"[CHAT_TOKEN_API] ✅ Token created: {token[:20]}...")
-        
-        return {
-            'token': token,
-            'expires_at': expires_at,
-            'chat_url': 'https://chat-bankrot.ru'
-        }
-        
-    except Exception as e:
-        print(f"[CHAT_TOKEN_API] ❌ Error creating token via API: {e}")
-        import traceback
-        print(f"[CHAT_TOKEN_API] Traceback: {traceback.format_exc()}")
-        return None
-
-def save_external_chat_token(user_id: int, user_email: str, token: str, expires_at: datetime, product_type: str):
-    '''Save external chat token (from bankrot-kurs.ru) to our database'''
+def issue_pool_chat_token(user_id: int, user_email: str, product_type: str, payment_id: str) -> Optional[Dict[str, Any]]:
+    '''
+    Claim a token from the pool and register it in chat_tokens in one transaction.
+    Returns None when the pool is empty or a token was already issued for this
+    payment, so a redelivered webhook neither burns a second token nor re-sends one.
+    '''
+    days = 30 if product_type in ['chat', 'combo'] else 180
+    expires_at = datetime.now() + timedelta(days=days)
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            tokens = claim_pool_tokens(cur, user_id, user_email)
+            if not tokens:
+                # Pool ran dry: refill inline and try once more
+                refill_chat_token_pool(cur)
+                tokens = claim_pool_tokens(cur, user_id, user_email)
+            if not tokens:
+                conn.rollback()
+                print(f"[CHAT_POOL] ❌ No free tokens for user {user_id}")
+                return None
+            
             cur.execute(
-                """INSERT INTO chat_tokens 
-                (user_id, email, token, product_type, expires_at) 
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (token) DO UPDATE SET
-                    user_id = EXCLUDED.user_id,
-                    email = EXCLUDED.email,
-                    product_type = EXCLUDED.product_type,
-                    expires_at = EXCLUDED.expires_at
-                RETURNING token""",
-                (user_id, user_email, token, product_type, expires_at)
+                """
+                INSERT INTO chat_tokens (user_id, email, token, product_type, expires_at, payment_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (payment_id) WHERE payment_id IS NOT NULL DO NOTHING
+                """,
+                (user_id, user_email, tokens[0], product_type, expires_at, payment_id)
             )
-            conn.commit()
-            print(f"[DB] Saved external chat token for user {user_id}: {token}")
-            return True
-    except Exception as e:
-        print(f"[DB] Error saving external chat token: {e}")
-        import traceback
-        print(f"[DB] Traceback: {traceback.format_exc()}")
-        return False
+            if cur.rowcount == 0:
+                # Rolling back also returns the claimed token to the pool
+                conn.rollback()
+                print(f"[CHAT_POOL] Token for payment {payment_id} already issued, skipping")
+                return None
+        conn.commit()
+        print(f"[CHAT_POOL] ✅ Issued token {tokens[0][:12]}... to user {user_id}")
+        
+        # Refill after the purchase transaction is committed so buyers never wait on it
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            refill_chat_token_pool(cur)
+        conn.commit()
+        
+        return {'token': tokens[0], 'expires_at': expires_at}
     finally:
         conn.close()
 
@@ -1,23 +1,58 @@
 '''
-Пересоздание и отправка токена чата пользователю через внешнее API chat-bankrot.ru
+Выдача токена чата пользователю из пула chat_tokens_pool и отправка письма
 Args: event с email пользователя; context с request_id
 Returns: Результат создания токена и отправки письма
 '''
 
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import requests
 from datetime import datetime, timedelta
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from chat_token_pool import claim_pool_tokens, refill_chat_token_pool
+
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
+def issue_pool_chat_token(user_id: int, user_email: str, product_type: str) -> Optional[Dict[str, Any]]:
+    '''Claim a token from the pool and register it in chat_tokens in one transaction'''
+    days = 30 if product_type in ['chat', 'combo'] else 180
+    expires_at = datetime.now() + timedelta(days=days)
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            tokens = claim_pool_tokens(cur, user_id, user_email)
+            if not tokens:
+                # Pool ran dry: refill inline and try once more
+                refill_chat_token_pool(cur)
+                tokens = claim_pool_tokens(cur, user_id, user_email)
+            if not tokens:
+                conn.rollback()
+                print(f"[CHAT_POOL] ❌ No free tokens for user {user_id}")
+                return None
+            
+            cur.execute(
+                "INSERT INTO chat_tokens (user_id, email, token, product_type, expires_at) VALUES (%s, %s, %s, %s, %s)",
+                (user_id, user_email, tokens[0], product_type, expires_at)
+            )
+        conn.commit()
+        print(f"[CHAT_POOL] ✅ Issued token {tokens[0][:12]}... to user {user_id}")
+        
+        # Refill after the purchase transaction is committed so buyers never wait on it
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            refill_chat_token_pool(cur)
+        conn.commit()
+        
+        return {'token': tokens[0], 'expires_at': expires_at}
+    finally:
+        conn.close()
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
@@ -85,21 +120,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         print(f"[RESEND] Found user {user_id}, product: {product_type}")
         
-        # Создаем токен через внешнее API
-        chat_token_data = create_chat_token_via_api(
+        # Выдаём токен из пула
+        chat_token_data = issue_pool_chat_token(
             user_id=user_id,
             user_email=user_email,
             product_type=product_type
         )
         
-        if not chat_token_data or not chat_token_data.get('token'):
+        if not chat_token_data:
             return {
-                'statusCode': 500,
+                'statusCode': 503,
                 'headers': headers_out,
-                'body': json.dumps({
-                    'error': 'Failed to create chat token via external API',
-                    'details': str(chat_token_data)
-                }),
+                'body': json.dumps({'error': 'Chat token pool is empty'}),
                 'isBase64Encoded': False
             }
         
@@ -107,11 +139,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         expires_at = chat_token_data['expires_at']
         expires_date = expires_at.strftime('%d.%m.%Y')
         
-        print(f"[RESEND] Token created: {token[:20]}...")
-        
-        # Сохраняем токен в нашу БД
-        save_result = save_external_chat_token(user_id, user_email, token, expires_at, product_type)
-        print(f"[RESEND] Token saved to DB: {save_result}")
+        print(f"[RESEND] Token issued: {token[:20]}...")
         
         # Отправляем email
         email_result = send_chat_token_email(
@@ -151,100 +179,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
 
 
-def create_chat_token_via_api(user_id: int, user_email: str, product_type: str):
-    '''Create chat token via external chat-tokens API (chat-bankrot.ru shared DB)'''
-    try:
-        api_key = os.environ.get('CHAT_API_KEY')
-        if not api_key:
-            print(f"[CHAT_TOKEN_API] ❌ CHAT_API_KEY not configured")
-            return {'error': 'CHAT_API_KEY not configured'}
-        
-        days = 30 if product_type in ['chat', 'combo'] else 180
-        
-        # Внешнее API для создания токена в общей БД с chat-bankrot.ru
-        chat_tokens_url = 'https://functions.poehali.dev/4be60127-67a0-45a6-8940-0e875ec618ac'
-        
-        print(f"[CHAT_TOKEN_API] Creating token for user {user_id} ({user_email})")
-        print(f"[CHAT_TOKEN_API] Product: {product_type}, Days: {days}")
-        print(f"[CHAT_TOKEN_API] API URL: {chat_tokens_url}")
-        
-        response = requests.post(
-            chat_tokens_url,
-            json={
-                'user_id': user_id,
-                'email': user_email,
-                'product_type': product_type,
-                'days': days
-            },
-            headers={
-                'X-Api-Key': api_key,
-                'Content-Type': 'application/json'
-            },
-            timeout=10
-        )
-        
-        print(f"[CHAT_TOKEN_API] Response status: {response.status_code}")
-        print(f"[CHAT_TOKEN_API] Response body: {response.text[:500]}")
-        
-        if response.status_code == 201:
-            result = response.json()
-            token = result.get('token')
-            expires_at_str = result.get('expires_at')
-            
-            if expires_at_str:
-                # Парсим ISO формат даты
-                expires_at = datetime.fromisoformat(expires_at_str.replace('Z', '+00:00'))
-            else:
-                expires_at = datetime.now() + timedelta(days=days)
-            
-            print(f"[CHAT_TOKEN_API] ✅ Token created successfully: {token}")
-            
-            return {
-                'token': token,
-                'expires_at': expires_at,
-                'chat_url': 'https://chat-bankrot.ru'
-            }
-        else:
-            print(f"[CHAT_TOKEN_API] ❌ Failed with status {response.status_code}")
-            return {'error': f'API returned {response.status_code}', 'response': response.text}
-        
-    except Exception as e:
-        print(f"[CHAT_TOKEN_API] ❌ Exception: {e}")
-        import traceback
-        print(f"[CHAT_TOKEN_API] Traceback: {traceback.format_exc()}")
-        return {'error': str(e)}
-
-
-def save_external_chat_token(user_id: int, user_email: str, token: str, expires_at: datetime, product_type: str):
-    '''Save external chat token (from chat-bankrot.ru) to local database'''
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """INSERT INTO chat_tokens 
-                (user_id, email, token, product_type, expires_at, created_at) 
-                VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-                ON CONFLICT (token) DO UPDATE SET
-                    user_id = EXCLUDED.user_id,
-                    email = EXCLUDED.email,
-                    product_type = EXCLUDED.product_type,
-                    expires_at = EXCLUDED.expires_at
-                RETURNING token""",
-                (user_id, user_email, token, product_type, expires_at)
-            )
-            result = cur.fetchone()
-            conn.commit()
-            print(f"[DB] ✅ Saved chat token for user {user_id}: {token}")
-            return True
-    except Exception as e:
-        print(f"[DB] ❌ Error saving token: {e}")
-        import traceback
-        print(f"[DB] Traceback: {traceback.format_exc()}")
-        return False
-    finally:
-        conn.close()
-
-
 def send_chat_token_email(user_email: str, user_name: str, token: str, expires_date: str, product_type: str):
     '''Send email with chat token'''
     try:
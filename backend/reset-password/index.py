@@ -7,11 +7,12 @@ Returns: Success message or error
 import json
 import os
 import psycopg2
-import bcrypt
 import secrets
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
+from password_hashing import hash_password
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
@@ -146,7 +147,7 @@ def confirm_reset(body: Dict[str, Any]) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'Токен истек'})
             }
         
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = hash_password(new_password)
         
         cursor.execute(
             "UPDATE users SET password_hash = %s WHERE id = %s",
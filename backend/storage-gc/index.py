@@ -0,0 +1,313 @@
+'''
+Business: Сборщик мусора хранилища - удаляет из S3 файлы курса и поддержки, на которые больше нет ссылок в БД, и прерывает заброшенные multipart-загрузки
+Args: event - dict с httpMethod, headers (X-Auth-Token администратора), body/queryStringParameters (dry_run)
+      context - object с attributes: request_id, function_name
+Returns: HTTP response dict с количеством найденных и удалённых файлов и освобождённым объёмом
+'''
+
+import json
+import os
+from typing import Dict, Any, Optional, Iterator, List, Tuple
+from datetime import datetime, timedelta, timezone
+import psycopg2
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import jwt
+
+S3_ENDPOINT = 'https://storage.yandexcloud.net'
+S3_BUCKET = 'poehalidev-user-files'
+S3_URL_PREFIX = f'{S3_ENDPOINT}/{S3_BUCKET}/'
+
+# Only prefixes written by upload-file and upload-support-file are reconciled
+GC_PREFIXES = ('course-files/', 'support-files/')
+
+# Objects are uploaded before the DB row that references them is written,
+# so fresh objects are never treated as orphans
+GC_GRACE_PERIOD = timedelta(hours=int(os.environ.get('GC_GRACE_HOURS', 24)))
+
+# Multipart uploads nobody resumed for this long are aborted: their parts are billed
+# but never show up in the bucket listing
+GC_STALE_UPLOAD_AGE = timedelta(days=int(os.environ.get('GC_STALE_UPLOAD_DAYS', 7)))
+
+LIST_PAGE_SIZE = 1000
+DB_FETCH_SIZE = 2000
+DELETE_BATCH_SIZE = 1000
+
+_s3_client = None
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    
+    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    
+    if not aws_access_key or not aws_secret_key:
+        return None
+    
+    _s3_client = boto3.client(
+        's3',
+        endpoint_url=S3_ENDPOINT,
+        aws_access_key_id=aws_access_key,
+        aws_secret_access_key=aws_secret_key,
+        region_name='ru-central1',
+        config=Config(tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'standard'})
+    )
+    return _s3_client
+
+def verify_admin(headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+    if not auth_token:
+        return None
+    
+    # Allow admin_session_token for admin panel access
+    if auth_token == 'admin_session_token':
+        return {'is_admin': True, 'id': 0, 'email': 'admin@session'}
+    
+    try:
+        jwt_secret = os.environ.get('JWT_SECRET')
+        if not jwt_secret:
+            return None
+        
+        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+        
+        if not payload.get('is_admin'):
+            return None
+        
+        return payload
+    except:
+        return None
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    
+    if not verify_admin(event.get('headers', {}) or {}):
+        return {
+            'statusCode': 401,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Unauthorized - Admin access required'})
+        }
+    
+    s3_client = get_s3_client()
+    if not s3_client:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'S3 credentials not configured'})
+        }
+    
+    # GET only reports orphans; deleting requires POST with a literal "dry_run": false,
+    # so a missing, null or mistyped flag never deletes anything
+    dry_run = True
+    if method == 'POST':
+        body_data = json.loads(event.get('body') or '{}')
+        dry_run = body_data.get('dry_run', True) is not False
+    
+    try:
+        conn = get_db_connection()
+        try:
+            report = sweep_stale_uploads(conn, s3_client, dry_run)
+            report.update(collect_garbage(conn, s3_client, dry_run))
+        finally:
+            conn.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'success': True,
+                'dry_run': dry_run,
+                **report,
+                'checked_at': datetime.now().isoformat()
+            })
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def iter_bucket_objects(s3_client, prefix: str) -> Iterator[Dict[str, Any]]:
+    '''Stream the bucket listing page by page; S3 returns keys in UTF-8 byte order'''
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix, PaginationConfig={'PageSize': LIST_PAGE_SIZE}):
+        for obj in page.get('Contents', []):
+            yield obj
+
+def iter_referenced_keys(conn, prefix: str) -> Iterator[str]:
+    '''
+    Stream every object key referenced from the DB, deduplicated and sorted in the same byte order as S3.
+    Lesson videos and materials may link straight to uploaded course files, so they count too;
+    a query string (cache busting, signed links) is not part of the key.
+    '''
+    key_prefix = S3_URL_PREFIX + prefix
+    start = len(S3_URL_PREFIX) + 1
+    
+    with conn.cursor(name='storage_gc_refs') as cur:
+        cur.itersize = DB_FETCH_SIZE
+        cur.execute(
+            """
+            SELECT key FROM (
+                SELECT split_part(substring(file_url FROM %(start)s), '?', 1) AS key FROM course_files WHERE file_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(thumbnail_url FROM %(start)s), '?', 1) FROM course_files WHERE thumbnail_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(preview_url FROM %(start)s), '?', 1) FROM course_files WHERE preview_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(video_url FROM %(start)s), '?', 1) FROM lessons WHERE video_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(file_url FROM %(start)s), '?', 1) FROM materials WHERE file_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(image_url FROM %(start)s), '?', 1) FROM support_messages WHERE image_url LIKE %(pattern)s
+                UNION
+                SELECT split_part(substring(file_url FROM %(start)s), '?', 1) FROM support_messages WHERE file_url LIKE %(pattern)s
+                UNION
+                SELECT file_key FROM upload_sessions WHERE status IN ('in_progress', 'completing') AND file_key LIKE %(key_pattern)s
+            ) refs
+            ORDER BY key COLLATE "C"
+            """,
+            {'start': start, 'pattern': key_prefix + '%', 'key_pattern': prefix + '%'}
+        )
+        for row in cur:
+            yield row[0]
+
+def delete_batch(s3_client, batch: List[Dict[str, Any]]) -> Tuple[int, int, List[str]]:
+    response = s3_client.delete_objects(
+        Bucket=S3_BUCKET,
+        Delete={'Objects': [{'Key': obj['Key']} for obj in batch], 'Quiet': True}
+    )
+    failed = {err['Key'] for err in response.get('Errors', [])}
+    deleted = [obj for obj in batch if obj['Key'] not in failed]
+    return len(deleted), sum(obj['Size'] for obj in deleted), sorted(failed)
+
+def collect_garbage(conn, s3_client, dry_run: bool) -> Dict[str, Any]:
+    cutoff = datetime.now(timezone.utc) - GC_GRACE_PERIOD
+    report = {
+        'scanned': 0,
+        'orphaned': 0,
+        'orphaned_bytes': 0,
+        'deleted': 0,
+        'reclaimed_bytes': 0,
+        'failed_keys': []
+    }
+    
+    for prefix in GC_PREFIXES:
+        # Sorted merge of two ascending key streams. Python compares str by code
+        # point, which matches both the S3 listing and COLLATE "C" byte order
+        referenced = iter_referenced_keys(conn, prefix)
+        ref = next(referenced, None)
+        batch: List[Dict[str, Any]] = []
+        
+        for obj in iter_bucket_objects(s3_client, prefix):
+            report['scanned'] += 1
+            while ref is not None and ref < obj['Key']:
+                ref = next(referenced, None)
+            if ref == obj['Key'] or obj['LastModified'] > cutoff:
+                continue
+            
+            report['orphaned'] += 1
+            report['orphaned_bytes'] += obj['Size']
+            if dry_run:
+                continue
+            
+            batch.append(obj)
+            if len(batch) == DELETE_BATCH_SIZE:
+                deleted, reclaimed, failed = delete_batch(s3_client, batch)
+                report['deleted'] += deleted
+                report['reclaimed_bytes'] += reclaimed
+                report['failed_keys'].extend(failed)
+                batch = []
+        
+        if batch:
+            deleted, reclaimed, failed = delete_batch(s3_client, batch)
+            report['deleted'] += deleted
+            report['reclaimed_bytes'] += reclaimed
+            report['failed_keys'].extend(failed)
+        
+        referenced.close()
+        conn.rollback()
+        print(f"[GC] {prefix}: scanned {report['scanned']}, orphaned {report['orphaned']}, deleted {report['deleted']}")
+    
+    return report
+
+def sweep_stale_uploads(conn, s3_client, dry_run: bool) -> Dict[str, Any]:
+    '''
+    Abort multipart uploads whose session was not touched for GC_STALE_UPLOAD_AGE.
+    A session is first claimed as 'aborting' and committed, so a concurrent resume
+    sees it is gone; it becomes 'aborted' once S3 confirms. Sessions left in
+    'aborting' by a failed run are retried on the next one.
+    '''
+    report = {'stale_uploads': 0, 'aborted_uploads': 0, 'failed_uploads': []}
+    stale_age_seconds = GC_STALE_UPLOAD_AGE.total_seconds()
+    
+    with conn.cursor() as cur:
+        if dry_run:
+            cur.execute(
+                """
+                SELECT COUNT(*) FROM upload_sessions
+                WHERE status = 'aborting'
+                   OR (status IN ('in_progress', 'completing') AND updated_at < NOW() - make_interval(secs => %s))
+                """,
+                (stale_age_seconds,)
+            )
+            report['stale_uploads'] = cur.fetchone()[0]
+            conn.rollback()
+            return report
+        
+        cur.execute(
+            """
+            UPDATE upload_sessions SET status = 'aborting', updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'aborting'
+               OR (status IN ('in_progress', 'completing') AND updated_at < NOW() - make_interval(secs => %s))
+            RETURNING id, file_key, s3_upload_id
+            """,
+            (stale_age_seconds,)
+        )
+        sessions = cur.fetchall()
+    conn.commit()
+    report['stale_uploads'] = len(sessions)
+    
+    for session_id, file_key, s3_upload_id in sessions:
+        try:
+            s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=file_key, UploadId=s3_upload_id)
+        except ClientError as e:
+            # NoSuchUpload: already aborted or completed - either way no parts are left
+            if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                print(f"[GC] Abort failed for upload {session_id}: {str(e)}")
+                report['failed_uploads'].append(str(session_id))
+                continue
+        
+        with conn.cursor() as cur:
+            cur.execute("UPDATE upload_sessions SET status = 'aborted' WHERE id = %s", (session_id,))
+        conn.commit()
+        report['aborted_uploads'] += 1
+    
+    print(f"[GC] uploads: stale {report['stale_uploads']}, aborted {report['aborted_uploads']}")
+    return report
@@ -1,8 +1,14 @@
 import json
 import os
+import hmac
 import urllib.request
 import urllib.parse
 from typing import Dict, Any
+import psycopg2
+
+# Тот же secret_token передаётся в setWebhook; Telegram присылает его в заголовке
+# X-Telegram-Bot-Api-Secret-Token, а поддельный POST на публичный URL его не знает
+WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -31,6 +37,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    verified = is_from_telegram(event.get('headers') or {})
+    if WEBHOOK_SECRET and not verified:
+        print('[WEBHOOK] Rejected update without a valid secret token')
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Forbidden'}),
+            'isBase64Encoded': False
+        }
+    
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
     admin_id = os.environ.get('ADMIN_TELEGRAM_ID')
     
@@ -64,6 +80,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         text = message.get('text', '')
         
+        # В личном чате chat_id совпадает с id пользователя: запоминаем его для напоминаний chat-notify.
+        # Только для проверенных обновлений, иначе любой POST с чужим username перенаправит напоминания
+        if verified and message['chat'].get('type', 'private') == 'private' and user.get('username'):
+            remember_chat_id(user['username'], chat_id)
+        
         forward_text = f"📩 Новое сообщение от бота\n\n"
         forward_text += f"👤 От: {full_name}\n"
         forward_text += f"🆔 Username: @{username}\n"
@@ -101,3 +122,32 @@ def send_message(token: str, chat_id: str, text: str) -> None:
     req = urllib.request.Request(url, data=data, method='POST')
     with urllib.request.urlopen(req) as response:
         response.read()
+
+def is_from_telegram(headers: Dict[str, str]) -> bool:
+    '''Без настроенного секрета обновление считается непроверенным'''
+    if not WEBHOOK_SECRET:
+        return False
+    received = headers.get('X-Telegram-Bot-Api-Secret-Token') or headers.get('x-telegram-bot-api-secret-token') or ''
+    return hmac.compare_digest(received.encode('utf-8'), WEBHOOK_SECRET.encode('utf-8'))
+
+def remember_chat_id(username: str, chat_id: int) -> None:
+    '''Ошибка записи не должна мешать пересылке сообщения администратору'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(database_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """UPDATE chat_access SET telegram_chat_id = %s
+                    WHERE LOWER(LTRIM(telegram_username, '@')) = %s
+                    AND telegram_chat_id IS DISTINCT FROM %s""",
+                    (chat_id, username.lstrip('@').lower(), chat_id)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+    except psycopg2.Error as e:
+        print(f'[WEBHOOK] Failed to store chat_id for @{username}: {e}')
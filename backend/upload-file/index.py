@@ -2,58 +2,445 @@ import json
 import base64
 import uuid
 import os
-from typing import Dict, Any, Optional
+import io
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Dict, Any, Optional, Iterable, List
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-import jwt
+from PIL import Image
 
-def verify_admin(headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-    if not auth_token:
+from auth_middleware import require_auth
+
+S3_ENDPOINT = 'https://storage.yandexcloud.net'
+S3_BUCKET = 'poehalidev-user-files'
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 16))
+
+# S3 requires every part except the last one to be at least 5 MB and allows at most 10000 parts
+UPLOAD_PART_SIZE = max(int(os.environ.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)
+UPLOAD_MAX_PARTS = 10000
+# Parts go from the browser straight to S3, so the presigned URLs must outlive a slow upload
+UPLOAD_PART_URL_TTL_SECONDS = int(os.environ.get('UPLOAD_PART_URL_TTL_SECONDS', 6 * 3600))
+THUMBNAIL_SIZE = (480, 480)
+PREVIEW_SECONDS = int(os.environ.get('PREVIEW_SECONDS', 60))
+# Configured timeout of this function; previews share it with the upload itself
+FUNCTION_TIMEOUT_SECONDS = int(os.environ.get('FUNCTION_TIMEOUT_SECONDS', 120))
+# Kept back from preview generation for storing the URLs and answering
+DERIVATIVES_RESERVE_SECONDS = 10
+# A preview step is not started with less time than this left
+DERIVATIVE_MIN_STEP_SECONDS = 3
+
+CHUNKED_UPLOAD_ACTIONS = ('init-upload', 'upload-status', 'complete-upload', 'abort-upload')
+
+_s3_client = None
+
+def get_s3_client():
+    '''
+    One S3 client per warm instance: botocore client construction and endpoint
+    resolution are expensive, and the client keeps its HTTPS connection pool
+    alive between invocations. Clients are thread-safe, so parallel part
+    uploads share it as well.
+    '''
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    
+    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    
+    if not aws_access_key or not aws_secret_key:
         return None
     
-    # Allow admin_session_token for admin panel access
-    if auth_token == 'admin_session_token':
-        return {'is_admin': True, 'id': 0, 'email': 'admin@session'}
+    _s3_client = boto3.client(
+        's3',
+        endpoint_url=S3_ENDPOINT,
+        aws_access_key_id=aws_access_key,
+        aws_secret_access_key=aws_secret_key,
+        region_name='ru-central1',
+        config=Config(
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={'max_attempts': 3, 'mode': 'standard'}
+        )
+    )
+    return _s3_client
+
+def s3_public_url(key: str) -> str:
+    return f'{S3_ENDPOINT}/{S3_BUCKET}/{key}'
+
+def s3_put_object(key: str, body: bytes, content_type: str) -> str:
+    get_s3_client().put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType=content_type)
+    return s3_public_url(key)
+
+def s3_get_object(key: str) -> bytes:
+    return get_s3_client().get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+
+def s3_delete_object(key: str) -> None:
+    get_s3_client().delete_object(Bucket=S3_BUCKET, Key=key)
+
+def s3_presign_url(key: str, expires_in: int = 3600, operation: str = 'get_object') -> str:
+    return get_s3_client().generate_presigned_url(
+        operation,
+        Params={'Bucket': S3_BUCKET, 'Key': key},
+        ExpiresIn=expires_in
+    )
+
+def make_image_thumbnail(data: bytes) -> bytes:
+    image = Image.open(io.BytesIO(data))
+    # JPEG decoder can downscale while decoding, so big photos are never fully expanded
+    image.draft('RGB', THUMBNAIL_SIZE)
+    image = image.convert('RGB')
+    image.thumbnail(THUMBNAIL_SIZE)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=80, optimize=True)
+    return output.getvalue()
+
+def request_deadline(context: Any) -> float:
+    '''
+    Monotonic time by which preview generation has to stop so the whole
+    request still answers inside the function timeout. Counted from the start
+    of the request, so a slow upload leaves less time for previews.
+    '''
+    budget = FUNCTION_TIMEOUT_SECONDS
+    get_remaining_time = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(get_remaining_time):
+        budget = min(budget, get_remaining_time() / 1000)
+    return time.monotonic() + budget - DERIVATIVES_RESERVE_SECONDS
+
+def step_timeout(deadline: float) -> float:
+    '''Seconds the next preview step may take; TimeoutError when too little is left to start it'''
+    remaining = deadline - time.monotonic()
+    if remaining < DERIVATIVE_MIN_STEP_SECONDS:
+        raise TimeoutError('preview deadline reached')
+    return remaining
+
+def generate_derivatives(file_key: str, file_type: str, deadline: float, file_data: Optional[bytes] = None) -> Dict[str, Optional[str]]:
+    '''
+    Build lightweight previews at upload time and store them next to the original
+    under <folder>/_derived/. Images get a JPEG thumbnail; PDFs a first-page PNG
+    (pdftoppm) and videos a poster frame plus a low-bitrate clip (ffmpeg) when
+    those tools are installed. Without file_data the source is read from S3 -
+    ffmpeg streams it from a presigned URL, so big videos never land in memory.
+    All steps share one deadline; the video clip comes last, so a tight one
+    still leaves the poster. Failures are logged and never break the upload.
+    '''
+    derived_prefix = file_key.rsplit('/', 1)[0] + '/_derived/'
+    result: Dict[str, Optional[str]] = {'thumbnail_url': None, 'preview_url': None}
     
     try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return None
-        
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-        
-        if not payload.get('is_admin'):
-            return None
-        
-        return payload
-    except:
+        if file_type.startswith('image/'):
+            data = file_data if file_data is not None else s3_get_object(file_key)
+            result['thumbnail_url'] = s3_put_object(derived_prefix + 'thumbnail.jpg', make_image_thumbnail(data), 'image/jpeg')
+        
+        elif file_type == 'application/pdf' and shutil.which('pdftoppm'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                source_path = os.path.join(tmp_dir, 'source.pdf')
+                if file_data is not None:
+                    with open(source_path, 'wb') as f:
+                        f.write(file_data)
+                else:
+                    step_timeout(deadline)
+                    get_s3_client().download_file(S3_BUCKET, file_key, source_path)
+                
+                subprocess.run(
+                    ['pdftoppm', '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', '960',
+                     source_path, os.path.join(tmp_dir, 'page')],
+                    check=True, capture_output=True, timeout=step_timeout(deadline)
+                )
+                with open(os.path.join(tmp_dir, 'page.png'), 'rb') as f:
+                    result['thumbnail_url'] = s3_put_object(derived_prefix + 'page-1.png', f.read(), 'image/png')
+        
+        elif file_type.startswith('video/') and shutil.which('ffmpeg'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                if file_data is not None:
+                    source = os.path.join(tmp_dir, 'source')
+                    with open(source, 'wb') as f:
+                        f.write(file_data)
+                else:
+                    source = s3_presign_url(file_key, expires_in=FUNCTION_TIMEOUT_SECONDS)
+                
+                poster_path = os.path.join(tmp_dir, 'poster.jpg')
+                subprocess.run(
+                    ['ffmpeg', '-y', '-loglevel', 'error', '-ss', '1', '-i', source,
+                     '-frames:v', '1', '-vf', 'scale=480:-2', poster_path],
+                    check=True, capture_output=True, timeout=step_timeout(deadline)
+                )
+                with open(poster_path, 'rb') as f:
+                    result['thumbnail_url'] = s3_put_object(derived_prefix + 'poster.jpg', f.read(), 'image/jpeg')
+                
+                preview_path = os.path.join(tmp_dir, 'preview.mp4')
+                subprocess.run(
+                    ['ffmpeg', '-y', '-loglevel', 'error', '-i', source, '-t', str(PREVIEW_SECONDS),
+                     '-vf', 'scale=480:-2', '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '300k',
+                     '-c:a', 'aac', '-b:a', '64k', '-movflags', '+faststart', preview_path],
+                    check=True, capture_output=True, timeout=step_timeout(deadline)
+                )
+                with open(preview_path, 'rb') as f:
+                    result['preview_url'] = s3_put_object(derived_prefix + 'preview.mp4', f.read(), 'video/mp4')
+    except Exception as e:
+        print(f"Preview generation failed for {file_key}: {str(e)}")
+    
+    return result
+
+def attach_derivatives(conn, course_file_id: int, file_key: str, file_type: str, deadline: float, file_data: Optional[bytes] = None) -> Dict[str, Optional[str]]:
+    '''
+    Generate previews for a course_files row that is already committed and
+    store their URLs on it. Runs last, so a timeout inside ffmpeg/pdftoppm
+    leaves a complete file without previews rather than an orphaned object.
+    '''
+    derivatives = generate_derivatives(file_key, file_type, deadline, file_data)
+    if derivatives['thumbnail_url'] or derivatives['preview_url']:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE course_files SET thumbnail_url = %s, preview_url = %s WHERE id = %s",
+                (derivatives['thumbnail_url'], derivatives['preview_url'], course_file_id)
+            )
+        conn.commit()
+    return derivatives
+
+def json_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body)
+    }
+
+def parse_positive_int(value: Any) -> Optional[int]:
+    '''Positive integer from a JSON field; None for missing, non-numeric or non-positive values'''
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
         return None
+    return number if number > 0 else None
 
-def verify_user(headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    '''Verify any authenticated user (not just admin)'''
-    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-    if not auth_token:
+def parse_upload_id(value: Any) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
         return None
+
+def presign_part_urls(s3_client, session: Dict[str, Any], part_numbers: Iterable[int]) -> List[Dict[str, Any]]:
+    '''Presigned upload_part URLs: the browser PUTs raw part bytes straight to S3'''
+    return [
+        {
+            'partNumber': part_number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': S3_BUCKET,
+                    'Key': session['file_key'],
+                    'UploadId': session['s3_upload_id'],
+                    'PartNumber': part_number
+                },
+                ExpiresIn=UPLOAD_PART_URL_TTL_SECONDS
+            )
+        }
+        for part_number in part_numbers
+    ]
+
+def list_uploaded_parts(s3_client, session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    '''Parts S3 already holds for the session; their ETags are what complete-upload needs'''
+    parts = []
+    paginator = s3_client.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Key=session['file_key'], UploadId=session['s3_upload_id']):
+        parts.extend(page.get('Parts', []))
+    return parts
+
+def handle_chunked_upload(action: str, body_data: Dict[str, Any], database_url: str, deadline: float) -> Dict[str, Any]:
+    '''
+    Resumable upload of large files (lesson videos) through S3 multipart upload.
+    Flow: init-upload returns a presigned URL per part, the browser PUTs the parts
+    to S3 directly (in parallel, in any order), then complete-upload. Part bytes
+    never pass through the function, so its request size limit does not apply.
+    upload-status lists stored parts and fresh URLs for the missing ones so an
+    interrupted upload can be resumed; abort-upload discards it.
+    '''
+    upload_id = None
+    if action != 'init-upload':
+        upload_id = parse_upload_id(body_data.get('uploadId'))
+        if not upload_id:
+            return json_response(400, {'error': 'A valid uploadId is required'})
     
-    # Allow admin_session_token for admin panel access
-    if auth_token == 'admin_session_token':
-        return {'is_admin': True, 'id': 0, 'email': 'admin@session'}
+    s3_client = get_s3_client()
+    if not s3_client:
+        return json_response(500, {'error': 'S3 credentials not configured'})
     
+    conn = psycopg2.connect(database_url)
     try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return None
-        
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-        return payload
-    except:
-        return None
+        if action == 'init-upload':
+            return init_chunked_upload(conn, s3_client, body_data)
+        
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM upload_sessions WHERE id = %s", (upload_id,))
+            session = cur.fetchone()
+        
+        if not session:
+            return json_response(404, {'error': 'Upload session not found'})
+        
+        if action == 'upload-status':
+            return get_chunked_upload_status(conn, s3_client, session)
+        if session['status'] != 'in_progress':
+            return json_response(409, {'error': f"Upload session is {session['status']}"})
+        if action == 'complete-upload':
+            return complete_chunked_upload(conn, s3_client, session, deadline)
+        return abort_chunked_upload(conn, s3_client, session)
+    except ClientError as e:
+        print(f"S3 multipart error: {str(e)}")
+        return json_response(500, {'error': f'S3 upload failed: {str(e)}'})
+    finally:
+        conn.close()
+
+def init_chunked_upload(conn, s3_client, body_data: Dict[str, Any]) -> Dict[str, Any]:
+    file_name = body_data.get('fileName')
+    file_size = parse_positive_int(body_data.get('fileSize'))
+    file_type = body_data.get('fileType', 'application/octet-stream')
+    
+    if not file_name or not isinstance(file_name, str) or not file_size:
+        return json_response(400, {'error': 'fileName and fileSize are required'})
+    
+    total_parts = (file_size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE
+    if total_parts > UPLOAD_MAX_PARTS:
+        return json_response(400, {'error': f'File is too large: at most {UPLOAD_MAX_PARTS * UPLOAD_PART_SIZE} bytes'})
+    
+    upload_id = str(uuid.uuid4())
+    file_key = f'course-files/{upload_id}/{file_name}'
+    
+    multipart = s3_client.create_multipart_upload(Bucket=S3_BUCKET, Key=file_key, ContentType=file_type)
+    
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO upload_sessions (id, s3_upload_id, file_key, file_name, file_type, file_size, part_size, total_parts,
+                                         title, description, lesson_id, module_id, is_welcome_video)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (upload_id, multipart['UploadId'], file_key, file_name, file_type, file_size, UPLOAD_PART_SIZE, total_parts,
+             body_data.get('title', file_name), body_data.get('description', ''), body_data.get('lessonId'),
+             body_data.get('moduleId'), body_data.get('isWelcomeVideo', False))
+        )
+    conn.commit()
+    
+    print(f"Started multipart upload {upload_id} - Key: {file_key}, parts: {total_parts}")
+    
+    session = {'file_key': file_key, 's3_upload_id': multipart['UploadId']}
+    return json_response(200, {
+        'uploadId': upload_id,
+        'partSize': UPLOAD_PART_SIZE,
+        'totalParts': total_parts,
+        'partUrls': presign_part_urls(s3_client, session, range(1, total_parts + 1))
+    })
+
+def get_chunked_upload_status(conn, s3_client, session: Dict[str, Any]) -> Dict[str, Any]:
+    uploaded_parts = []
+    part_urls = []
+    if session['status'] == 'in_progress':
+        uploaded_parts = sorted(p['PartNumber'] for p in list_uploaded_parts(s3_client, session))
+        stored = set(uploaded_parts)
+        missing_parts = [n for n in range(1, session['total_parts'] + 1) if n not in stored]
+        part_urls = presign_part_urls(s3_client, session, missing_parts)
+        # A resumed upload is alive: storage-gc only aborts sessions nobody touched for days
+        with conn.cursor() as cur:
+            cur.execute("UPDATE upload_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = %s", (session['id'],))
+        conn.commit()
+    
+    return json_response(200, {
+        'uploadId': str(session['id']),
+        'status': session['status'],
+        'partSize': session['part_size'],
+        'totalParts': session['total_parts'],
+        'uploadedParts': uploaded_parts,
+        'partUrls': part_urls,
+        'fileId': session['course_file_id']
+    })
+
+def complete_chunked_upload(conn, s3_client, session: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+    parts = sorted(list_uploaded_parts(s3_client, session), key=lambda p: p['PartNumber'])
+    
+    uploaded = {p['PartNumber'] for p in parts}
+    missing_parts = [n for n in range(1, session['total_parts'] + 1) if n not in uploaded]
+    if missing_parts:
+        return json_response(409, {'error': 'Upload is incomplete', 'missingParts': missing_parts})
+    
+    uploaded_size = sum(p['Size'] for p in parts)
+    if uploaded_size != session['file_size']:
+        return json_response(409, {'error': f"Uploaded {uploaded_size} bytes, expected {session['file_size']}"})
+    
+    # Claim the session so concurrent complete requests do not finish it twice
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE upload_sessions SET status = 'completing', updated_at = CURRENT_TIMESTAMP WHERE id = %s AND status = 'in_progress'",
+            (session['id'],)
+        )
+        claimed = cur.rowcount
+    conn.commit()
+    
+    if not claimed:
+        return json_response(409, {'error': 'Upload is already being completed'})
+    
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=session['file_key'],
+            UploadId=session['s3_upload_id'],
+            MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in parts]}
+        )
+    except ClientError:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE upload_sessions SET status = 'in_progress' WHERE id = %s", (session['id'],))
+        conn.commit()
+        raise
+    
+    file_url = s3_public_url(session['file_key'])
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            "INSERT INTO course_files (title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, uploaded_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id, title, file_url, uploaded_at",
+            (session['title'], session['description'], session['file_name'], file_url, session['file_type'],
+             session['file_size'], session['lesson_id'], session['module_id'], session['is_welcome_video'],
+             datetime.utcnow())
+        )
+        result = cur.fetchone()
+        cur.execute(
+            "UPDATE upload_sessions SET status = 'completed', course_file_id = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (result['id'], session['id'])
+        )
+    conn.commit()
+    
+    print(f"Completed multipart upload {session['id']} - {session['total_parts']} parts, {session['file_size']} bytes")
+    
+    derivatives = attach_derivatives(conn, result['id'], session['file_key'], session['file_type'], deadline)
+    
+    return json_response(200, {
+        'id': result['id'],
+        'title': result['title'],
+        'url': result['file_url'],
+        'thumbnailUrl': derivatives['thumbnail_url'],
+        'previewUrl': derivatives['preview_url'],
+        'uploadedAt': result['uploaded_at'].isoformat()
+    })
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def abort_chunked_upload(conn, s3_client, session: Dict[str, Any]) -> Dict[str, Any]:
+    s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=session['file_key'], UploadId=session['s3_upload_id'])
+    
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE upload_sessions SET status = 'aborted', updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (session['id'],)
+        )
+    conn.commit()
+    
+    return json_response(200, {'success': True})
+
+@require_auth(admin_methods=('POST', 'PUT', 'PATCH', 'DELETE'))
+def handler(event: Dict[str, Any], context: Any, user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     '''
     Business: Upload files (PDF, videos, documents) to S3 storage and save metadata to database
     Args: event with httpMethod, body, headers; context with request_id
@@ -73,26 +460,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    headers = event.get('headers', {})
-    
-    # For GET requests, allow any authenticated user
-    if method == 'GET':
-        user = verify_user(headers)
-        if not user:
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Unauthorized'})
-            }
-    else:
-        # For POST/DELETE, require admin
-        admin_user = verify_admin(headers)
-        if not admin_user:
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Unauthorized - Admin access required'})
-            }
+    deadline = request_deadline(context)
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
@@ -107,6 +475,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         print(f"Received POST request with body keys: {list(body_data.keys())}")
         
+        action = body_data.get('action')
+        if action in CHUNKED_UPLOAD_ACTIONS:
+            return handle_chunked_upload(action, body_data, database_url, deadline)
+        
         file_name = body_data.get('fileName')
         file_content = body_data.get('fileContent')
         external_url = body_data.get('externalUrl')
@@ -151,42 +523,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'fileName and fileContent or externalUrl are required'})
             }
         
-        file_data = base64.b64decode(file_content)
+        try:
+            file_data = base64.b64decode(file_content, validate=True)
+        except (ValueError, TypeError):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'fileContent must be base64'})
+            }
         
         # Upload to S3
-        aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-        aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+        s3_client = get_s3_client()
         
-        print(f"AWS credentials check - Key exists: {bool(aws_access_key)}, Secret exists: {bool(aws_secret_key)}")
-        if aws_access_key:
-            print(f"AWS Key prefix: {aws_access_key[:10]}...")
+        print(f"AWS credentials check - Client configured: {bool(s3_client)}")
         
-        if not aws_access_key or not aws_secret_key:
+        if not s3_client:
             return {
                 'statusCode': 500,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'S3 credentials not configured'})
             }
         
-        s3_client = boto3.client(
-            's3',
-            endpoint_url='https://storage.yandexcloud.net',
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name='ru-central1'
-        )
-        
-        bucket_name = 'poehalidev-user-files'
         file_key = f'course-files/{uuid.uuid4()}/{file_name}'
         
         try:
-            print(f"Uploading to S3 - Bucket: {bucket_name}, Key: {file_key}")
-            s3_client.put_object(
-                Bucket=bucket_name,
-                Key=file_key,
-                Body=file_data,
-                ContentType=file_type
-            )
+            print(f"Uploading to S3 - Bucket: {S3_BUCKET}, Key: {file_key}")
+            file_url = s3_put_object(file_key, file_data, file_type)
             print(f"Successfully uploaded to S3")
         except ClientError as e:
             print(f"S3 upload error: {str(e)}")
@@ -196,8 +558,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': f'S3 upload failed: {str(e)}'})
             }
         
-        file_url = f'https://storage.yandexcloud.net/{bucket_name}/{file_key}'
-        
         conn = psycopg2.connect(database_url)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
@@ -209,7 +569,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         result = cur.fetchone()
         conn.commit()
         cur.close()
-        conn.close()
+        
+        try:
+            derivatives = attach_derivatives(conn, result['id'], file_key, file_type, deadline, file_data)
+        finally:
+            conn.close()
         
         return {
             'statusCode': 200,
@@ -218,6 +582,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'id': result['id'],
                 'title': result['title'],
                 'url': result['file_url'],
+                'thumbnailUrl': derivatives['thumbnail_url'],
+                'previewUrl': derivatives['preview_url'],
                 'uploadedAt': result['uploaded_at'].isoformat()
             })
         }
@@ -258,17 +624,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if lesson_id:
             cur.execute(
-                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, uploaded_at FROM course_files WHERE lesson_id = %s ORDER BY uploaded_at DESC",
+                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, thumbnail_url, preview_url, uploaded_at FROM course_files WHERE lesson_id = %s ORDER BY uploaded_at DESC",
                 (lesson_id,)
             )
         elif module_id:
             cur.execute(
-                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, uploaded_at FROM course_files WHERE module_id = %s ORDER BY uploaded_at DESC",
+                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, thumbnail_url, preview_url, uploaded_at FROM course_files WHERE module_id = %s ORDER BY uploaded_at DESC",
                 (module_id,)
             )
         else:
             cur.execute(
-                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, uploaded_at FROM course_files ORDER BY uploaded_at DESC"
+                "SELECT id, title, description, file_name, file_url, file_type, file_size, lesson_id, module_id, is_welcome_video, thumbnail_url, preview_url, uploaded_at FROM course_files ORDER BY uploaded_at DESC"
             )
         
         files = cur.fetchall()
@@ -285,6 +651,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'fileUrl': f['file_url'],
                 'fileType': f['file_type'],
                 'fileSize': f['file_size'],
+                'thumbnailUrl': f.get('thumbnail_url'),
+                'previewUrl': f.get('preview_url'),
                 'lessonId': f.get('lesson_id'),
                 'moduleId': f.get('module_id'),
                 'isWelcomeVideo': f.get('is_welcome_video', False),
@@ -311,7 +679,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = psycopg2.connect(database_url)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute("DELETE FROM course_files WHERE id = %s RETURNING id", (file_id,))
+        cur.execute("DELETE FROM course_files WHERE id = %s RETURNING id, file_url, thumbnail_url, preview_url", (file_id,))
         result = cur.fetchone()
         
         conn.commit()
@@ -325,6 +693,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'File not found'})
             }
         
+        # External video links are not ours to delete; anything left behind is picked up by storage-gc
+        storage_prefix = s3_public_url('course-files/')
+        stored_urls = [result['file_url'], result['thumbnail_url'], result['preview_url']]
+        for url in stored_urls:
+            if not url or not url.startswith(storage_prefix) or not get_s3_client():
+                continue
+            file_key = url[len(s3_public_url('')):]
+            try:
+                s3_delete_object(file_key)
+            except ClientError as e:
+                print(f"S3 delete error for {file_key}: {str(e)}")
+        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
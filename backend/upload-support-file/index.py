@@ -2,15 +2,144 @@ import json
 import base64
 import uuid
 import os
-from typing import Dict, Any
+import io
+import re
+from typing import Dict, Any, Iterator, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+S3_ENDPOINT = 'https://storage.yandexcloud.net'
+S3_BUCKET = 'poehalidev-user-files'
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 16))
+
+_s3_client = None
+
+def get_s3_client():
+    '''Lazily create one S3 client per warm instance and reuse its keep-alive HTTPS pool'''
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    
+    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    
+    if not aws_access_key or not aws_secret_key:
+        return None
+    
+    _s3_client = boto3.client(
+        's3',
+        endpoint_url=S3_ENDPOINT,
+        aws_access_key_id=aws_access_key,
+        aws_secret_access_key=aws_secret_key,
+        region_name='ru-central1',
+        config=Config(
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={'max_attempts': 3, 'mode': 'standard'}
+        )
+    )
+    return _s3_client
+
+def s3_public_url(key: str) -> str:
+    return f'{S3_ENDPOINT}/{S3_BUCKET}/{key}'
+
+def s3_put_object(key: str, body: Any, content_type: str) -> str:
+    get_s3_client().put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType=content_type)
+    return s3_public_url(key)
+
+_DISPOSITION_PARAM = re.compile(r';\s*([\w*-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;\s]*))')
+
+class MemoryViewReader(io.RawIOBase):
+    '''Seekable file-like view over a slice of the request body, so boto3 can stream it without a copy'''
+    
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = min(max(offset, 0), len(self._view))
+        return self._pos
+    
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+def parse_part_headers(raw: bytes) -> Dict[str, Any]:
+    headers: Dict[str, Any] = {}
+    for line in raw.split(b'\r\n'):
+        name, sep, value = line.partition(b':')
+        if sep:
+            headers[name.strip().decode('latin-1').lower()] = value.strip().decode('utf-8', errors='ignore')
+    
+    disposition = headers.get('content-disposition', '')
+    params = {}
+    for match in _DISPOSITION_PARAM.finditer(disposition):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        params[match.group(1).lower()] = re.sub(r'\\(.)', r'\1', value)
+    headers['params'] = params
+    return headers
+
+def iter_multipart_parts(body: bytes, boundary: bytes) -> Iterator[Tuple[Dict[str, Any], memoryview]]:
+    '''
+    Single forward pass over a multipart body. Each boundary search starts where
+    the previous one ended, so parsing is linear in the body size, and payloads
+    are memoryview slices of the original buffer instead of copies.
+    Raises ValueError on a truncated or malformed body.
+    '''
+    view = memoryview(body)
+    delimiter = b'--' + boundary
+    
+    pos = body.find(delimiter)
+    if pos == -1:
+        raise ValueError('Multipart boundary not found')
+    
+    while True:
+        pos += len(delimiter)
+        if body[pos:pos + 2] == b'--':
+            return
+        
+        # Skip transport padding after the delimiter
+        line_end = body.find(b'\r\n', pos)
+        if line_end == -1:
+            raise ValueError('Truncated multipart body')
+        
+        headers_end = body.find(b'\r\n\r\n', line_end)
+        if headers_end == -1:
+            raise ValueError('Truncated multipart part headers')
+        if headers_end == line_end:
+            headers = parse_part_headers(b'')
+        else:
+            headers = parse_part_headers(body[line_end + 2:headers_end])
+        
+        payload_start = headers_end + 4
+        next_delimiter = body.find(b'\r\n' + delimiter, headers_end + 2)
+        if next_delimiter == -1:
+            raise ValueError('Missing closing multipart boundary')
+        
+        yield headers, view[payload_start:max(next_delimiter, payload_start)]
+        pos = next_delimiter + 2
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Upload images and files from support chat to S3 storage
     Args: event with httpMethod, body (multipart/form-data), context
-    Returns: HTTP response with file URL
+    Returns: HTTP response with URL of the first file and the list of all uploaded files
     '''
     method: str = event.get('httpMethod', 'GET')
     
@@ -60,66 +189,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    parts = body.split(b'--' + boundary)
-    
-    file_data = None
-    file_name = 'file'
-    content_type_file = 'application/octet-stream'
-    
-    for part in parts:
-        if b'Content-Disposition' in part and b'filename=' in part:
-            headers_body = part.split(b'\r\n\r\n', 1)
-            if len(headers_body) == 2:
-                headers_section = headers_body[0]
-                file_content = headers_body[1].rstrip(b'\r\n')
-                
-                for line in headers_section.split(b'\r\n'):
-                    if b'filename=' in line:
-                        filename_part = line.split(b'filename=')[1]
-                        file_name = filename_part.strip(b'"').decode('utf-8', errors='ignore')
-                    if line.startswith(b'Content-Type:'):
-                        content_type_file = line.split(b'Content-Type:')[1].strip().decode('utf-8', errors='ignore')
-                
-                file_data = file_content
-                break
-    
-    if not file_data:
+    if not get_s3_client():
         return {
-            'statusCode': 400,
+            'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'No file found in request'}),
+            'body': json.dumps({'error': 'S3 credentials not configured'}),
             'isBase64Encoded': False
         }
     
-    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    uploaded_files = []
     
-    if not aws_access_key or not aws_secret_key:
+    try:
+        # Each file part is streamed to S3 as soon as it is parsed
+        for part_headers, payload in iter_multipart_parts(body, boundary):
+            file_name = part_headers['params'].get('filename')
+            if file_name is None or not len(payload):
+                continue
+            
+            file_name = file_name.rsplit('/', 1)[-1].rsplit('\\', 1)[-1] or 'file'
+            content_type_file = part_headers.get('content-type') or 'application/octet-stream'
+            file_key = f'support-files/{uuid.uuid4()}/{file_name}'
+            
+            file_url = s3_put_object(file_key, MemoryViewReader(payload), content_type_file)
+            uploaded_files.append({
+                'url': file_url,
+                'name': file_name,
+                'contentType': content_type_file,
+                'size': len(payload)
+            })
+    except ValueError as e:
         return {
-            'statusCode': 500,
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'S3 credentials not configured'}),
+            'body': json.dumps({'error': f'Malformed multipart body: {str(e)}'}),
             'isBase64Encoded': False
         }
-    
-    s3_client = boto3.client(
-        's3',
-        endpoint_url='https://storage.yandexcloud.net',
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
-        region_name='ru-central1'
-    )
-    
-    bucket_name = 'poehalidev-user-files'
-    file_key = f'support-files/{uuid.uuid4()}/{file_name}'
-    
-    try:
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_key,
-            Body=file_data,
-            ContentType=content_type_file
-        )
     except ClientError as e:
         return {
             'statusCode': 500,
@@ -128,11 +232,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    file_url = f'https://storage.yandexcloud.net/{bucket_name}/{file_key}'
+    if not uploaded_files:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'No file found in request'}),
+            'isBase64Encoded': False
+        }
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'url': file_url}),
+        'body': json.dumps({'url': uploaded_files[0]['url'], 'files': uploaded_files}),
         'isBase64Encoded': False
     }
@@ -6,25 +6,17 @@ Returns: Настройки пользователя, обновление на
 
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import jwt
+
+from auth_middleware import require_auth
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
-def get_user_from_token(token: str) -> Dict[str, Any] | None:
-    try:
-        jwt_secret = os.environ.get('JWT_SECRET')
-        if not jwt_secret:
-            return None
-        payload = jwt.decode(token, jwt_secret, algorithms=['HS256'])
-        return payload
-    except:
-        return None
-
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@require_auth
+def handler(event: Dict[str, Any], context: Any, user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -45,25 +37,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'Access-Control-Allow-Origin': '*'
     }
     
-    auth_token = event.get('headers', {}).get('x-auth-token') or event.get('headers', {}).get('X-Auth-Token')
-    
-    if not auth_token:
-        return {
-            'statusCode': 401,
-            'headers': headers_out,
-            'body': json.dumps({'error': 'Unauthorized'}),
-            'isBase64Encoded': False
-        }
-    
-    user = get_user_from_token(auth_token)
-    if not user:
-        return {
-            'statusCode': 401,
-            'headers': headers_out,
-            'body': json.dumps({'error': 'Invalid token'}),
-            'isBase64Encoded': False
-        }
-    
     try:
         params = event.get('queryStringParameters') or {}
         action = params.get('action', 'get_settings')
@@ -0,0 +1,32 @@
+-- Resumable chunked uploads of large course files (S3 multipart upload)
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id UUID PRIMARY KEY,
+    s3_upload_id TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    file_name VARCHAR(500) NOT NULL,
+    file_type VARCHAR(100) NOT NULL,
+    file_size BIGINT NOT NULL,
+    part_size INTEGER NOT NULL,
+    total_parts INTEGER NOT NULL,
+    title VARCHAR(500),
+    description TEXT,
+    lesson_id INTEGER REFERENCES lessons(id),
+    module_id INTEGER REFERENCES course_modules(id),
+    is_welcome_video BOOLEAN DEFAULT FALSE,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    course_file_id INTEGER REFERENCES course_files(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One row per uploaded part; re-sent parts overwrite their ETag
+CREATE TABLE IF NOT EXISTS upload_session_parts (
+    upload_id UUID NOT NULL REFERENCES upload_sessions(id),
+    part_number INTEGER NOT NULL,
+    etag VARCHAR(255) NOT NULL,
+    size INTEGER NOT NULL,
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (upload_id, part_number)
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_status ON upload_sessions(status, updated_at);
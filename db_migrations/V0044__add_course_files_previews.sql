@@ -0,0 +1,3 @@
+-- Thumbnails and low-bitrate previews generated at upload time
+ALTER TABLE course_files ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+ALTER TABLE course_files ADD COLUMN IF NOT EXISTS preview_url TEXT;
@@ -0,0 +1,3 @@
+-- Partial index for the pool allocator: claiming free tokens and counting
+-- them against the low-water mark only touches unused rows
+CREATE INDEX IF NOT EXISTS idx_chat_tokens_pool_unused ON chat_tokens_pool(id) WHERE is_used = false;
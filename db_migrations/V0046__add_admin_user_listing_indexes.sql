@@ -0,0 +1,10 @@
+-- Keyset pagination of the admin user list (newest first)
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
+
+-- Case-insensitive email prefix search
+CREATE INDEX IF NOT EXISTS idx_users_email_lower_pattern ON users(lower(email) text_pattern_ops);
+
+-- Course expiry per user: MAX(expires_at) becomes a single index probe
+CREATE INDEX IF NOT EXISTS idx_user_purchases_course_expiry
+ON user_purchases(user_id, expires_at DESC)
+WHERE payment_status = 'completed' AND product_type IN ('course', 'combo');
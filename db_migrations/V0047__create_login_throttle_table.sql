@@ -0,0 +1,10 @@
+-- Shared failed-login counters for the auth throttle, one row per key per fixed window.
+-- Losing them on a crash only resets the limits, so the table skips the WAL.
+CREATE UNLOGGED TABLE IF NOT EXISTS login_throttle (
+    throttle_key VARCHAR(320) NOT NULL,
+    window_start BIGINT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (throttle_key, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_login_throttle_window_start ON login_throttle(window_start);
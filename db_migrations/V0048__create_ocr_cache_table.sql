@@ -0,0 +1,10 @@
+-- OCR results keyed by a hash of the uploaded file, so re-uploading the same scan skips Yandex Vision.
+-- Rows hold recognized personal documents, so they expire (ocr-document deletes expired rows on write).
+CREATE TABLE IF NOT EXISTS ocr_cache (
+    cache_key VARCHAR(100) PRIMARY KEY,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ocr_cache_expires_at ON ocr_cache(expires_at);
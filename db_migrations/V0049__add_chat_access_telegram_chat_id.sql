@@ -0,0 +1,7 @@
+-- Telegram chat_id for expiry reminders, recorded by telegram-webhook when the client messages the bot.
+-- chat-notify used to resolve it with getUpdates per client, which misses updates that rolled off the buffer.
+ALTER TABLE chat_access ADD COLUMN IF NOT EXISTS telegram_chat_id BIGINT;
+
+-- The webhook matches clients by username regardless of case and a leading @
+CREATE INDEX IF NOT EXISTS idx_chat_access_telegram_username_normalized
+ON chat_access (LOWER(LTRIM(telegram_username, '@')));
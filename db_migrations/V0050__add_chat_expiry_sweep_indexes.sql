@@ -0,0 +1,5 @@
+-- Partial indexes for chat-expire-check: they hold only rows that are still active, so finding
+-- expired ones stays cheap however many deactivated tokens pile up.
+CREATE INDEX IF NOT EXISTS idx_chat_tokens_active_expires_at ON chat_tokens(expires_at) WHERE is_active = true;
+
+CREATE INDEX IF NOT EXISTS idx_chat_access_active_access_end ON chat_access(access_end) WHERE is_active = true;
@@ -0,0 +1,5 @@
+-- Admin user list pages by COALESCE(created_at, '-infinity'): rows without created_at
+-- sort last instead of breaking the keyset comparison with NULL
+DROP INDEX IF EXISTS idx_users_created_at_id;
+CREATE INDEX IF NOT EXISTS idx_users_listing_sort_key
+ON users((COALESCE(created_at, '-infinity'::timestamp)) DESC, id DESC);
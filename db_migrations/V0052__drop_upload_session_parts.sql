@@ -0,0 +1,3 @@
+-- Multipart parts are now PUT straight to S3 through presigned URLs; their ETags
+-- are read back with ListParts, so the per-part table is no longer written
+DROP TABLE IF EXISTS upload_session_parts;
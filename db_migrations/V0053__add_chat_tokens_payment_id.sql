@@ -0,0 +1,5 @@
+-- The payment a pool token was issued for. YooKassa redelivers payment.succeeded webhooks,
+-- and the unique index lets the payment webhook issue at most one token per payment.
+ALTER TABLE chat_tokens ADD COLUMN IF NOT EXISTS payment_id VARCHAR(255);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_tokens_payment_id ON chat_tokens(payment_id) WHERE payment_id IS NOT NULL;
@@ -14,6 +14,8 @@ import os
 import sys
 import psycopg2
 
+FETCH_SIZE = 10000
+
 def export_tokens():
     """
     Экспортирует все неиспользованные токены из базы данных в файл.
@@ -37,8 +39,11 @@ def export_tokens():
         print("Подключение успешно установлено")
         print("")
         
-        with conn.cursor() as cur:
-            # Выполняем SQL запрос для получения ВСЕХ токенов
+        # Серверный курсор: строки приходят порциями по FETCH_SIZE и сразу пишутся
+        # в файл, поэтому память не зависит от размера пула
+        with conn.cursor(name='export_tokens') as cur:
+            cur.itersize = FETCH_SIZE
+            
             print("Выполнение SQL запроса:")
             print("  SELECT token FROM chat_tokens_pool")
             print("  WHERE is_used = false")
@@ -52,23 +57,18 @@ def export_tokens():
                 ORDER BY created_at DESC
             """)
             
-            # Получаем ВСЕ строки (fetchall без ограничений)
-            print("Получение всех строк из базы данных...")
-            rows = cur.fetchall()
-            print(f"Получено строк: {len(rows)}")
-            print("")
-            
-            # Записываем токены в файл
             output_file = 'chat_tokens_1000.txt'
             print(f"Запись токенов в файл: {output_file}")
             
+            token_count = 0
             with open(output_file, 'w', encoding='utf-8') as f:
-                for row in rows:
+                for row in cur:
                     # Записываем только сам токен (row[0]) без кавычек
                     f.write(f"{row[0]}\n")
+                    token_count += 1
+                    if token_count % 100000 == 0:
+                        print(f"  записано {token_count}...")
             
-            # Возвращаем точное количество записанных токенов
-            token_count = len(rows)
             print(f"Успешно записано токенов: {token_count}")
             print("")
             print(f"Файл сохранен: {os.path.abspath(output_file)}")
@@ -15,46 +15,46 @@ if (!ADMIN_TOKEN) {
 
 async function exportTokens() {
   try {
-    console.log('Fetching all unused tokens from database...');
+    console.log('Fetching all unused tokens from database page by page...');
     console.log('');
 
-    const response = await fetch(`${ADMIN_URL}?resource=export-tokens`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-Auth-Token': ADMIN_TOKEN
-      }
-    });
+    const outputFile = 'chat_tokens_1000.txt';
+    fs.writeFileSync(outputFile, '', 'utf8');
 
-    console.log('Status:', response.status, response.statusText);
-    console.log('');
+    let cursor = null;
+    let total = 0;
 
-    if (!response.ok) {
-      const errorText = await response.text();
-      console.error('Error response:', errorText);
-      process.exit(1);
-    }
+    do {
+      const params = new URLSearchParams({ resource: 'export-tokens', format: 'txt', limit: '50000' });
+      if (cursor) params.set('cursor', cursor);
 
-    const data = await response.json();
-    
-    if (!data.success) {
-      console.error('Failed to export tokens:', data);
-      process.exit(1);
-    }
+      const response = await fetch(`${ADMIN_URL}?${params}`, {
+        method: 'GET',
+        headers: { 'X-Auth-Token': ADMIN_TOKEN }
+      });
 
-    console.log(`Successfully fetched ${data.count} tokens`);
-    console.log('');
+      if (!response.ok) {
+        const errorText = await response.text();
+        console.error('Error response:', response.status, errorText);
+        process.exit(1);
+      }
+
+      // Записываем каждую страницу сразу (один токен на строку)
+      const page = await response.text();
+      fs.appendFileSync(outputFile, page, 'utf8');
 
-    // Записываем токены в файл (один токен на строку)
-    const content = data.tokens.join('\n');
-    fs.writeFileSync('chat_tokens_1000.txt', content + '\n', 'utf8');
+      total += Number(response.headers.get('X-Token-Count') || 0);
+      cursor = response.headers.get('X-Next-Cursor');
+      console.log(`Fetched ${total} tokens so far`);
+    } while (cursor);
 
-    console.log(`Tokens saved to: chat_tokens_1000.txt`);
-    console.log(`Total tokens exported: ${data.count}`);
+    console.log('');
+    console.log(`Tokens saved to: ${outputFile}`);
+    console.log(`Total tokens exported: ${total}`);
     console.log('');
     console.log('Done!');
 
-    return data.count;
+    return total;
 
   } catch (error) {
     console.error('Error occurred:', error.message);
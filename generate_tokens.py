@@ -1,27 +1,77 @@
-import hashlib
+import io
+import os
+import sys
+import secrets
 import time
 from datetime import datetime, timedelta
 
-expires_date = (datetime.now() + timedelta(days=365)).isoformat()
-tokens = []
+CHUNK_SIZE = 100000
 
-for i in range(1000):
-    unique_string = f"{time.time()}{i}{hash(time.time())}"
-    token = f"CHAT_{hashlib.sha256(unique_string.encode()).hexdigest()[:32].upper()}"
-    tokens.append(f"('{token}', '{expires_date}')")
-    time.sleep(0.001)  # Чтобы time.time() менялось
 
-# Разбиваем на части по 100 токенов (чтобы не превысить лимит SQL)
-chunks = [tokens[i:i+100] for i in range(0, len(tokens), 100)]
+def generate_token_batch(count):
+    # Один вызов CSPRNG на всю пачку, hex-кодирование одним вызовом и нарезка по 32 символа
+    hex_blob = secrets.token_bytes(16 * count).hex().upper()
+    return ['CHAT_' + hex_blob[i:i + 32] for i in range(0, 32 * count, 32)]
 
-for idx, chunk in enumerate(chunks):
-    values = ',\n'.join(chunk)
-    sql = f"""-- Part {idx+1}/10
+
+def load_into_database(database_url, count, expires_date):
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE chat_tokens_pool_staging (token VARCHAR(100) NOT NULL) ON COMMIT DROP")
+
+            remaining = count
+            while remaining > 0:
+                batch_size = min(remaining, CHUNK_SIZE)
+                buffer = io.StringIO('\n'.join(generate_token_batch(batch_size)) + '\n')
+                cur.copy_expert("COPY chat_tokens_pool_staging (token) FROM STDIN", buffer)
+                remaining -= batch_size
+
+            cur.execute(
+                """
+                INSERT INTO chat_tokens_pool (token, expires_at)
+                SELECT DISTINCT token, %s FROM chat_tokens_pool_staging
+                ON CONFLICT (token) DO NOTHING
+                """,
+                (expires_date,)
+            )
+            inserted = cur.rowcount
+        conn.commit()
+        return inserted
+    finally:
+        conn.close()
+
+
+def write_sql_files(count, expires_date):
+    # Без DATABASE_URL пишем SQL-файлы по 100 токенов (лимит на размер запроса)
+    expires_iso = expires_date.isoformat()
+    tokens = generate_token_batch(count)
+    chunks = [tokens[i:i + 100] for i in range(0, len(tokens), 100)]
+
+    for idx, chunk in enumerate(chunks):
+        values = ',\n'.join(f"('{token}', '{expires_iso}')" for token in chunk)
+        sql = f"""-- Part {idx + 1}/{len(chunks)}
 INSERT INTO chat_tokens_pool (token, expires_at) VALUES
 {values}
 ON CONFLICT (token) DO NOTHING;
 """
-    with open(f'tokens_part_{idx+1}.sql', 'w') as f:
-        f.write(sql)
+        with open(f'tokens_part_{idx + 1}.sql', 'w') as f:
+            f.write(sql)
+
+    return len(chunks)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    expires_date = datetime.now() + timedelta(days=365)
+    database_url = os.environ.get('DATABASE_URL')
 
-print(f"Generated {len(tokens)} tokens in 10 SQL files")
+    started = time.perf_counter()
+    if database_url:
+        inserted = load_into_database(database_url, count, expires_date)
+        print(f"Inserted {inserted} of {count} tokens in {time.perf_counter() - started:.2f}s")
+    else:
+        files = write_sql_files(count, expires_date)
+        print(f"Generated {count} tokens in {files} SQL files in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Обновление офлайн-справочника кредиторов для функции company-search.
+
+Берёт список ИНН, официальных названий и вариантов написания банков, МФО и
+коллекторских агентств из backend/company-search/creditors_seed.json,
+запрашивает актуальные реквизиты (наименование, ОГРН, КПП, юридический адрес)
+в DaData findById/party и записывает backend/company-search/creditors.json,
+который функция загружает в память и ищет по нему до обращения к DaData.
+Без creditors.json функция отвечает по самому creditors_seed.json (название и ИНН
+без адреса).
+
+Использование:
+    export DADATA_API_KEY="..."
+    python3 refresh_creditors.py
+
+Чтобы добавить кредитора, допишите его ИНН и варианты названия в creditors_seed.json
+и запустите скрипт заново.
+"""
+
+import json
+import os
+import sys
+import urllib.request
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'company-search')
+SEED_PATH = os.path.join(FUNCTION_DIR, 'creditors_seed.json')
+DIRECTORY_PATH = os.path.join(FUNCTION_DIR, 'creditors.json')
+FIND_BY_ID_URL = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/findById/party'
+
+
+def find_party(inn, api_key):
+    """
+    Возвращает реквизиты головной организации по ИНН или None, если DaData её не нашла.
+    """
+    request = urllib.request.Request(
+        FIND_BY_ID_URL,
+        data=json.dumps({'query': inn, 'branch_type': 'MAIN', 'count': 1}).encode('utf-8'),
+        headers={
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': f'Token {api_key}'
+        },
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        suggestions = json.loads(response.read().decode('utf-8')).get('suggestions', [])
+    
+    if not suggestions:
+        return None
+    
+    item = suggestions[0]
+    data_obj = item.get('data', {})
+    name_obj = data_obj.get('name', {})
+    address_obj = data_obj.get('address') or {}
+    
+    # Те же поля, что company-search отдаёт для type=party
+    return {
+        'inn': data_obj.get('inn', ''),
+        'name': name_obj.get('short_with_opf') or name_obj.get('full') or item.get('value', ''),
+        'fullName': name_obj.get('full', ''),
+        'address': address_obj.get('unrestricted_value') or address_obj.get('value', ''),
+        'ogrn': data_obj.get('ogrn', ''),
+        'kpp': data_obj.get('kpp', ''),
+    }
+
+
+def refresh_directory():
+    api_key = os.environ.get('DADATA_API_KEY')
+    
+    if not api_key:
+        print("Ошибка: переменная окружения DADATA_API_KEY не установлена")
+        print("\nИспользование:")
+        print('  export DADATA_API_KEY="..."')
+        print("  python3 refresh_creditors.py")
+        sys.exit(1)
+    
+    with open(SEED_PATH, encoding='utf-8') as f:
+        seed = json.load(f)
+    
+    print(f"Кредиторов в списке: {len(seed)}")
+    
+    records = []
+    for entry in seed:
+        try:
+            record = find_party(entry['inn'], api_key)
+        except Exception as e:
+            print(f"  ИНН {entry['inn']}: ошибка запроса - {e}")
+            continue
+        
+        if not record:
+            print(f"  ИНН {entry['inn']}: не найден в DaData, пропущен")
+            continue
+        
+        record['type'] = entry.get('type', '')
+        record['aliases'] = entry.get('aliases', [])
+        # ИНН в списке набран вручную: если DaData вернула другую организацию, это видно сразу
+        if entry.get('name') and not any(
+            alias.lower() in (record['name'] + ' ' + record['fullName']).lower()
+            for alias in entry.get('aliases', [])
+        ):
+            print(f"  ИНН {entry['inn']}: внимание, DaData вернула «{record['name']}», а в списке «{entry['name']}»")
+        records.append(record)
+        print(f"  ИНН {entry['inn']}: {record['name']}")
+    
+    records.sort(key=lambda record: record['name'].lower())
+    
+    with open(DIRECTORY_PATH, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    
+    print("")
+    print(f"Записано кредиторов: {len(records)} из {len(seed)}")
+    print(f"Файл сохранен: {DIRECTORY_PATH}")
+    
+    return len(records)
+
+
+if __name__ == '__main__':
+    refresh_directory()
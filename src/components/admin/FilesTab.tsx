@@ -39,6 +39,8 @@ interface FilesTabProps {
   welcomeVideoTitle: string;
   welcomeVideoDescription: string;
   moduleFileUrl: string;
+  moduleFile: File | null;
+  uploadProgress: number | null;
   moduleFileTitle: string;
   moduleFileDescription: string;
   onSelectedModuleChange: (moduleId?: number) => void;
@@ -47,6 +49,7 @@ interface FilesTabProps {
   onWelcomeVideoTitleChange: (title: string) => void;
   onWelcomeVideoDescriptionChange: (description: string) => void;
   onModuleFileUrlChange: (url: string) => void;
+  onModuleFileChange: (file: File | null) => void;
   onModuleFileTitleChange: (title: string) => void;
   onModuleFileDescriptionChange: (description: string) => void;
   onSaveWelcomeVideo: (e: React.FormEvent) => void;
@@ -65,6 +68,8 @@ export default function FilesTab({
   welcomeVideoTitle,
   welcomeVideoDescription,
   moduleFileUrl,
+  moduleFile,
+  uploadProgress,
   moduleFileTitle,
   moduleFileDescription,
   onSelectedModuleChange,
@@ -73,6 +78,7 @@ export default function FilesTab({
   onWelcomeVideoTitleChange,
   onWelcomeVideoDescriptionChange,
   onModuleFileUrlChange,
+  onModuleFileChange,
   onModuleFileTitleChange,
   onModuleFileDescriptionChange,
   onSaveWelcomeVideo,
@@ -221,13 +227,30 @@ export default function FilesTab({
                 placeholder="https://example.com/file.pdf"
                 value={moduleFileUrl}
                 onChange={(e) => onModuleFileUrlChange(e.target.value)}
-                required
+                disabled={Boolean(moduleFile)}
+                required={!moduleFile}
               />
               <p className="text-xs text-muted-foreground">
                 Вставьте прямую ссылку на PDF или видео из облачного хранилища
               </p>
             </div>
 
+            <div className="space-y-2">
+              <Label htmlFor="module-file-upload">Или загрузите файл с компьютера</Label>
+              <Input
+                id="module-file-upload"
+                key={moduleFile ? moduleFile.name : 'empty'}
+                type="file"
+                accept="application/pdf,video/*"
+                onChange={(e) => onModuleFileChange(e.target.files?.[0] || null)}
+              />
+              <p className="text-xs text-muted-foreground">
+                {moduleFile
+                  ? `Выбран файл: ${moduleFile.name}`
+                  : 'Большие видео загружаются частями; прерванная загрузка продолжится с того же места'}
+              </p>
+            </div>
+
             <div className="space-y-2">
               <Label htmlFor="module-file-title">Название</Label>
               <Input
@@ -253,7 +276,9 @@ export default function FilesTab({
 
             <Button type="submit" className="w-full" disabled={uploading}>
               <Icon name="Save" size={16} className="mr-2" />
-              {uploading ? 'Сохранение...' : 'Добавить файл'}
+              {uploading
+                ? uploadProgress !== null ? `Загрузка... ${uploadProgress}%` : 'Сохранение...'
+                : 'Добавить файл'}
             </Button>
           </form>
         </CardContent>
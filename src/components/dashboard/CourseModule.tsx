@@ -21,6 +21,8 @@ interface CourseFile {
   file_url: string;
   file_type: string;
   file_size: number;
+  thumbnail_url?: string | null;
+  preview_url?: string | null;
   uploaded_at?: string;
   module_id?: number;
   lesson_id?: number;
@@ -277,7 +279,16 @@ export default function CourseModule({
                       <div className="grid gap-2">
                         {lesson.files.map((file: any) => (
                           <div key={file.id} className="flex items-center gap-3 p-3 bg-white dark:bg-slate-900 rounded-lg border">
-                            <Icon name="FileText" size={18} className="text-purple-600" />
+                            {file.thumbnail_url || file.thumbnailUrl ? (
+                              <img
+                                src={file.thumbnail_url || file.thumbnailUrl}
+                                alt={file.title}
+                                loading="lazy"
+                                className="w-16 h-12 object-cover rounded flex-shrink-0"
+                              />
+                            ) : (
+                              <Icon name="FileText" size={18} className="text-purple-600" />
+                            )}
                             <div className="flex-1 min-w-0">
                               <a
                                 href={file.file_url || file.fileUrl}
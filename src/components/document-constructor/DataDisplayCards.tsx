@@ -1,6 +1,7 @@
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
+import { Button } from "@/components/ui/button";
 import Icon from "@/components/ui/icon";
-import { PersonalData, CreditData, IncomeData, PropertyData, ChildrenData } from "./types";
+import { PersonalData, CreditData, CreditorSuggestion, IncomeData, PropertyData, ChildrenData } from "./types";
 
 interface DataDisplayCardsProps {
   personalData: PersonalData | null;
@@ -8,6 +9,7 @@ interface DataDisplayCardsProps {
   incomeData: IncomeData | null;
   propertyData: PropertyData | null;
   childrenData?: ChildrenData | null;
+  onCreditDataChange?: (data: CreditData) => void;
 }
 
 export default function DataDisplayCards({
@@ -15,8 +17,21 @@ export default function DataDisplayCards({
   creditData,
   incomeData,
   propertyData,
-  childrenData
+  childrenData,
+  onCreditDataChange
 }: DataDisplayCardsProps) {
+  const selectCreditorSuggestion = (creditorIdx: number, suggestion: CreditorSuggestion) => {
+    if (!creditData || !onCreditDataChange) return;
+    onCreditDataChange({
+      ...creditData,
+      creditors: creditData.creditors.map((creditor, idx) => {
+        if (idx !== creditorIdx) return creditor;
+        const { innSuggestions, ...resolved } = creditor;
+        return { ...resolved, inn: suggestion.inn, legalAddress: creditor.legalAddress || suggestion.address };
+      }),
+    });
+  };
+
   return (
     <>
       {personalData && (
@@ -96,6 +111,29 @@ export default function DataDisplayCards({
                       <p className="text-sm text-muted-foreground">ИНН: {creditor.inn}</p>
                     </div>
                   </div>
+                  {!creditor.inn && creditor.innSuggestions && creditor.innSuggestions.length > 0 && (
+                    <div className="mt-2 space-y-1">
+                      <p className="text-sm text-muted-foreground">Название не совпало однозначно, выберите организацию:</p>
+                      {creditor.innSuggestions.map((suggestion) => (
+                        <Button
+                          key={suggestion.inn}
+                          type="button"
+                          variant="outline"
+                          size="sm"
+                          className="w-full h-auto justify-start text-left whitespace-normal"
+                          disabled={!onCreditDataChange}
+                          onClick={() => selectCreditorSuggestion(idx, suggestion)}
+                        >
+                          <span>
+                            <span className="font-medium">{suggestion.name}</span>
+                            <span className="block text-xs text-muted-foreground">
+                              ИНН: {suggestion.inn}{suggestion.address ? `, ${suggestion.address}` : ""}
+                            </span>
+                          </span>
+                        </Button>
+                      ))}
+                    </div>
+                  )}
                   {creditor.credits.map((credit, creditIdx) => (
                     <div key={creditIdx} className="mt-2 text-sm bg-muted p-2 rounded">
                       <p>Договор: {credit.contractNumber}</p>
@@ -30,11 +30,19 @@ export interface PersonalData {
   email?: string;
 }
 
+export interface CreditorSuggestion {
+  inn: string;
+  name: string;
+  address: string;
+}
+
 export interface CreditData {
   creditors: Array<{
     name: string;
     inn: string;
     legalAddress?: string;
+    // Варианты из company-search, когда название не совпало однозначно: ИНН выбирает пользователь
+    innSuggestions?: CreditorSuggestion[];
     credits: Array<{
       contractNumber: string;
       amount: number;
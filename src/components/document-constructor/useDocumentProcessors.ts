@@ -1,5 +1,6 @@
-import { PersonalData, CreditData, IncomeData, PropertyData } from "./types";
+import { PersonalData, CreditData, CreditorSuggestion, IncomeData, PropertyData } from "./types";
 import { useOcrProcessing } from "./useOcrProcessing";
+import funcUrls from "../../../backend/func2url.json";
 
 interface UploadedFiles {
   passport?: File;
@@ -10,6 +11,18 @@ interface UploadedFiles {
   snils?: File;
 }
 
+const LEGAL_FORM_WORDS = new Set(["ооо", "оао", "зао", "пао", "ао", "нао", "ано", "кб", "мфк", "мкк", "пко"]);
+const MAX_CREDITOR_SUGGESTIONS = 5;
+
+// Название без кавычек, регистра и организационно-правовой формы: «ПАО "Сбербанк"» и «Сбербанк» совпадают
+const normalizeCompanyName = (name: string) =>
+  name
+    .toLowerCase()
+    .replace(/ё/g, "е")
+    .split(/[^\p{L}\p{N}]+/u)
+    .filter((word) => word && !LEGAL_FORM_WORDS.has(word))
+    .join(" ");
+
 interface DocumentProcessorsParams {
   uploadedFiles: UploadedFiles;
   setIsProcessing: (value: boolean) => void;
@@ -27,7 +40,63 @@ export const useDocumentProcessors = ({
   onIncomeDataExtracted,
   onPropertyDataExtracted
 }: DocumentProcessorsParams) => {
-  const { callOcrApi, parseOcrText } = useOcrProcessing();
+  const { processDocument } = useOcrProcessing();
+
+  // Дополняем ИНН и юридический адрес кредиторов одним пакетным запросом к company-search.
+  // Ошибочный ИНН в заявлении хуже пустого, поэтому реквизиты подставляются только при
+  // единственном результате с точно совпавшим названием, иначе пользователь выбирает сам
+  const enrichCreditors = async (creditors: CreditData["creditors"]): Promise<CreditData["creditors"]> => {
+    const missing = creditors.filter((creditor) => !creditor.inn && creditor.name && creditor.name.length >= 3);
+    if (missing.length === 0) {
+      return creditors;
+    }
+
+    try {
+      const response = await fetch(funcUrls["company-search"], {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ type: "party", queries: missing.map((creditor) => creditor.name) }),
+      });
+      if (!response.ok) {
+        return creditors;
+      }
+
+      const data = await response.json();
+      const found = new Map<typeof creditors[number], Array<CreditorSuggestion & { fullName?: string }>>();
+      missing.forEach((creditor, index) => {
+        const suggestions = data.results?.[index]?.suggestions || [];
+        if (suggestions.length > 0) {
+          found.set(creditor, suggestions);
+        }
+      });
+
+      return creditors.map((creditor) => {
+        const suggestions = found.get(creditor);
+        if (!suggestions) {
+          return creditor;
+        }
+
+        const creditorName = normalizeCompanyName(creditor.name);
+        const [only] = suggestions;
+        const exact = suggestions.length === 1 && creditorName !== "" && [only.name, only.fullName || ""].some(
+          (name) => normalizeCompanyName(name) === creditorName
+        );
+        if (exact) {
+          return { ...creditor, inn: only.inn, legalAddress: creditor.legalAddress || only.address };
+        }
+
+        return {
+          ...creditor,
+          innSuggestions: suggestions
+            .slice(0, MAX_CREDITOR_SUGGESTIONS)
+            .map(({ inn, name, address }) => ({ inn, name, address })),
+        };
+      });
+    } catch (error) {
+      console.error("Ошибка поиска реквизитов кредиторов:", error);
+      return creditors;
+    }
+  };
 
   const handleProcessPassport = async () => {
     if (!uploadedFiles.passport) {
@@ -37,8 +106,7 @@ export const useDocumentProcessors = ({
 
     setIsProcessing(true);
     try {
-      const ocrText = await callOcrApi(uploadedFiles.passport);
-      const parsedData = await parseOcrText(ocrText, 'passport');
+      const parsedData = await processDocument(uploadedFiles.passport, 'passport');
       
       const personalData: PersonalData = {
         fullName: parsedData.fullName || "Не распознано",
@@ -80,18 +148,19 @@ export const useDocumentProcessors = ({
 
     setIsProcessing(true);
     try {
-      const ocrText = await callOcrApi(uploadedFiles.bki);
-      const parsedData = await parseOcrText(ocrText, 'bki');
+      const parsedData = await processDocument(uploadedFiles.bki, 'bki');
 
       const creditData: CreditData = {
-        creditors: parsedData.creditors || [],
+        creditors: await enrichCreditors(parsedData.creditors || []),
         totalDebt: parsedData.totalDebt || 0,
         executiveDocuments: [],
       };
 
       onCreditDataExtracted(creditData);
       const creditorsNames = creditData.creditors.map(c => c.name).join(', ');
-      alert(`Распознано и автоматически заполнено:\n\nКредиторы: ${creditorsNames}\nОбщий долг: ${creditData.totalDebt.toLocaleString()} ₽`);
+      const unresolved = creditData.creditors.filter(c => c.innSuggestions?.length).length;
+      const unresolvedNote = unresolved > 0 ? `\n\nВыберите ИНН для кредиторов без точного совпадения: ${unresolved}` : "";
+      alert(`Распознано и автоматически заполнено:\n\nКредиторы: ${creditorsNames}\nОбщий долг: ${creditData.totalDebt.toLocaleString()} ₽${unresolvedNote}`);
     } catch (error) {
       alert(`Ошибка распознавания: ${error}`);
     } finally {
@@ -107,8 +176,7 @@ export const useDocumentProcessors = ({
 
     setIsProcessing(true);
     try {
-      const ocrText = await callOcrApi(uploadedFiles.income);
-      const parsedData = await parseOcrText(ocrText, 'income');
+      const parsedData = await processDocument(uploadedFiles.income, 'income');
 
       const incomeData: IncomeData = {
         monthlyIncome: parsedData.monthlyIncome || 0,
@@ -133,8 +201,7 @@ export const useDocumentProcessors = ({
 
     setIsProcessing(true);
     try {
-      const ocrText = await callOcrApi(uploadedFiles.property);
-      const parsedData = await parseOcrText(ocrText, 'property');
+      const parsedData = await processDocument(uploadedFiles.property, 'property');
 
       const propertyData: PropertyData = {
         realEstate: parsedData.realEstate || [],
@@ -1,5 +1,23 @@
 import funcUrls from "../../../backend/func2url.json";
 
+export type OcrDocumentType = 'passport' | 'bki' | 'income' | 'property';
+
+export interface ProcessedDocument {
+  documentType: OcrDocumentType;
+  statusCode: number;
+  data?: any;
+  text?: string;
+  error?: string;
+  incomplete?: boolean;
+  failedPages?: number[];
+  timings?: Record<string, number>;
+}
+
+// Запас до лимита тела запроса функции (3.5 МБ) на JSON-обвязку
+const OCR_REQUEST_MAX_CHARS = 3 * 1024 * 1024;
+// PROCESS_MAX_DOCUMENTS в ocr-document
+const OCR_REQUEST_MAX_DOCUMENTS = 10;
+
 export const useOcrProcessing = () => {
   const convertFileToBase64 = (file: File): Promise<string> => {
     return new Promise((resolve, reject) => {
@@ -14,16 +32,15 @@ export const useOcrProcessing = () => {
     });
   };
 
-  const callOcrApi = async (file: File): Promise<string> => {
-    const base64Image = await convertFileToBase64(file);
-    
+  const sendDocuments = async (documents: { documentType: OcrDocumentType; image: string }[]): Promise<ProcessedDocument[]> => {
     const response = await fetch(funcUrls["ocr-document"], {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({
-        image: base64Image,
+        action: 'process',
+        documents,
         folderId: ''
       })
     });
@@ -33,33 +50,54 @@ export const useOcrProcessing = () => {
       throw new Error(errorData.error || 'OCR API error');
     }
 
-    const data = await response.json();
-    return data.text || '';
+    const result = await response.json();
+    return result.documents || [];
   };
 
-  const parseOcrText = async (text: string, documentType: string): Promise<any> => {
-    const response = await fetch(funcUrls["parse-ocr-text"], {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        text,
-        documentType
-      })
-    });
+  // OCR и разбор в ocr-document: документы обрабатываются параллельно на сервере.
+  // Тело запроса к функции ограничено по размеру, поэтому сканы раскладываются по
+  // запросам не больше OCR_REQUEST_MAX_CHARS; крупный скан уходит отдельным запросом
+  const processDocuments = async (
+    files: { file: File; documentType: OcrDocumentType }[]
+  ): Promise<ProcessedDocument[]> => {
+    const documents = await Promise.all(
+      files.map(async ({ file, documentType }) => ({
+        documentType,
+        image: await convertFileToBase64(file),
+      }))
+    );
 
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.error || 'Parse API error');
+    const batches: (typeof documents)[] = [];
+    let batchChars = 0;
+    for (const item of documents) {
+      const last = batches[batches.length - 1];
+      if (!last || last.length >= OCR_REQUEST_MAX_DOCUMENTS || batchChars + item.image.length > OCR_REQUEST_MAX_CHARS) {
+        batches.push([item]);
+        batchChars = item.image.length;
+      } else {
+        last.push(item);
+        batchChars += item.image.length;
+      }
     }
 
-    const result = await response.json();
-    return result.data || {};
+    const results = await Promise.all(batches.map(sendDocuments));
+    return results.flat();
+  };
+
+  const processDocument = async (file: File, documentType: OcrDocumentType): Promise<any> => {
+    const [processed] = await processDocuments([{ file, documentType }]);
+    // Документ с нераспознанными страницами не заполняет форму: пропуски в выписке хуже ошибки
+    if (processed?.incomplete) {
+      throw new Error(`не распознаны страницы ${processed.failedPages?.join(', ')}. Загрузите документ ещё раз`);
+    }
+    if (!processed || processed.statusCode !== 200) {
+      throw new Error(processed?.error || 'OCR API error');
+    }
+    return processed.data || {};
   };
 
   return {
-    callOcrApi,
-    parseOcrText
+    processDocuments,
+    processDocument
   };
 };
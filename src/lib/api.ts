@@ -108,6 +108,16 @@ export const admin = {
   },
 };
 
+export interface ProgressUpdate {
+  lesson_id: number;
+  completed: boolean;
+  watch_time_seconds: number;
+}
+
+export interface ProgressRow extends ProgressUpdate {
+  last_watched_at: string;
+}
+
 export const course = {
   getContent: async (token: string) => {
     const response = await fetch(API_BASE.course, {
@@ -128,6 +138,22 @@ export const course = {
     });
     return response.json();
   },
+
+  // keepalive lets the request outlive the page when the tab is being closed
+  updateProgressBatch: async (
+    token: string,
+    updates: ProgressUpdate[],
+    options: { keepalive?: boolean } = {}
+  ): Promise<{ progress?: ProgressRow[]; error?: string; status: number }> => {
+    const response = await fetch(API_BASE.course, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'X-Auth-Token': token },
+      body: JSON.stringify({ updates }),
+      keepalive: options.keepalive,
+    });
+    const data = await response.json().catch(() => ({}));
+    return { ...data, status: response.status };
+  },
 };
 
 export const payment = {
@@ -172,6 +198,79 @@ export const uploadFile = async (token: string, data: {
   return response.json();
 };
 
+const uploadAction = async (token: string, data: Record<string, unknown>) => {
+  const response = await fetch(API_BASE.upload, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Auth-Token': token },
+    body: JSON.stringify(data),
+  });
+  const result = await response.json();
+  if (!response.ok) {
+    throw new Error(result.error || `Upload request failed: ${response.status}`);
+  }
+  return result;
+};
+
+type PartUrl = { partNumber: number; url: string };
+
+// Resumable upload for large files: init-upload hands out a presigned S3 URL per part,
+// the parts are PUT to S3 in parallel as raw bytes, and the upload id is kept in
+// localStorage so an interrupted upload continues from the missing parts
+export const uploadFileChunked = async (token: string, file: File, data: {
+  title: string;
+  description: string;
+  lessonId?: number;
+  moduleId?: number;
+  isWelcomeVideo?: boolean;
+}, onProgress?: (uploadedParts: number, totalParts: number) => void, concurrency = 4) => {
+  const resumeKey = `chunked_upload:${file.name}:${file.size}:${file.lastModified}`;
+  let session: { uploadId: string; partSize: number; totalParts: number; partUrls: PartUrl[] } | null = null;
+
+  const savedUploadId = localStorage.getItem(resumeKey);
+  if (savedUploadId) {
+    try {
+      const status = await uploadAction(token, { action: 'upload-status', uploadId: savedUploadId });
+      if (status.status === 'in_progress') {
+        session = status;
+      }
+    } catch {
+      localStorage.removeItem(resumeKey);
+    }
+  }
+
+  if (!session) {
+    session = await uploadAction(token, {
+      action: 'init-upload',
+      fileName: file.name,
+      fileSize: file.size,
+      fileType: file.type || 'application/octet-stream',
+      ...data,
+    });
+    localStorage.setItem(resumeKey, session!.uploadId);
+  }
+
+  const { uploadId, partSize, totalParts } = session!;
+  const pending = [...session!.partUrls];
+  let done = totalParts - pending.length;
+  onProgress?.(done, totalParts);
+
+  const worker = async () => {
+    for (let part = pending.shift(); part; part = pending.shift()) {
+      const chunk = file.slice((part.partNumber - 1) * partSize, part.partNumber * partSize);
+      const response = await fetch(part.url, { method: 'PUT', body: chunk });
+      if (!response.ok) {
+        throw new Error(`Part ${part.partNumber} upload failed: ${response.status}`);
+      }
+      onProgress?.(++done, totalParts);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(concurrency, pending.length) }, worker));
+
+  const result = await uploadAction(token, { action: 'complete-upload', uploadId });
+  localStorage.removeItem(resumeKey);
+  return result;
+};
+
 export const getFiles = async (token: string, lessonId?: number, moduleId?: number) => {
   let url = API_BASE.upload;
   const params = new URLSearchParams();
@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '@/contexts/AuthContext';
-import { admin, uploadFile, getFiles, deleteFile } from '@/lib/api';
+import { admin, uploadFile, uploadFileChunked, getFiles, deleteFile } from '@/lib/api';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { useToast } from '@/hooks/use-toast';
 import AdminHeader from '@/components/admin/AdminHeader';
@@ -57,6 +57,8 @@ const Admin = () => {
   const [welcomeVideoTitle, setWelcomeVideoTitle] = useState('');
   const [welcomeVideoDescription, setWelcomeVideoDescription] = useState('');
   const [moduleFileUrl, setModuleFileUrl] = useState('');
+  const [moduleFile, setModuleFile] = useState<File | null>(null);
+  const [uploadProgress, setUploadProgress] = useState<number | null>(null);
   const [moduleFileTitle, setModuleFileTitle] = useState('');
   const [moduleFileDescription, setModuleFileDescription] = useState('');
   const [sendingTestEmail, setSendingTestEmail] = useState(false);
@@ -236,27 +238,31 @@ const Admin = () => {
   const handleSaveModuleFile = async (e: React.FormEvent) => {
     e.preventDefault();
     
-    if (!moduleFileUrl.trim()) {
-      toast({ title: 'Ошибка', description: 'Введите ссылку на файл', variant: 'destructive' });
+    if (!moduleFile && !moduleFileUrl.trim()) {
+      toast({ title: 'Ошибка', description: 'Введите ссылку на файл или выберите файл', variant: 'destructive' });
       return;
     }
 
     setUploading(true);
     try {
-      const data = await uploadFile(getAdminToken(), {
+      const fileData = {
         title: moduleFileTitle || 'Файл модуля',
         description: moduleFileDescription,
-        fileType: 'application/pdf',
-        externalUrl: moduleFileUrl,
         moduleId: selectedModule,
         lessonId: selectedLesson,
-      });
+      };
+      const data = moduleFile
+        ? await uploadFileChunked(getAdminToken(), moduleFile, fileData, (uploadedParts, totalParts) =>
+            setUploadProgress(Math.round((uploadedParts / totalParts) * 100))
+          )
+        : await uploadFile(getAdminToken(), { ...fileData, fileType: 'application/pdf', externalUrl: moduleFileUrl });
 
       if (data.error) {
         toast({ title: 'Ошибка', description: data.error, variant: 'destructive' });
       } else {
         toast({ title: 'Успех', description: 'Файл сохранен' });
         setModuleFileUrl('');
+        setModuleFile(null);
         setModuleFileTitle('');
         setModuleFileDescription('');
         loadFiles();
@@ -265,6 +271,7 @@ const Admin = () => {
       toast({ title: 'Ошибка', description: err.message, variant: 'destructive' });
     } finally {
       setUploading(false);
+      setUploadProgress(null);
     }
   };
 
@@ -362,6 +369,8 @@ const Admin = () => {
               welcomeVideoTitle={welcomeVideoTitle}
               welcomeVideoDescription={welcomeVideoDescription}
               moduleFileUrl={moduleFileUrl}
+              moduleFile={moduleFile}
+              uploadProgress={uploadProgress}
               moduleFileTitle={moduleFileTitle}
               moduleFileDescription={moduleFileDescription}
               onSelectedModuleChange={setSelectedModule}
@@ -370,6 +379,7 @@ const Admin = () => {
               onWelcomeVideoTitleChange={setWelcomeVideoTitle}
               onWelcomeVideoDescriptionChange={setWelcomeVideoDescription}
               onModuleFileUrlChange={setModuleFileUrl}
+              onModuleFileChange={setModuleFile}
               onModuleFileTitleChange={setModuleFileTitle}
               onModuleFileDescriptionChange={setModuleFileDescription}
               onSaveWelcomeVideo={handleSaveWelcomeVideo}
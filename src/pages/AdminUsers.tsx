@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { useAuth } from '@/contexts/AuthContext';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import Icon from '@/components/ui/icon';
@@ -22,6 +23,7 @@ import {
   AlertDialogTitle,
 } from '@/components/ui/alert-dialog';
 import { Badge } from '@/components/ui/badge';
+import { Input } from '@/components/ui/input';
 import funcUrls from '../../backend/func2url.json';
 import { useToast } from '@/hooks/use-toast';
 
@@ -37,13 +39,24 @@ interface User {
   password_changed_by_user: boolean;
 }
 
+interface UsersPage {
+  cursor: string;
+  emailPrefix: string;
+}
+
 export default function AdminUsers() {
   const navigate = useNavigate();
+  const { token } = useAuth();
   const { toast } = useToast();
   const [users, setUsers] = useState<User[]>([]);
   const [loading, setLoading] = useState(true);
   const [deleting, setDeleting] = useState<number | null>(null);
   const [userToDelete, setUserToDelete] = useState<User | null>(null);
+  const [emailSearch, setEmailSearch] = useState('');
+  // Курсор действует только вместе с фильтром, по которому получена страница
+  const [nextPage, setNextPage] = useState<UsersPage | null>(null);
+  const [totalEstimate, setTotalEstimate] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const adminAuth = sessionStorage.getItem('admin_authenticated');
@@ -54,16 +67,29 @@ export default function AdminUsers() {
     loadUsers();
   }, [navigate]);
 
-  const loadUsers = async () => {
-    setLoading(true);
+  const getAdminToken = () => {
+    return token || 'admin_session_token';
+  };
+
+  const loadUsers = async (page: UsersPage | null = null) => {
+    const cursor = page?.cursor ?? null;
+    const emailPrefix = page ? page.emailPrefix : emailSearch.trim();
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     try {
       const response = await fetch(funcUrls['admin-user-management'], {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'X-Auth-Token': getAdminToken(),
         },
         body: JSON.stringify({
-          action: 'list'
+          action: 'list',
+          cursor,
+          filter: emailPrefix ? { email_prefix: emailPrefix } : undefined
         })
       });
 
@@ -73,7 +99,9 @@ export default function AdminUsers() {
 
       const data = await response.json();
       if (data.success) {
-        setUsers(data.users);
+        setUsers((prev) => (cursor ? [...prev, ...data.users] : data.users));
+        setNextPage(data.next_cursor ? { cursor: data.next_cursor, emailPrefix } : null);
+        setTotalEstimate(data.total_estimate);
       } else {
         throw new Error(data.error || 'Неизвестная ошибка');
       }
@@ -85,6 +113,7 @@ export default function AdminUsers() {
       });
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -101,6 +130,7 @@ export default function AdminUsers() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'X-Auth-Token': getAdminToken(),
         },
         body: JSON.stringify({
           action: 'delete',
@@ -180,7 +210,7 @@ export default function AdminUsers() {
           <Button
             variant="outline"
             size="sm"
-            onClick={loadUsers}
+            onClick={() => loadUsers()}
             disabled={loading}
           >
             <Icon name="RefreshCw" size={16} className="mr-2" />
@@ -197,8 +227,26 @@ export default function AdminUsers() {
         <CardHeader>
           <CardTitle className="flex items-center gap-2">
             <Icon name="Users" size={20} />
-            Пользователи ({users.length})
+            Пользователи ({users.length}{nextPage ? ` из ~${totalEstimate}` : ''})
           </CardTitle>
+          <form
+            className="flex gap-2 pt-2"
+            onSubmit={(e) => {
+              e.preventDefault();
+              loadUsers();
+            }}
+          >
+            <Input
+              placeholder="Поиск по началу email"
+              value={emailSearch}
+              onChange={(e) => setEmailSearch(e.target.value)}
+              className="max-w-sm"
+            />
+            <Button type="submit" variant="outline" disabled={loading}>
+              <Icon name="Search" size={16} className="mr-2" />
+              Найти
+            </Button>
+          </form>
         </CardHeader>
         <CardContent>
           {loading ? (
@@ -293,6 +341,13 @@ export default function AdminUsers() {
                   })}
                 </TableBody>
               </Table>
+              {nextPage && (
+                <div className="flex justify-center pt-4">
+                  <Button variant="outline" onClick={() => loadUsers(nextPage)} disabled={loadingMore}>
+                    {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
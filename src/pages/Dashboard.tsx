@@ -1,7 +1,7 @@
 import { useEffect, useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '@/contexts/AuthContext';
-import { course, getFiles } from '@/lib/api';
+import { course, getFiles, ProgressRow, ProgressUpdate } from '@/lib/api';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from '@/components/ui/card';
 import Icon from '@/components/ui/icon';
@@ -56,6 +56,8 @@ interface Module {
   files?: CourseFile[];
 }
 
+const PROGRESS_FLUSH_MS = 15000;
+
 export const Dashboard = () => {
   const { token, user, logout } = useAuth();
   const navigate = useNavigate();
@@ -66,6 +68,8 @@ export const Dashboard = () => {
   const [showPasswordModal, setShowPasswordModal] = useState(false);
   const videoRefs = useRef<{ [key: number]: HTMLVideoElement | null }>({});
   const progressIntervals = useRef<{ [key: number]: NodeJS.Timeout }>({});
+  // Heartbeats collect here and go to the server in one batched request per PROGRESS_FLUSH_MS
+  const pendingProgress = useRef<Map<number, ProgressUpdate>>(new Map());
 
   const getToken = () => {
     const isAdminViewing = sessionStorage.getItem('admin_authenticated');
@@ -132,15 +136,79 @@ export const Dashboard = () => {
     return total > 0 ? (completed / total) * 100 : 0;
   };
 
-  const markLessonComplete = async (lessonId: number) => {
+  const setLessonProgress = (lessonId: number, progress: Lesson['progress']) => {
+    setModules(prevModules => 
+      prevModules.map(module => ({
+        ...module,
+        lessons: module.lessons.map(lesson =>
+          lesson.id === lessonId ? { ...lesson, progress } : lesson
+        ),
+      }))
+    );
+  };
+
+  // Сервер возвращает только изменившиеся строки — подставляем их вместо перезагрузки курса
+  const applyProgressRows = (rows: ProgressRow[]) => {
+    if (rows.length === 0) return;
+    const byLesson = new Map(rows.map(row => [row.lesson_id, row]));
+    setModules(prevModules => 
+      prevModules.map(module => ({
+        ...module,
+        lessons: module.lessons.map(lesson => {
+          const row = byLesson.get(lesson.id);
+          return row
+            ? { ...lesson, progress: { completed: row.completed, watch_time_seconds: row.watch_time_seconds } }
+            : lesson;
+        }),
+      }))
+    );
+  };
+
+  const queueProgress = (lessonId: number, completed: boolean, watchTime: number) => {
+    const pending = pendingProgress.current.get(lessonId);
+    pendingProgress.current.set(lessonId, {
+      lesson_id: lessonId,
+      completed: completed || Boolean(pending?.completed),
+      watch_time_seconds: Math.max(watchTime, pending?.watch_time_seconds ?? 0),
+    });
+  };
+
+  const flushProgress = async (keepalive = false) => {
+    const currentToken = getToken();
+    if (!currentToken || pendingProgress.current.size === 0) return;
+
+    const updates = Array.from(pendingProgress.current.values());
+    pendingProgress.current.clear();
+    const requeue = () => {
+      updates.forEach(update => queueProgress(update.lesson_id, update.completed, update.watch_time_seconds));
+    };
+
+    let data: Awaited<ReturnType<typeof course.updateProgressBatch>>;
     try {
-      const currentToken = getToken();
-      if (!currentToken) return;
-      await course.updateProgress(currentToken, lessonId, true, 0);
-      loadCourseContent();
+      data = await course.updateProgressBatch(currentToken, updates, { keepalive });
     } catch (err) {
       console.error('Error updating progress:', err);
+      // Сеть недоступна: возвращаем в очередь, следующий сброс повторит отправку
+      requeue();
+      return;
     }
+
+    if (data.status >= 500) {
+      console.error('Error updating progress:', data.error || data.status);
+      requeue();
+      return;
+    }
+    if (data.error) {
+      // Отклонённый пакет (4xx) повтор не исправит, а в очереди он блокировал бы всё сохранение
+      console.error('Progress update rejected:', data.error);
+      return;
+    }
+    applyProgressRows(data.progress || []);
+  };
+
+  const markLessonComplete = async (lessonId: number) => {
+    queueProgress(lessonId, true, 0);
+    await flushProgress();
   };
 
   const handleVideoPlay = (lessonId: number) => {
@@ -148,40 +216,17 @@ export const Dashboard = () => {
       clearInterval(progressIntervals.current[lessonId]);
     }
     
-    progressIntervals.current[lessonId] = setInterval(async () => {
+    progressIntervals.current[lessonId] = setInterval(() => {
       const video = videoRefs.current[lessonId];
       if (video && !video.paused) {
         const watchTime = Math.floor(video.currentTime);
         const duration = Math.floor(video.duration);
         const completed = watchTime >= duration * 0.9;
         
-        setModules(prevModules => 
-          prevModules.map(module => ({
-            ...module,
-            lessons: module.lessons.map(lesson =>
-              lesson.id === lessonId
-                ? {
-                    ...lesson,
-                    progress: {
-                      completed,
-                      watch_time_seconds: watchTime,
-                    },
-                  }
-                : lesson
-            ),
-          }))
-        );
-        
-        try {
-          const currentToken = getToken();
-          if (currentToken) {
-            await course.updateProgress(currentToken, lessonId, completed, watchTime);
-            if (completed) {
-              clearInterval(progressIntervals.current[lessonId]);
-            }
-          }
-        } catch (err) {
-          console.error('Error updating progress:', err);
+        setLessonProgress(lessonId, { completed, watch_time_seconds: watchTime });
+        queueProgress(lessonId, completed, watchTime);
+        if (completed) {
+          clearInterval(progressIntervals.current[lessonId]);
         }
       }
     }, 5000);
@@ -198,29 +243,9 @@ export const Dashboard = () => {
       const duration = Math.floor(video.duration);
       const completed = watchTime >= duration * 0.9;
       
-      setModules(prevModules => 
-        prevModules.map(module => ({
-          ...module,
-          lessons: module.lessons.map(lesson =>
-            lesson.id === lessonId
-              ? {
-                  ...lesson,
-                  progress: {
-                    completed,
-                    watch_time_seconds: watchTime,
-                  },
-                }
-              : lesson
-          ),
-        }))
-      );
-      
-      const currentToken = getToken();
-      if (currentToken) {
-        course.updateProgress(currentToken, lessonId, completed, watchTime).catch(err => {
-          console.error('Error saving progress on pause:', err);
-        });
-      }
+      setLessonProgress(lessonId, { completed, watch_time_seconds: watchTime });
+      queueProgress(lessonId, completed, watchTime);
+      flushProgress();
     }
   };
 
@@ -233,34 +258,32 @@ export const Dashboard = () => {
     if (video) {
       const watchTime = Math.floor(video.duration);
       
-      setModules(prevModules => 
-        prevModules.map(module => ({
-          ...module,
-          lessons: module.lessons.map(lesson =>
-            lesson.id === lessonId
-              ? {
-                  ...lesson,
-                  progress: {
-                    completed: true,
-                    watch_time_seconds: watchTime,
-                  },
-                }
-              : lesson
-          ),
-        }))
-      );
-      
-      try {
-        const currentToken = getToken();
-        if (currentToken) {
-          await course.updateProgress(currentToken, lessonId, true, watchTime);
-        }
-      } catch (err) {
-        console.error('Error marking as completed:', err);
-      }
+      setLessonProgress(lessonId, { completed: true, watch_time_seconds: watchTime });
+      queueProgress(lessonId, true, watchTime);
+      await flushProgress();
     }
   };
 
+  useEffect(() => {
+    const flushInterval = setInterval(() => flushProgress(), PROGRESS_FLUSH_MS);
+    // При закрытии вкладки обычный fetch обрывается, поэтому очередь уходит с keepalive,
+    // как только страница скрыта
+    const flushOnHide = () => {
+      if (document.visibilityState === 'hidden') {
+        flushProgress(true);
+      }
+    };
+    const flushOnPageHide = () => flushProgress(true);
+    document.addEventListener('visibilitychange', flushOnHide);
+    window.addEventListener('pagehide', flushOnPageHide);
+    return () => {
+      clearInterval(flushInterval);
+      document.removeEventListener('visibilitychange', flushOnHide);
+      window.removeEventListener('pagehide', flushOnPageHide);
+      flushProgress(true);
+    };
+  }, [token]);
+
   useEffect(() => {
     return () => {
       Object.values(progressIntervals.current).forEach(interval => {
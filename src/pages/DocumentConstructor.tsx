@@ -245,6 +245,7 @@ export default function DocumentConstructor() {
             incomeData={incomeData}
             propertyData={propertyData}
             childrenData={childrenData}
+            onCreditDataChange={setCreditData}
           />
         </div>
 
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Копирование общих модулей backend/_shared/ в функции, которые их используют.
+
+Каждая функция деплоится из своего каталога и не видит соседние, поэтому общий
+код лежит в backend/_shared/, а рядом с index.py каждой функции хранится его
+побайтно одинаковая копия. Копии не редактируются: правка вносится в исходный
+файл в backend/_shared/, после чего скрипт запускается заново.
+
+Использование:
+    python3 sync_shared.py          # записать копии
+    python3 sync_shared.py --check  # только проверить; код 1, если копия устарела
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+SHARED_DIR = os.path.join(BACKEND_DIR, '_shared')
+
+# Модуль -> функции, в каталог которых он копируется
+SHARED_MODULES = {
+    'document_parsers.py': ['ocr-document', 'parse-ocr-text'],
+    'chat_token_pool.py': ['admin', 'payment', 'resend-chat-token'],
+    'auth_middleware.py': ['admin', 'admin-user-management', 'auth', 'course', 'upload-file', 'user-settings'],
+    'password_hashing.py': ['auth', 'payment', 'reset-password'],
+}
+
+
+def render(module: str) -> str:
+    with open(os.path.join(SHARED_DIR, module), encoding='utf-8') as f:
+        source = f.read()
+    return (
+        f'# Сгенерировано из backend/_shared/{module} скриптом sync_shared.py — не редактировать.\n'
+        f'# Правки вносятся в backend/_shared/{module}, затем: python3 sync_shared.py\n'
+        + source
+    )
+
+
+def main() -> int:
+    check_only = '--check' in sys.argv[1:]
+    stale = []
+
+    for module, functions in SHARED_MODULES.items():
+        content = render(module)
+        for function in functions:
+            target = os.path.join(BACKEND_DIR, function, module)
+            if os.path.exists(target):
+                with open(target, encoding='utf-8') as f:
+                    if f.read() == content:
+                        continue
+            stale.append(os.path.relpath(target, os.path.dirname(BACKEND_DIR)))
+            if not check_only:
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+    if check_only and stale:
+        print('Устаревшие копии общих модулей (запустите python3 sync_shared.py):')
+        for path in stale:
+            print(f'  {path}')
+        return 1
+
+    for path in stale:
+        print(f'Обновлено: {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())